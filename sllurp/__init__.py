@@ -1,4 +1,5 @@
-__all__ = ('llrp', 'llrp_decoder', 'llrp_proto', 'util')
+__all__ = ('capabilities', 'llrp', 'llrp_decoder', 'llrp_proto', 'shard',
+           'util')
 __version__ = '0.1.6'
 
 
@@ -0,0 +1,74 @@
+import argparse
+import logging
+from struct import pack as spack
+from time import perf_counter
+from sllurp.llrp import LLRPMessage
+from sllurp.llrp_proto import TAG_FORMATS
+
+logger = logging.getLogger('sllurp')
+
+args = None
+
+
+def parse_args():
+    global args
+    parser = argparse.ArgumentParser(
+        description='Measure RO_ACCESS_REPORT decoding speed')
+    parser.add_argument('-n', '--tags', default=100, type=int,
+                        help='tags per report (default 100)')
+    parser.add_argument('-r', '--reports', default=500, type=int,
+                        help='number of reports to decode (default 500)')
+    parser.add_argument('-f', '--tag-format', default='dict',
+                        choices=TAG_FORMATS,
+                        help='how to decode the tags (default dict)')
+    parser.add_argument('-d', '--debug', action='store_true')
+    args = parser.parse_args()
+
+
+def init_logging():
+    logLevel = (args.debug and logging.DEBUG or logging.INFO)
+    logFormat = '%(asctime)s %(name)s: %(levelname)s: %(message)s'
+    formatter = logging.Formatter(logFormat)
+    stderr = logging.StreamHandler()
+    stderr.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(logLevel)
+    root.handlers = [stderr]
+
+
+def build_report(ntags):
+    """Return the bytes of an RO_ACCESS_REPORT holding ntags TagReportData,
+       each with an EPC-96 and the fields of the default content selector."""
+    params = []
+    for i in range(ntags):
+        body = spack('!BIQ', 0x80 | 13, 0x30000000, i)  # EPC-96
+        body += spack('!BH', 0x80 | 1, 1 + i % 4)  # AntennaID
+        body += spack('!Bb', 0x80 | 6, -40 - i % 30)  # PeakRSSI
+        body += spack('!BQ', 0x80 | 4, 1500000000000000 + i)  # LastSeen
+        body += spack('!BH', 0x80 | 8, 1)  # TagSeenCount
+        params.append(spack('!HH', 240, len(body) + 4) + body)
+    body = b''.join(params)
+    return spack('!HII', (1 << 10) | 61, len(body) + 10, 0) + body
+
+
+def run(report, ntags, nreports, tag_format='dict'):
+    """Decode report nreports times; return the decoded tags per second."""
+    start = perf_counter()
+    for _ in range(nreports):
+        msg = LLRPMessage(msgbytes=report, tag_format=tag_format)
+        tags = msg.msgdict['RO_ACCESS_REPORT']['TagReportData']
+        assert sum(1 for _ in tags) == ntags
+    elapsed = perf_counter() - start
+    return ntags * nreports / elapsed
+
+
+if __name__ == '__main__':
+    parse_args()
+    init_logging()
+
+    report = build_report(args.tags)
+    rate = run(report, args.tags, args.reports, args.tag_format)
+    print('{} reports of {} tags ({} bytes each, {}): {:.0f} tags/second'
+          .format(args.reports, args.tags, len(report), args.tag_format,
+                  rate))
@@ -0,0 +1,103 @@
+"""Reader capabilities saved to a JSON file, so that a new process can set
+up a reader it already knows before the reader reports its capabilities.
+
+Readers are identified by their ReaderID (see GET_READER_CONFIG
+Identification) and their firmware version: the file maps each identity to
+the part of the capabilities LLRPProtocol.parseCapabilities depends on
+(antenna count, transmit power table and RF mode table), and each reader
+host to the identity last seen there.
+"""
+
+from binascii import hexlify
+from json import dump, load
+from logging import getLogger
+from os import replace
+from os.path import exists
+
+logger = getLogger(__name__)
+
+
+def reduceCapabilities(capdict):
+    """Return the part of a GET_READER_CAPABILITIES_RESPONSE parsed by
+       LLRPProtocol.parseCapabilities, as JSON-serializable values."""
+    gdc = capdict['GeneralDeviceCapabilities']
+    bandcap = capdict['RegulatoryCapabilities']['UHFBandCapabilities']
+    reduced_bandcap = {k: dict(v) for k, v in bandcap.items()
+                       if k.startswith('TransmitPowerLevelTableEntry')}
+    reduced_bandcap['UHFRFModeTable'] = {
+        k: dict(v) for k, v in bandcap['UHFRFModeTable'].items()}
+    return {
+        'GeneralDeviceCapabilities': {
+            k: gdc[k] for k in ('MaxNumberOfAntennaSupported',
+                                'DeviceManufacturerName', 'ModelName',
+                                'ReaderFirmwareVersion')},
+        'RegulatoryCapabilities': {
+            'UHFBandCapabilities': reduced_bandcap,
+        },
+    }
+
+
+class CapabilitiesCache(object):
+    """Reader capabilities by reader identity, saved to path."""
+
+    def __init__(self, path):
+        self.path = path
+        # identity -> reduced capabilities
+        self.readers = {}
+        # host -> identity
+        self.hosts = {}
+        if exists(path):
+            self.load()
+
+    @staticmethod
+    def getIdentity(identification, capdict):
+        """Return the identity of a reader from the Identification parameter
+           of its configuration and from its capabilities."""
+        return '{}/{}'.format(
+            hexlify(identification['ReaderID']).decode(),
+            capdict['GeneralDeviceCapabilities']['ReaderFirmwareVersion'])
+
+    def getCapabilities(self, identity):
+        """Return the capabilities of the reader with identity, or None."""
+        return self.readers.get(identity)
+
+    def lookup(self, host):
+        """Return the identity and capabilities of the reader last seen at
+           host, or (None, None)."""
+        identity = self.hosts.get(host)
+        return identity, self.readers.get(identity)
+
+    def update(self, host, identification, capdict):
+        """Record the capabilities of the reader at host, and return its
+           identity."""
+        identity = self.getIdentity(identification, capdict)
+        reduced = reduceCapabilities(capdict)
+        if self.hosts.get(host) != identity or \
+                self.readers.get(identity) != reduced:
+            self.hosts[host] = identity
+            self.readers[identity] = reduced
+            self.save()
+        return identity
+
+    def load(self):
+        try:
+            with open(self.path) as cachefile:
+                contents = load(cachefile)
+            self.readers = contents['readers']
+            self.hosts = contents['hosts']
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning('ignoring capabilities cache %s: %s', self.path,
+                           err)
+            self.readers = {}
+            self.hosts = {}
+
+    def save(self):
+        tmppath = self.path + '.tmp'
+        try:
+            with open(tmppath, 'w') as cachefile:
+                dump({'readers': self.readers, 'hosts': self.hosts},
+                     cachefile, indent=1, sort_keys=True)
+            replace(tmppath, self.path)
+        except OSError as err:
+            logger.warning('cannot save capabilities cache %s: %s',
+                           self.path, err)
@@ -25,6 +25,7 @@ class LLRPClient(object):
         self._shutdown_event = Event()
         self._hosts = []
         self._port = LLRPEngine.PORT
+        self._listen = False
         self._tags = {}
         self._start_time = 0.0
         self._tag_count = 0
@@ -56,6 +57,7 @@ class LLRPClient(object):
     def initialize(self, args):
         self._hosts = args.host
         self._port = args.port
+        self._listen = args.listen
         self._engine = LLRPEngine(onFinish=self.finalize,
                                   duration=args.time,
                                   report_every_n_tags=args.every_n,
@@ -68,6 +70,9 @@ class LLRPClient(object):
                                   start_inventory=True,
                                   disconnect_when_done=(args.time > 0),
                                   reconnect=args.reconnect,
+                                  pipeline_startup=not args.no_pipeline,
+                                  capabilities_cache=args.capabilities_cache,
+                                  live_config=args.live_config,
                                   tag_content_selector={
                                       'EnableROSpecID': False,
                                       'EnableSpecIndex': False,
@@ -86,8 +91,11 @@ class LLRPClient(object):
         loop = get_event_loop()
         coroutines = [self._shutdown_event.wait()]
         for host in self._hosts:
-            coroutines.append(self._engine.new_reader(host, self._port,
-                                                      timeout=3))
+            if self._listen:
+                coroutines.append(self._engine.listen(host, self._port))
+            else:
+                coroutines.append(self._engine.new_reader(host, self._port,
+                                                          timeout=3))
         tasks = gather(*coroutines)
         try:
             self._start_time = now()
@@ -138,6 +146,24 @@ def main():
         parser.add_argument('-r', '--reconnect', action='store_true',
                             default=False,
                             help='reconnect on connection failure or loss')
+        parser.add_argument('-L', '--listen', action='store_true',
+                            default=False,
+                            help='accept connections from the readers on '
+                                 'the host address(es) instead of '
+                                 'connecting to them')
+        parser.add_argument('--no-pipeline', action='store_true',
+                            default=False,
+                            help='wait for the response to each request of '
+                                 'the connect sequence before sending the '
+                                 'next one')
+        parser.add_argument('--live-config', action='store_true',
+                            default=False,
+                            help='set the transmit power and the reports '
+                                 'through the reader configuration rather '
+                                 'than the ROSpec')
+        parser.add_argument('--capabilities-cache', metavar='FILE',
+                            help='save the reader capabilities to FILE, and '
+                                 'start inventory with them on the next run')
         args = parser.parse_args()
 
         logLevel = (args.debug and logging.DEBUG or logging.INFO)
@@ -1,83 +1,110 @@
-from asyncio import (TimeoutError as AioTimeoutError, Protocol,
-                     ensure_future, get_event_loop, wait_for)
+from asyncio import (Semaphore, TimeoutError as AioTimeoutError,
+                     ensure_future, gather, get_event_loop, sleep, wait_for)
 from binascii import hexlify
-from collections import defaultdict, deque
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from functools import partial
-from logging import getLogger
+from inspect import isawaitable
+from logging import getLogger, DEBUG
 from pprint import pformat
+from random import uniform
 from socket import SOL_SOCKET, SO_KEEPALIVE
-from struct import calcsize as scalc, pack as spack, unpack as sunpack
-from traceback import print_exc
-from . import LLRPError
+from time import monotonic
+from struct import (calcsize as scalc, pack_into as spack_into,
+                    unpack_from as sunpack_from)
+from . import LLRPError, LLRPResponseError
+from .capabilities import CapabilitiesCache
 from .llrp_proto import (LLRPROSpec, Message_struct,
                          Message_Type2Name, Capability_Name2Type, AirProtocol,
                          llrp_data2xml, LLRPMessageDict, Modulation_Name2Type,
-                         DEFAULT_MODULATION)
+                         DEFAULT_MODULATION, TAG_FORMATS, encode,
+                         decode_TagReportEPCs)
 from .util import BITMASK
 
 
-logger = getLogger(__name__)
-
-
-class Deferred(object):
-    """Duck-typed Deferrerd class, to ease porting from twisted to asyncio
-       for the very specific and limited use of Deferred object in this module.
-    """
-
-    def __init__(self):
-        self._queue = deque()
+try:
+    from asyncio import BufferedProtocol
+except ImportError:
+    # Python < 3.7: received data is fed through data_received() instead
+    from asyncio import Protocol as BufferedProtocol
 
-    def callback(self, result):
-        return self._execute(0, result)
 
-    def errback(self, fail=None):
-        return self._execute(1, fail)
-
-    def _execute(self, hidx, result):
-        while self._queue:
-            handlers = self._queue.pop()
-            if handlers[hidx] is not None:
-                try:
-                    func, args, kwargs = handlers[hidx]
-                    result = func(result, *args, **kwargs)
-                    hidx = 0
-                except Exception as ex:
-                    result = ex
-                    hidx = 1
-                    print_exc()
-        if isinstance(result, Exception):
-            raise result
-        return result
-
-    def addCallback(self, callback, *args, **kwargs):
-        self._queue.appendleft(((callback, args, kwargs), None))
-
-    def addErrback(self, errback, *args, **kwargs):
-        self._queue.appendleft((None, (errback, args, kwargs)))
+logger = getLogger(__name__)
 
 
 class LLRPMessage(object):
+    """An LLRP message, built from a message dict or from received bytes.
+
+       When built from bytes with lazy=True, only the 10-byte header is
+       parsed up front; the message dict is decoded on first access to
+       msgdict.  tag_format selects how the tags of an RO_ACCESS_REPORT are
+       decoded: 'dict' (one dictionary per tag), 'columns' (one columnar
+       batch per report, see llrp_proto.decode_TagReportColumns),
+       'records' (one llrp_proto.TagRead per tag) or 'stream' (an
+       llrp_proto.TagReportStream, decoding one tag dictionary at a time).
+    """
     hdr_fmt = '!HI'
     hdr_len = scalc(hdr_fmt)  # == 6 bytes
     full_hdr_fmt = hdr_fmt + 'I'
     full_hdr_len = scalc(full_hdr_fmt)  # == 10 bytes
-    msgdict = None
     msgbytes = None
-
-    def __init__(self, msgdict=None, msgbytes=None):
+    # header fields, set by parseHeader() or serialize()
+    ver = None
+    msgtype = None
+    msglen = None
+    msgid = None
+
+    def __init__(self, msgdict=None, msgbytes=None, lazy=False,
+                 tag_format='dict'):
         if not (msgdict or msgbytes):
             raise LLRPError('Provide either a message dict or a sequence'
                             ' of bytes.')
+        self.tag_format = tag_format
+        self._msgdict = None
+        self._name = None
+        # whether msgbytes have been decoded (or failed to decode)
+        self._decoded = False
         if msgdict:
-            self.msgdict = LLRPMessageDict(msgdict)
+            self._msgdict = LLRPMessageDict(msgdict)
+            self._name = list(msgdict.keys())[0]
+            self._decoded = True
             if not msgbytes:
                 self.serialize()
         if msgbytes:
             self.msgbytes = msgbytes
             if not msgdict:
-                self.deserialize()
+                self.parseHeader()
+                if not lazy:
+                    self.deserialize()
         self.peername = None
 
+    @property
+    def msgdict(self):
+        if not self._decoded:
+            self.deserialize()
+        return self._msgdict
+
+    @msgdict.setter
+    def msgdict(self, msgdict):
+        self._msgdict = msgdict
+        self._decoded = True
+
+    def parseHeader(self):
+        """Parse the message header, without decoding the message body."""
+        if self.msgbytes is None:
+            raise LLRPError('No message bytes to parse.')
+        msgtype, self.msglen, self.msgid = sunpack_from(self.full_hdr_fmt,
+                                                        self.msgbytes)
+        self.ver = (msgtype >> 10) & BITMASK(3)
+        self.msgtype = msgtype & BITMASK(10)
+        try:
+            self._name = Message_Type2Name[self.msgtype]
+            Message_struct[self._name]['decode']
+        except KeyError:
+            raise LLRPError('Cannot find decoder for message type '
+                            '{}'.format(self.msgtype))
+
     def serialize(self):
         if self.msgdict is None:
             raise LLRPError('No message dict to serialize.')
@@ -91,38 +118,41 @@ class LLRPMessage(object):
         except KeyError:
             raise LLRPError('Cannot find encoder for message type '
                             '{}'.format(name))
-        data = encoder(self.msgdict[name])
-        self.msgbytes = spack(self.full_hdr_fmt,
-                              (ver << 10) | msgtype,
-                              len(data) + self.full_hdr_len,
-                              msgid) + data
-        logger.debug('serialized bytes: %s', hexlify(self.msgbytes))
+        # encode the body after room for the header, which is written once
+        # the length of the message is known
+        data = bytearray(self.full_hdr_len)
+        encoder(self.msgdict[name], data)
+        spack_into(self.full_hdr_fmt, data, 0, (ver << 10) | msgtype,
+                   len(data), msgid)
+        self.msgbytes = bytes(data)
+        self.ver, self.msgtype = ver, msgtype
+        self.msglen, self.msgid = len(self.msgbytes), msgid
+        if logger.isEnabledFor(DEBUG):
+            logger.debug('serialized bytes: %s', hexlify(self.msgbytes))
         logger.debug('done serializing %s command', name)
 
     def deserialize(self):
         """Turns a sequence of bytes into a message dictionary."""
         if self.msgbytes is None:
             raise LLRPError('No message bytes to deserialize.')
-        data = self.msgbytes
-        msgtype, length, msgid = sunpack(self.full_hdr_fmt,
-                                         data[:self.full_hdr_len])
-        ver = (msgtype >> 10) & BITMASK(3)
-        msgtype = msgtype & BITMASK(10)
+        if self.msgtype is None:
+            self.parseHeader()
+        self._decoded = True
+        name = self._name
+        logger.debug('deserializing %s command', name)
+        decoder = Message_struct[name]['decode']
+        kwargs = {}
+        if name == 'RO_ACCESS_REPORT':
+            kwargs['tag_format'] = self.tag_format
         try:
-            name = Message_Type2Name[msgtype]
-            logger.debug('deserializing %s command', name)
-            decoder = Message_struct[name]['decode']
-        except KeyError:
-            raise LLRPError('Cannot find decoder for message type '
-                            '{}'.format(msgtype))
-        body = data[self.full_hdr_len:length]
-        try:
-            self.msgdict = {
-                name: dict(decoder(body))
+            msgdict = {
+                name: dict(decoder(self.msgbytes, self.full_hdr_len,
+                                   self.msglen, **kwargs))
             }
-            self.msgdict[name]['Ver'] = ver
-            self.msgdict[name]['Type'] = msgtype
-            self.msgdict[name]['ID'] = msgid
+            msgdict[name]['Ver'] = self.ver
+            msgdict[name]['Type'] = self.msgtype
+            msgdict[name]['ID'] = self.msgid
+            self._msgdict = msgdict
             logger.debug('done deserializing %s command', name)
         except LLRPError:
             logger.exception('Problem with %s message format', name)
@@ -149,9 +179,7 @@ class LLRPMessage(object):
             return False
 
     def getName(self):
-        if not self.msgdict:
-            return None
-        return list(self.msgdict.keys())[0]
+        return self._name
 
     def __repr__(self):
         try:
@@ -162,7 +190,266 @@ class LLRPMessage(object):
         return ret
 
 
-class LLRPProtocol(Protocol):
+def retrieve(future):
+    """Done callback marking the exception of a Future nobody awaits as
+       retrieved."""
+    if not future.cancelled():
+        future.exception()
+
+
+def freeze(value):
+    """Return a hashable copy of a message dict or of one of its values."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+# offset of the CurrentState field in an encoded ROSpec parameter
+ROSPEC_STATE_OFFSET = 9
+
+
+def encodeROSpec(rospec):
+    """Return the encoded ROSpec parameter of rospec."""
+    data = bytearray()
+    encode('ROSpec')(rospec, data)
+    return bytes(data)
+
+
+def sameROSpec(rospec_bytes, other_bytes):
+    """Compare two encoded ROSpec parameters, except for their CurrentState,
+       which the reader changes as it runs the ROSpec."""
+    return len(rospec_bytes) == len(other_bytes) and \
+        rospec_bytes[:ROSPEC_STATE_OFFSET] == \
+        other_bytes[:ROSPEC_STATE_OFFSET] and \
+        rospec_bytes[ROSPEC_STATE_OFFSET + 1:] == \
+        other_bytes[ROSPEC_STATE_OFFSET + 1:]
+
+
+class LLRPMessageCache(object):
+    """Cache of encoded messages, keyed by their content.
+
+       A message that was encoded before is not encoded again: its bytes are
+       copied from the cache and only its ID is patched in.  Messages whose
+       body is a single ROSpecID or AccessSpecID share one cached encoding,
+       with that field patched in as well.
+    """
+    # message name -> (patched field, offset, struct format)
+    PATCHED_FIELDS = {
+        'START_ROSPEC': ('ROSpecID', 10, '!I'),
+        'STOP_ROSPEC': ('ROSpecID', 10, '!I'),
+        'ENABLE_ROSPEC': ('ROSpecID', 10, '!I'),
+        'DISABLE_ROSPEC': ('ROSpecID', 10, '!I'),
+        'DELETE_ROSPEC': ('ROSpecID', 10, '!I'),
+        'ENABLE_ACCESSSPEC': ('AccessSpecID', 10, '!I'),
+        'DISABLE_ACCESSSPEC': ('AccessSpecID', 10, '!I'),
+        'DELETE_ACCESSSPEC': ('AccessSpecID', 10, '!I'),
+    }
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._encoded = {}
+        self.hits = 0
+        self.misses = 0
+
+    def getMessage(self, msgdict):
+        """Return an LLRPMessage holding the encoding of msgdict."""
+        name = list(msgdict.keys())[0]
+        body = msgdict[name]
+        patched = self.PATCHED_FIELDS.get(name)
+        key = (name, freeze(dict((k, v) for k, v in body.items()
+                                 if k != 'ID' and not
+                                 (patched and k == patched[0]))))
+        try:
+            template = self._encoded[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            template = LLRPMessage(msgdict=msgdict)
+            if len(self._encoded) >= self.maxsize:
+                self._encoded.clear()
+            self._encoded[key] = template
+        msgbytes = bytearray(template.msgbytes)
+        spack_into('!I', msgbytes, 6, body['ID'])
+        if patched:
+            field, offset, fmt = patched
+            spack_into(fmt, msgbytes, offset, body[field])
+        msg = LLRPMessage(msgdict=msgdict, msgbytes=bytes(msgbytes))
+        msg.ver = template.ver
+        msg.msgtype = template.msgtype
+        msg.msglen = template.msglen
+        msg.msgid = body['ID']
+        return msg
+
+
+def decodeMessage(msgbytes, tag_format='dict'):
+    """Return the message dict of msgbytes; run in decoding worker processes.
+    """
+    return LLRPMessage(msgbytes=msgbytes, tag_format=tag_format).msgdict
+
+
+def reportEPCs(msg):
+    """Return the set of EPCs in an RO_ACCESS_REPORT message or in its raw
+       bytes, scanning the EPCs only rather than decoding the message."""
+    msgbytes = msg.msgbytes if isinstance(msg, LLRPMessage) else msg
+    msglen = sunpack_from('!I', msgbytes, 2)[0]
+    return set(decode_TagReportEPCs(msgbytes, LLRPMessage.full_hdr_len,
+                                    min(msglen, len(msgbytes))))
+
+
+class IngestQueue(object):
+    """Bounded queue of received messages waiting for their callbacks.
+
+       Callbacks are run from a task on the event loop, one message at a
+       time; a callback may be a coroutine function, which is awaited.  When
+       maxsize messages are queued, policy decides what to do:
+       - pause: stop reading from the reader until the queue is half empty
+         (messages already received in the same read are still queued)
+       - drop-oldest: drop the oldest queued message
+       - drop-newest: drop the new message
+       - drop-duplicates: drop the new message if it is a tag report whose
+         EPCs are all already queued, otherwise drop the oldest message
+    """
+    POLICIES = ('pause', 'drop-oldest', 'drop-newest', 'drop-duplicates')
+    UNSCANNED = object()
+
+    def __init__(self, protocol, maxsize, policy='pause'):
+        if maxsize < 1:
+            raise LLRPError('invalid ingest queue size {}'.format(maxsize))
+        if policy not in self.POLICIES:
+            raise LLRPError('unknown ingest policy {}'.format(policy))
+        self.protocol = protocol
+        self.maxsize = maxsize
+        self.policy = policy
+        # [callbacks, message, EPCs]: with drop-duplicates, the EPCs of a tag
+        # report are only scanned once the queue is full and a duplicate
+        # check needs them; until then they are UNSCANNED
+        self._items = deque()
+        self._queued_epcs = Counter()
+        self._unscanned = 0
+        self._task = None
+        self.paused = False
+        self.high_water = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def getStats(self):
+        return {
+            'depth': len(self._items),
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+            'paused': self.paused,
+        }
+
+    def put(self, msg_name, callbacks, msg):
+        epcs = None
+        if self.policy == 'drop-duplicates' and \
+                msg_name == 'RO_ACCESS_REPORT':
+            epcs = self.UNSCANNED
+        if len(self._items) >= self.maxsize:
+            if self.policy == 'pause':
+                if not self.paused:
+                    logger.debug('ingest queue full; pausing reading')
+                    self.paused = True
+                    self.protocol.transport.pause_reading()
+            else:
+                if epcs is self.UNSCANNED:
+                    epcs = self._scanEPCs(msg)
+                if self.policy == 'drop-newest' or \
+                        (epcs is not None and self._allQueued(epcs)):
+                    self.dropped += 1
+                    return
+                self._popleft()
+                self.dropped += 1
+        self._items.append([callbacks, msg, epcs])
+        if epcs is self.UNSCANNED:
+            self._unscanned += 1
+        elif epcs:
+            self._queued_epcs.update(epcs)
+        self.high_water = max(self.high_water, len(self._items))
+        if self._task is None:
+            self._task = ensure_future(self._run())
+
+    @staticmethod
+    def _scanEPCs(msg):
+        try:
+            return reportEPCs(msg)
+        except LLRPError:
+            logger.warning('cannot scan the EPCs of a tag report',
+                           exc_info=True)
+            return None
+
+    def _allQueued(self, epcs):
+        """Tell whether all of epcs are in tag reports already queued."""
+        if self._unscanned:
+            for item in self._items:
+                if item[2] is self.UNSCANNED:
+                    item[2] = self._scanEPCs(item[1])
+                    if item[2]:
+                        self._queued_epcs.update(item[2])
+            self._unscanned = 0
+        return all(self._queued_epcs[epc] for epc in epcs)
+
+    def _popleft(self):
+        callbacks, msg, epcs = self._items.popleft()
+        if epcs is self.UNSCANNED:
+            self._unscanned -= 1
+        elif epcs:
+            self._queued_epcs.subtract(epcs)
+            for epc in epcs:
+                if self._queued_epcs[epc] <= 0:
+                    del self._queued_epcs[epc]
+        return callbacks, msg
+
+    async def _run(self):
+        try:
+            while self._items:
+                callbacks, msg = self._popleft()
+                if self.paused and len(self._items) <= self.maxsize // 2:
+                    logger.debug('ingest queue drained; resuming reading')
+                    self.paused = False
+                    self.protocol.transport.resume_reading()
+                for fn in callbacks:
+                    try:
+                        ret = fn(msg)
+                        if isawaitable(ret):
+                            await ret
+                    except Exception:
+                        logger.exception('Error in message callback %s', fn)
+                # let the event loop handle other readers and keepalives
+                await sleep(0)
+        finally:
+            self._task = None
+
+
+# what LLRPProtocol does with a received message, according to its type:
+# decode: build an LLRPMessage, run the message callbacks and the state
+#         machine on it (its body is decoded on first access to msgdict)
+# raw:    call the message callbacks with the frame bytes, undecoded
+# drop:   discard the message once its header is parsed
+# Messages the state machine needs (see LLRPProtocol.needsMessage) are still
+# decoded for it; the policy then only says how they reach the callbacks.
+MESSAGE_POLICIES = ('decode', 'raw', 'drop')
+
+# messages which are decoded by default even without callbacks
+DEFAULT_DECODED_MESSAGES = ('READER_EVENT_NOTIFICATION', 'KEEPALIVE',
+                            'ErrorMessage')
+
+
+def messageName(msg_name):
+    """Return the name msg_name is an alias of (e.g. ErrorMessage for
+       ERROR_MESSAGE), or msg_name."""
+    struct = Message_struct.get(msg_name)
+    name = Message_Type2Name.get(struct and struct.get('type'))
+    if name is not None and Message_struct[name] is struct:
+        return name
+    return msg_name
+
+
+class LLRPProtocol(BufferedProtocol):
     STATE_DISCONNECTED = 1
     STATE_CONNECTING = 2
     STATE_CONNECTED = 3
@@ -174,6 +461,25 @@ class LLRPProtocol(Protocol):
     STATE_SENT_GET_CAPABILITIES = 9
     STATE_PAUSING = 10
     STATE_PAUSED = 11
+    STATE_SENT_GET_ROSPECS = 12
+
+    # initial size of the receive buffer; it grows to fit larger messages
+    RX_BUFFER_SIZE = 64 * 1024
+    # minimum free space to offer to the transport for a single read
+    RX_MIN_FREE = 4 * 1024
+
+    # encoded messages, shared by all readers
+    message_cache = LLRPMessageCache()
+
+    KEEPALIVE_TYPE = Message_struct['KEEPALIVE']['type']
+    RO_ACCESS_REPORT_TYPE = Message_struct['RO_ACCESS_REPORT']['type']
+    # KEEPALIVE_ACK never changes: encode it once
+    KEEPALIVE_ACK_BYTES = LLRPMessage(msgdict={
+        'KEEPALIVE_ACK': {
+            'Ver':  1,
+            'Type': 72,
+            'ID':   0,
+        }}).msgbytes
 
     @classmethod
     def getStates(_):
@@ -197,10 +503,19 @@ class LLRPProtocol(Protocol):
                  disconnect_when_done=True,
                  report_timeout_ms=0,
                  tag_content_selector={},
-                 session=2, tag_population=4):
+                 session=2, tag_population=4, tag_format='dict',
+                 message_policy={}, ingest_queue_size=0,
+                 ingest_policy='pause', tag_batch_window_ms=0,
+                 decode_executor=None, pipeline_startup=True,
+                 response_timeout=10.0, capabilities_cache=None,
+                 live_config=False):
         self.factory = factory
+        # LLRPReader of the engine this connection belongs to, if any
+        self.reader = None
         self.transport = None
         self.state = LLRPProtocol.STATE_DISCONNECTED
+        # set once inventory started on this connection
+        self.inventoried = False
         self.report_every_n_tags = report_every_n_tags
         self.report_timeout_ms = report_timeout_ms
         self.capabilities = {}
@@ -214,20 +529,37 @@ class LLRPProtocol(Protocol):
         self.duration = duration
         self.peername = None
         self.tx_power_table = []
-        self.start_inventory = start_inventory
+        # start_inventory is the coroutine below
+        self.inventory_on_connect = start_inventory
         self.reset_on_connect = reset_on_connect
         if self.reset_on_connect:
             logger.info('will reset reader state on connect')
         self.disconnect_when_done = disconnect_when_done
         self.tag_content_selector = tag_content_selector
-        if self.start_inventory:
+        if tag_format not in TAG_FORMATS:
+            raise LLRPError('unknown tag format {}'.format(tag_format))
+        self.tag_format = tag_format
+        if self.inventory_on_connect:
             logger.info('will start inventory on connect')
+        # write the connect sequence in batches rather than waiting for the
+        # response to each request before sending the next
+        self.pipeline_startup = pipeline_startup
+        # CapabilitiesCache to set up known readers before they report their
+        # capabilities
+        self.capabilities_cache = capabilities_cache
+        # leave the transmit power and the report spec to the reader
+        # configuration, so that they change without stopping the ROSpec
+        self.live_config = live_config
 
         logger.info('using antennas: %s', self.antennas)
 
-        # for partial data transfers
-        self.expectingRemainingBytes = 0
-        self.partialData = ''
+        # receive buffer: bytes [_rx_start:_rx_end] have been received but
+        # not yet framed; _rx_need is the length of the pending message, if
+        # its header has already been received
+        self._rx_buffer = bytearray(self.RX_BUFFER_SIZE)
+        self._rx_start = 0
+        self._rx_end = 0
+        self._rx_need = 0
 
         # state-change callbacks: STATE_* -> [list of callables]
         self._state_callbacks = {}
@@ -238,19 +570,169 @@ class LLRPProtocol(Protocol):
         # msg_name -> [list of callables]
         self._message_callbacks = defaultdict(list)
 
-        # Deferreds to fire during state machine machinations
-        self._deferreds = defaultdict(list)
+        # RO_ACCESS_REPORTs are decoded in decode_executor when set (not in
+        # 'stream' format, which decodes as it is iterated over); pending
+        # reports are handled in the order they were received
+        self.decode_executor = None
+        if tag_format != 'stream':
+            self.decode_executor = decode_executor
+        self._pending_reports = deque()
+
+        # tag batch callbacks get the list of RO_ACCESS_REPORTs received in
+        # one read, or within tag_batch_window_ms of the first one
+        self._tag_batch_callbacks = []
+        self.tag_batch_window_ms = tag_batch_window_ms
+        self._tag_batch = []
+        self._tag_batch_timer = None
+
+        # message type -> policy, derived from message_policy and from the
+        # registered callbacks when a message of that type is first received
+        self._type_policy = {}
+        self.message_policy = {}
+        for msg_name, policy in message_policy.items():
+            self.setMessagePolicy(msg_name, policy)
+
+        # with an ingest queue, message callbacks run from a task instead of
+        # inline with the reception of the message
+        self.ingest = None
+        if ingest_queue_size:
+            self.ingest = IngestQueue(self, ingest_queue_size, ingest_policy)
+
+        # requests waiting for a response, by message ID: msgid ->
+        # (response name, Future)
+        self._requests = OrderedDict()
+        # ID of the last message sent on this connection
+        self._msgid = 0
+        # messages to write at once, within pipelined()
+        self._tx_batch = None
+        self.response_timeout = response_timeout
 
         self.disconnecting = False
         self.rospec = None
+        # ROSpecs built by getROSpec, by settings
+        self._rospecs = {}
+
+        # link health: number of KEEPALIVEs received and time.monotonic() of
+        # the last one
+        self.keepalive_count = 0
+        self.last_keepalive_time = None
+
+        # time.monotonic() of the TCP connection, and seconds from then to
+        # the first RO_ACCESS_REPORT
+        self.connect_time = monotonic()
+        self.time_to_first_report = None
 
     def addStateCallback(self, state, cb):
         self._state_callbacks[state].append(cb)
 
     def addMessageCallback(self, msg_type, cb):
-        self._message_callbacks[msg_type].append(cb)
+        self._message_callbacks[messageName(msg_type)].append(cb)
+        self._type_policy.clear()
+
+    def addTagBatchCallback(self, cb):
+        self._tag_batch_callbacks.append(cb)
+        self._type_policy.clear()
+
+    def setMessagePolicy(self, msg_name, policy):
+        """Set what to do with received messages of type msg_name: 'decode',
+           'raw' or 'drop' (see MESSAGE_POLICIES).
+
+           The policy decides how messages reach the message callbacks.
+           The state machine still gets the messages it needs, decoded: see
+           needsMessage."""
+        if policy not in MESSAGE_POLICIES:
+            raise LLRPError('unknown message policy {}'.format(policy))
+        if msg_name not in Message_struct or \
+                'type' not in Message_struct[msg_name]:
+            raise LLRPError('unknown message type {}'.format(msg_name))
+        msg_name = messageName(msg_name)
+        self.message_policy[msg_name] = policy
+        self._type_policy.clear()
+
+    def needsMessage(self, msg_name):
+        """Tell whether the state machine needs received messages of type
+           msg_name decoded, whatever their policy: responses and
+           ErrorMessages always, READER_EVENT_NOTIFICATIONs until the
+           connection attempt is accepted.  KEEPALIVEs are acknowledged from
+           their header."""
+        if msg_name == 'READER_EVENT_NOTIFICATION':
+            return self.state in (LLRPProtocol.STATE_DISCONNECTED,
+                                  LLRPProtocol.STATE_CONNECTING)
+        return msg_name.endswith('_RESPONSE') or msg_name == 'ErrorMessage'
+
+    @staticmethod
+    def isStateMachineMessage(msg_name):
+        return msg_name.endswith('_RESPONSE') or \
+            msg_name in ('READER_EVENT_NOTIFICATION', 'KEEPALIVE',
+                         'ErrorMessage')
+
+    def runMessageCallbacks(self, msg_name, msg):
+        """Run the callbacks registered for msg_name on msg, or queue them
+           when there is an ingest queue."""
+        if msg_name == 'RO_ACCESS_REPORT' and self._tag_batch_callbacks:
+            self.addToTagBatch(msg)
+        callbacks = self._message_callbacks.get(msg_name)
+        if not callbacks:
+            return
+        if self.ingest is not None:
+            self.ingest.put(msg_name, list(callbacks), msg)
+            return
+        for fn in callbacks:
+            ret = fn(msg)
+            if isawaitable(ret):
+                ensure_future(ret)
+
+    def addToTagBatch(self, msg):
+        self._tag_batch.append(msg)
+        if self.tag_batch_window_ms and self._tag_batch_timer is None:
+            self._tag_batch_timer = get_event_loop().call_later(
+                self.tag_batch_window_ms / 1000.0, self.flushTagBatch)
+
+    def flushTagBatch(self):
+        """Run the tag batch callbacks on the tag reports batched so far."""
+        if self._tag_batch_timer is not None:
+            self._tag_batch_timer.cancel()
+            self._tag_batch_timer = None
+        if not self._tag_batch:
+            return
+        batch, self._tag_batch = self._tag_batch, []
+        if self.ingest is not None:
+            self.ingest.put('TAG_BATCH', list(self._tag_batch_callbacks),
+                            batch)
+            return
+        for fn in self._tag_batch_callbacks:
+            ret = fn(batch)
+            if isawaitable(ret):
+                ensure_future(ret)
+
+    def getIngestStats(self):
+        """Return the ingest queue depth and counters, or None when message
+           callbacks run inline."""
+        if self.ingest is None:
+            return None
+        return self.ingest.getStats()
+
+    def getMessagePolicy(self, msg_name):
+        """Return the policy for received messages of type msg_name.
+
+           Unless set with setMessagePolicy, messages are decoded if they have
+           callbacks or are needed by the state machine, and dropped
+           otherwise."""
+        msg_name = messageName(msg_name)
+        try:
+            return self.message_policy[msg_name]
+        except KeyError:
+            pass
+        if self._message_callbacks.get(msg_name) or \
+                (msg_name == 'RO_ACCESS_REPORT' and
+                 self._tag_batch_callbacks) or \
+                msg_name in DEFAULT_DECODED_MESSAGES or \
+                self.isStateMachineMessage(msg_name):
+            return 'decode'
+        return 'drop'
 
     def connection_made(self, t):
+        self.connect_time = monotonic()
         self.transport = t
         sock = t.get_extra_info('socket')
         sock.setsockopt(SOL_SOCKET, SO_KEEPALIVE, True)
@@ -262,7 +744,7 @@ class LLRPProtocol(Protocol):
 
         logger.info('connected to %s (%s:%s)', self.peername, self.peer_ip,
                     self.peer_port)
-        self.factory.protocols.add(self)
+        self.factory.clientConnectionMade(self)
 
     def setState(self, newstate, onComplete=None):
         assert newstate is not None
@@ -271,18 +753,65 @@ class LLRPProtocol(Protocol):
                      LLRPProtocol.getStateName(newstate))
 
         self.state = newstate
+        if newstate == LLRPProtocol.STATE_INVENTORYING and \
+                not self.inventoried:
+            self.inventoried = True
+            if self.reader is not None:
+                self.reader.failures = 0
 
         for fn in self._state_callbacks[newstate]:
             fn(self)
 
-    def _setState_wrapper(self, _, *args, **kwargs):
-        """Version of setState suitable for calling via a Deferred callback.
-           XXX this is a gross hack."""
-        self.setState(args[0], **kwargs)
-
     def connection_lost(self, reason):
-        self.factory.protocols.remove(self)
-        self.factory.clientConnectionLost(reason)
+        self.flushTagBatch()
+        for _, future in self._requests.values():
+            if not future.done():
+                future.set_exception(LLRPError('connection lost'))
+        self._requests.clear()
+        self.factory.clientConnectionLost(self, reason)
+
+    def getCapabilitiesKey(self):
+        """Return the settings parseCapabilities depends on."""
+        return freeze((self.antennas, self.tx_power, self.modulation,
+                       self.tari))
+
+    def setCapabilities(self, capdict):
+        key = self.getCapabilitiesKey()
+        self.capabilities = capdict
+        logger.debug('Capabilities: %s', pformat(self.capabilities))
+        try:
+            self.parseCapabilities(self.capabilities)
+        except LLRPError as err:
+            logger.exception('Capabilities mismatch')
+            raise err
+
+        self.keepCapabilities(key, capdict)
+
+    def keepCapabilities(self, key, capdict):
+        """Keep the capabilities, and the settings parsed from them with the
+           settings key, for the next connection to this reader."""
+        reader = self.reader
+        if reader is not None:
+            if reader.capabilities is not capdict:
+                reader.capabilities = capdict
+                reader.parsed_capabilities.clear()
+            reader.parsed_capabilities[key] = (
+                self.antennas, self.tx_power_table, self.tx_power,
+                self.reader_mode)
+
+    def restoreCapabilities(self):
+        """Set the capabilities the reader reported on a previous
+           connection, parsing them only if the settings changed since."""
+        try:
+            (self.antennas, self.tx_power_table, self.tx_power,
+             self.reader_mode) = \
+                self.reader.parsed_capabilities[self.getCapabilitiesKey()]
+        except KeyError:
+            self.setCapabilities(self.reader.capabilities)
+        else:
+            self.capabilities = self.reader.capabilities
+            logger.debug('reusing capabilities; reader mode: %s',
+                         self.reader_mode)
 
     def parseCapabilities(self, capdict):
         """Parse a capabilities dictionary and adjust instance settings
@@ -338,29 +867,72 @@ class LLRPProtocol(Protocol):
                                     ['UHFC1G2RFModeTableEntry0'])
         logger.info('using reader mode: %s', self.reader_mode)
 
-    def processDeferreds(self, msgName, isSuccess):
-        deferreds = self._deferreds[msgName]
-        if not deferreds:
-            return
-        logger.debug('running %d Deferreds for %s; '
-                     'isSuccess=%s', len(deferreds), msgName, isSuccess)
-        for d in deferreds:
-            if isSuccess:
-                d.callback(self.state)
-            else:
-                d.errback(self.state)
-        del self._deferreds[msgName]
-
-    def handleMessage(self, lmsg):
-        """Implements the LLRP client state machine."""
+    def findRequest(self, msgName, msgid=None):
+        """Return the ID of the request the response msgName with ID msgid
+           answers, or None if no request is waiting for it.
+
+           A reader that does not echo message IDs gets its responses
+           matched to the oldest request of the same type instead."""
+        pending = self._requests.get(msgid)
+        if pending is not None and pending[0] == msgName:
+            return msgid
+        for msgid, (name, _) in self._requests.items():
+            if name == msgName:
+                return msgid
+        return None
+
+    def handleResponse(self, lmsg):
+        """Complete the Future of the request lmsg answers with lmsg, or
+           with an LLRPResponseError if the request failed.  Return False if
+           no request is waiting for lmsg."""
+        msgName = lmsg.getName()
+        msgid = self.findRequest(msgName, lmsg.msgid)
+        if msgid is None:
+            return False
+        _, future = self._requests.pop(msgid)
+        logger.debug('completing request #%d with %s', msgid, msgName)
+        if future.done():
+            # given up on
+            return True
+        if lmsg.isSuccess():
+            future.set_result(lmsg)
+        else:
+            status = lmsg.msgdict[msgName]['LLRPStatus']
+            future.set_exception(LLRPResponseError(
+                '{} failed with status {}: {}'.format(
+                    msgName[:-len('_RESPONSE')], status['StatusCode'],
+                    status['ErrorDescription'])))
+        return True
+
+    def handleErrorMessage(self, lmsg):
+        """Fail the request an ErrorMessage answers, as identified by its
+           message ID.  Return False if no request is waiting for it."""
+        pending = self._requests.pop(lmsg.msgid, None)
+        if pending is None:
+            return False
+        msgName, future = pending
+        if not future.done():
+            status = lmsg.msgdict['ErrorMessage']['LLRPStatus']
+            future.set_exception(LLRPResponseError(
+                '{} failed with status {}: {}'.format(
+                    msgName[:-len('_RESPONSE')], status['StatusCode'],
+                    status['ErrorDescription'])))
+        return True
+
+    def handleMessage(self, lmsg, policy='decode'):
+        """Run the message callbacks, and complete the request lmsg is the
+           response to.  With policy 'raw', the callbacks get the message
+           bytes; with 'drop', they are not run."""
         logger.debug('LLRPMessage received in state %s: %s', self.state, lmsg)
         msgName = lmsg.getName()
         lmsg.peername = self.peername
 
         # call per-message callbacks
         logger.debug('starting message callbacks for %s', msgName)
-        for fn in self._message_callbacks[msgName]:
-            fn(lmsg)
+        if policy == 'decode':
+            self.runMessageCallbacks(msgName, lmsg)
+        elif policy == 'raw':
+            self.runMessageCallbacks(msgName, lmsg.msgbytes)
         logger.debug('done with message callbacks for %s', msgName)
 
         # keepalives can occur at any time
@@ -368,337 +940,325 @@ class LLRPProtocol(Protocol):
             self.send_KEEPALIVE_ACK()
             return
 
-        if msgName == 'RO_ACCESS_REPORT' and \
-                self.state != LLRPProtocol.STATE_INVENTORYING:
-            logger.debug('ignoring RO_ACCESS_REPORT because not inventorying')
+        if msgName == 'RO_ACCESS_REPORT':
+            if self.state != LLRPProtocol.STATE_INVENTORYING:
+                logger.debug('ignoring RO_ACCESS_REPORT because not '
+                             'inventorying')
             return
 
-        logger.debug('in handleMessage(%s), there are %d Deferreds',
-                     msgName, len(self._deferreds[msgName]))
-
-        #######
-        # LLRP client state machine follows.  Beware: gets thorny.  Note the
-        # order of the LLRPProtocol.STATE_* fields.
-        #######
-
-        # in DISCONNECTED, CONNECTING, and CONNECTED states, expect only
-        # READER_EVENT_NOTIFICATION messages.
-        if self.state in (LLRPProtocol.STATE_DISCONNECTED,
-                          LLRPProtocol.STATE_CONNECTING,
-                          LLRPProtocol.STATE_CONNECTED):
-            if msgName != 'READER_EVENT_NOTIFICATION':
-                logger.error('unexpected message %s while connecting', msgName)
+        if msgName == 'READER_EVENT_NOTIFICATION':
+            event = lmsg.msgdict[msgName].get('ReaderEventNotificationData',
+                                              {})
+            if 'ConnectionAttemptEvent' not in event:
                 return
-
             if not lmsg.isSuccess():
-                try:
-                    status = lmsg.msgdict[msgName] \
-                        ['ReaderEventNotificationData'] \
-                        ['ConnectionAttemptEvent']['Status']
-                except KeyError:
-                    status = '(unknown status)'
+                status = event['ConnectionAttemptEvent'].get(
+                    'Status', '(unknown status)')
                 logger.fatal('Could not start session on reader: %s', status)
                 return
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-            # a Deferred to call when we get GET_READER_CAPABILITIES_RESPONSE
-            d = Deferred()
-            d.addCallback(self._setState_wrapper, LLRPProtocol.STATE_CONNECTED)
-            d.addErrback(self.panic, 'GET_READER_CAPABILITIES failed')
-            self.send_GET_READER_CAPABILITIES(onCompletion=d)
-
-        # in state SENT_GET_CAPABILITIES, expect only
-        # GET_CAPABILITIES_RESPONSE;
-        # respond to this message by advancing to state CONNECTED.
-        elif self.state == LLRPProtocol.STATE_SENT_GET_CAPABILITIES:
-            if msgName != 'GET_READER_CAPABILITIES_RESPONSE':
-                logger.error('unexpected response %s when getting '
-                             'capabilities', msgName)
-                return
-
-            if not lmsg.isSuccess():
-                status = lmsg.msgdict[msgName]['LLRPStatus']['StatusCode']
-                err = lmsg.msgdict[msgName]['LLRPStatus']['ErrorDescription']
-                logger.fatal('Error %s getting capabilities: %s', status, err)
-                return
-
-            self.capabilities = \
-                lmsg.msgdict['GET_READER_CAPABILITIES_RESPONSE']
-            logger.debug('Capabilities: %s', pformat(self.capabilities))
-            try:
-                self.parseCapabilities(self.capabilities)
-            except LLRPError as err:
-                logger.exception('Capabilities mismatch')
-                raise err
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-            if self.reset_on_connect:
-                d = self.stopPolitely(disconnect=False)
-                if self.start_inventory:
-                    d.addCallback(self.startInventory)
-            elif self.start_inventory:
-                self.startInventory()
-
-        # in state SENT_ADD_ROSPEC, expect only ADD_ROSPEC_RESPONSE; respond to
-        # favorable ADD_ROSPEC_RESPONSE by enabling the added ROSpec and
-        # advancing to state SENT_ENABLE_ROSPEC.
-        elif self.state == LLRPProtocol.STATE_SENT_ADD_ROSPEC:
-            if msgName != 'ADD_ROSPEC_RESPONSE':
-                logger.error('unexpected response %s when adding ROSpec',
-                             msgName)
-                return
-
-            if not lmsg.isSuccess():
-                status = lmsg.msgdict[msgName]['LLRPStatus']['StatusCode']
-                err = lmsg.msgdict[msgName]['LLRPStatus']['ErrorDescription']
-                logger.fatal('Error %s adding ROSpec: %s', status, err)
-                return
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-        # in state PAUSING, we have sent a DISABLE_ROSPEC, so expect only
-        # DISABLE_ROSPEC_RESPONSE.  advance to state PAUSED.
-        elif self.state == LLRPProtocol.STATE_PAUSING:
-            if msgName != 'DISABLE_ROSPEC_RESPONSE':
-                logger.error('unexpected response %s '
-                             ' when disabling ROSpec', msgName)
-
-            if not lmsg.isSuccess():
-                status = lmsg.msgdict[msgName]['LLRPStatus']['StatusCode']
-                err = lmsg.msgdict[msgName]['LLRPStatus']['ErrorDescription']
-                logger.error('DISABLE_ROSPEC failed with status %s: %s',
-                             status, err)
-                logger.warn('Error %s disabling ROSpec: %s', status, err)
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-        # in state SENT_ENABLE_ROSPEC, expect only ENABLE_ROSPEC_RESPONSE;
-        # respond to favorable ENABLE_ROSPEC_RESPONSE by starting the enabled
-        # ROSpec and advancing to state INVENTORYING.
-        elif self.state == LLRPProtocol.STATE_SENT_ENABLE_ROSPEC:
-            if msgName != 'ENABLE_ROSPEC_RESPONSE':
-                logger.error('unexpected response %s when enabling ROSpec',
-                             msgName)
-
-            if not lmsg.isSuccess():
-                status = lmsg.msgdict[msgName]['LLRPStatus']['StatusCode']
-                err = lmsg.msgdict[msgName]['LLRPStatus']['ErrorDescription']
-                logger.error('ENABLE_ROSPEC failed with status %s: %s',
-                             status, err)
-                logger.fatal('Error %s enabling ROSpec: %s', status, err)
-                return
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-        elif self.state == LLRPProtocol.STATE_INVENTORYING:
-            if msgName not in ('RO_ACCESS_REPORT',
-                               'READER_EVENT_NOTIFICATION',
-                               'ADD_ACCESSSPEC_RESPONSE',
-                               'ENABLE_ACCESSSPEC_RESPONSE',
-                               'DISABLE_ACCESSSPEC_RESPONSE',
-                               'DELETE_ACCESSSPEC_RESPONSE'):
-                logger.error('unexpected message %s while inventorying',
-                             msgName)
+            if self.state != LLRPProtocol.STATE_DISCONNECTED:
+                logger.warning('ignoring ConnectionAttemptEvent in state %s',
+                               LLRPProtocol.getStateName(self.state))
                 return
+            self.setState(LLRPProtocol.STATE_CONNECTING)
+            self.runTask(self.connect_sequence(), 'connect sequence')
+            return
 
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-        elif self.state == LLRPProtocol.STATE_SENT_DELETE_ACCESSSPEC:
-            if msgName != 'DELETE_ACCESSSPEC_RESPONSE':
-                logger.error('unexpected response %s when deleting AccessSpec',
-                             msgName)
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-
-        elif self.state == LLRPProtocol.STATE_SENT_DELETE_ROSPEC:
-            if msgName != 'DELETE_ROSPEC_RESPONSE':
-                logger.error('unexpected response %s when deleting ROSpec',
-                             msgName)
-
-            if lmsg.isSuccess():
-                logger.info('reader finished inventory')
-                if self.disconnecting:
-                    self.setState(LLRPProtocol.STATE_DISCONNECTED)
-                else:
-                    self.setState(LLRPProtocol.STATE_CONNECTED)
-
-            else:
-                status = lmsg.msgdict[msgName]['LLRPStatus']['StatusCode']
-                err = lmsg.msgdict[msgName]['LLRPStatus']['ErrorDescription']
-                logger.error('DELETE_ROSPEC failed with status %s: %s',
-                             status, err)
-
-            self.processDeferreds(msgName, lmsg.isSuccess())
-            if self.disconnecting:
-                logger.info('disconnecting')
-                self.transport.close()
-
-        else:
-            logger.warn('message %s received in unknown state!', msgName)
-
-        if self._deferreds[msgName]:
-            logger.error('there should NOT be Deferreds left for %s,'
-                         ' but there are!', msgName)
-
-    def data_received(self, data):
-        logger.debug('got %d bytes from reader: %s', len(data),
-                     hexlify(data).decode())
-
-        if self.expectingRemainingBytes:
-            if len(data) >= self.expectingRemainingBytes:
-                data = self.partialData + data
-                self.partialData = ''
-                self.expectingRemainingBytes -= len(data)
-            else:
-                # still not enough; wait until next time
-                self.partialData += data
-                self.expectingRemainingBytes -= len(data)
-                return
+        if msgName == 'ErrorMessage':
+            if not self.handleErrorMessage(lmsg):
+                status = lmsg.msgdict[msgName]['LLRPStatus']
+                logger.error('reader error: %s: %s', status['StatusCode'],
+                             status['ErrorDescription'])
+            return
 
-        while data:
-            # parse the message header to grab its length
-            if len(data) >= LLRPMessage.full_hdr_len:
-                msg_type, msg_len, message_id = \
-                    sunpack(LLRPMessage.full_hdr_fmt,
-                            data[:LLRPMessage.full_hdr_len])
-            else:
-                logger.warning('Too few bytes (%d) to unpack message header',
-                               len(data))
-                self.partialData = data
-                self.expectingRemainingBytes = \
-                    LLRPMessage.full_hdr_len - len(data)
-                break
-
-            logger.debug('expect %d bytes (have %d)', msg_len, len(data))
-
-            if len(data) < msg_len:
-                # got too few bytes
-                self.partialData = data
-                self.expectingRemainingBytes = msg_len - len(data)
-                break
+        if not self.handleResponse(lmsg):
+            logger.error('unexpected message %s in state %s', msgName,
+                         LLRPProtocol.getStateName(self.state))
+
+    def get_buffer(self, sizehint):
+        """Return a writable view on the free tail of the receive buffer.
+
+           Pending bytes are moved back to the start of the buffer, or to a
+           larger buffer, only when the free tail is too small for the next
+           read or for the message currently being received."""
+        pending = self._rx_end - self._rx_start
+        want = max(sizehint, self.RX_MIN_FREE, self._rx_need - pending)
+        size = len(self._rx_buffer)
+        if size - self._rx_end < want:
+            while size - pending < want:
+                size *= 2
+            if size == len(self._rx_buffer):
+                self._rx_buffer[:pending] = \
+                    self._rx_buffer[self._rx_start:self._rx_end]
             else:
-                # got at least the right number of bytes
-                self.expectingRemainingBytes = 0
+                # never resize in place: the transport may still hold a view
+                buf = bytearray(size)
+                buf[:pending] = self._rx_buffer[self._rx_start:self._rx_end]
+                self._rx_buffer = buf
+            self._rx_start = 0
+            self._rx_end = pending
+        return memoryview(self._rx_buffer)[self._rx_end:]
+
+    def buffer_updated(self, nbytes):
+        """Cut the messages received so far out of the receive buffer.
+
+           Each complete message is handed to handleFrame() as a memoryview
+           on the receive buffer, which is only valid during that call."""
+        buf = self._rx_buffer
+        start = self._rx_start
+        end = self._rx_end + nbytes
+        self._rx_end = end
+        if logger.isEnabledFor(DEBUG):
+            logger.debug('got %d bytes from reader: %s', nbytes,
+                         hexlify(buf[end - nbytes:end]).decode())
+
+        hdr_len = LLRPMessage.full_hdr_len
+        view = memoryview(buf)
+        try:
+            while end - start >= hdr_len:
+                # parse the message header to grab its length
+                msg_len = sunpack_from('!I', buf, start + 2)[0]
+                if msg_len < hdr_len:
+                    logger.error('Invalid message length %d; discarding %d '
+                                 'buffered bytes', msg_len, end - start)
+                    start = end
+                    break
+                if end - start < msg_len:
+                    # got too few bytes; wait until next time
+                    logger.debug('expect %d bytes (have %d)', msg_len,
+                                 end - start)
+                    break
+                frame = view[start:start + msg_len]
+                start += msg_len
                 try:
-                    lmsg = LLRPMessage(msgbytes=data[:msg_len])
-                    self.handleMessage(lmsg)
-                    data = data[msg_len:]
+                    self.handleFrame(frame)
                 except LLRPError:
-                    logger.exception('Failed to decode LLRPMessage; '
-                                     'will not decode %d remaining bytes',
-                                     len(data))
-                    break
-
-    def panic(self, failure, *args):
-        logger.error('panic(): %s', args)
-        logger.error(failure.getErrorMessage())
-        logger.error(failure.getTraceback())
+                    logger.exception('Failed to decode LLRPMessage')
+                except Exception:
+                    # a bad frame must not kill the connection
+                    logger.exception('Failed to handle LLRPMessage; '
+                                     'dropping it')
+                finally:
+                    frame.release()
+        finally:
+            view.release()
+            if start == end:
+                self._rx_start = self._rx_end = 0
+                self._rx_need = 0
+            else:
+                self._rx_start = start
+                self._rx_need = (sunpack_from('!I', buf, start + 2)[0]
+                                 if end - start >= hdr_len else 0)
+        if not self.tag_batch_window_ms:
+            self.flushTagBatch()
 
-    def complain(self, failure, *args):
-        logger.warn('complain(): %s', args)
+    def data_received(self, data):
+        """Feed received bytes through the buffered receive path, for event
+           loops that do not support BufferedProtocol."""
+        nbytes = len(data)
+        self.get_buffer(nbytes)[:nbytes] = data
+        self.buffer_updated(nbytes)
+
+    def handleFrame(self, frame):
+        """Decode and handle one complete message from the receive buffer."""
+        msgtype = sunpack_from('!H', frame)[0] & BITMASK(10)
+        if msgtype == self.KEEPALIVE_TYPE:
+            self.handleKeepalive(frame)
+            return
+        if msgtype == self.RO_ACCESS_REPORT_TYPE and \
+                self.time_to_first_report is None:
+            self.time_to_first_report = monotonic() - self.connect_time
+            logger.info('first tag report from %s %.3f s after connecting',
+                        self.peername, self.time_to_first_report)
+        try:
+            policy = self._type_policy[msgtype]
+        except KeyError:
+            try:
+                policy = self.getMessagePolicy(Message_Type2Name[msgtype])
+            except KeyError:
+                # unknown type: let LLRPMessage report it
+                policy = 'decode'
+            self._type_policy[msgtype] = policy
+
+        if policy != 'decode' and \
+                not self.needsMessage(Message_Type2Name[msgtype]):
+            if policy == 'raw':
+                # the message outlives the receive buffer slot, so it owns
+                # a copy
+                self.runMessageCallbacks(Message_Type2Name[msgtype],
+                                         bytes(frame))
+            return
+        lmsg = LLRPMessage(msgbytes=bytes(frame), lazy=True,
+                           tag_format=self.tag_format)
+        if self.decode_executor is not None and \
+                lmsg.getName() == 'RO_ACCESS_REPORT':
+            self.decodeReport(lmsg)
+            return
+        self.handleMessage(lmsg, policy)
+
+    def decodeReport(self, lmsg):
+        """Decode a tag report in decode_executor, then handle it once the
+           reports received before it have been handled."""
+        future = get_event_loop().run_in_executor(
+            self.decode_executor, decodeMessage, lmsg.msgbytes,
+            self.tag_format)
+        self._pending_reports.append((lmsg, future))
+        future.add_done_callback(self._reportDecoded)
+
+    def _reportDecoded(self, _):
+        while self._pending_reports and self._pending_reports[0][1].done():
+            lmsg, future = self._pending_reports.popleft()
+            try:
+                lmsg.msgdict = future.result()
+            except Exception:
+                logger.exception('Failed to decode %s', lmsg.getName())
+                continue
+            self.handleMessage(lmsg)
+        if not self.tag_batch_window_ms:
+            self.flushTagBatch()
+
+    def handleKeepalive(self, frame):
+        """Acknowledge a KEEPALIVE without going through the state machine."""
+        self.keepalive_count += 1
+        self.last_keepalive_time = monotonic()
+        self.send_KEEPALIVE_ACK()
+        if not self._message_callbacks.get('KEEPALIVE'):
+            return
+        policy = self.getMessagePolicy('KEEPALIVE')
+        if policy == 'raw':
+            self.runMessageCallbacks('KEEPALIVE', bytes(frame))
+        elif policy == 'decode':
+            lmsg = LLRPMessage(msgbytes=bytes(frame), lazy=True)
+            lmsg.peername = self.peername
+            self.runMessageCallbacks('KEEPALIVE', lmsg)
+
+    def runTask(self, coro, what):
+        """Run the coroutine coro in a Task, and return the Task.  Its
+           failure is logged, whether the Task is awaited or not."""
+        task = ensure_future(coro)
+        task.add_done_callback(partial(self._taskDone, what))
+        return task
+
+    def _taskDone(self, what, task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error('%s failed on %s: %s', what, self.peername,
+                         str(exc) or type(exc).__name__)
+
+    async def response(self, future, timeout=None):
+        """Wait for the response to a request and return it.  Raise
+           LLRPResponseError if the request failed and asyncio.TimeoutError
+           if no response came within timeout (response_timeout by
+           default)."""
+        if timeout is None:
+            timeout = self.response_timeout
+        return await wait_for(future, timeout)
 
     def send_KEEPALIVE_ACK(self):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
-            'KEEPALIVE_ACK': {
-                'Ver':  1,
-                'Type': 72,
-                'ID':   0,
-            }}))
+        self.transport.write(self.KEEPALIVE_ACK_BYTES)
 
-    def send_GET_READER_CAPABILITIES(self, onCompletion):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_GET_READER_CAPABILITIES(self):
+        return self.request({
             'GET_READER_CAPABILITIES': {
                 'Ver':  1,
                 'Type': 1,
-                'ID':   0,
                 'RequestedData': Capability_Name2Type['All']
-            }}))
-        self.setState(LLRPProtocol.STATE_SENT_GET_CAPABILITIES)
-        self._deferreds['GET_READER_CAPABILITIES_RESPONSE'].append(onCompletion)
+            }})
 
-    def send_ADD_ROSPEC(self, rospec, onCompletion):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_GET_READER_CONFIG(self, requestedData='All', antennaID=0):
+        return self.request({
+            'GET_READER_CONFIG': {
+                'Ver':  1,
+                'Type': 2,
+                'AntennaID': antennaID,
+                'RequestedData': requestedData,
+            }})
+
+    def send_SET_READER_CONFIG(self, config, resetToFactoryDefault=False):
+        msgdict = {
+            'Ver':  1,
+            'Type': 3,
+            'ResetToFactoryDefault': resetToFactoryDefault,
+        }
+        msgdict.update(config)
+        return self.request({'SET_READER_CONFIG': msgdict})
+
+    def send_GET_ROSPECS(self):
+        return self.request({
+            'GET_ROSPECS': {
+                'Ver':  1,
+                'Type': 26,
+            }})
+
+    def send_ADD_ROSPEC(self, rospec):
+        return self.request({
             'ADD_ROSPEC': {
                 'Ver':  1,
                 'Type': 20,
-                'ID':   0,
                 'ROSpecID': rospec['ROSpecID'],
                 'ROSpec': rospec,
-            }}))
-        self.setState(LLRPProtocol.STATE_SENT_ADD_ROSPEC)
-        self._deferreds['ADD_ROSPEC_RESPONSE'].append(onCompletion)
+            }})
 
-    def send_ENABLE_ROSPEC(self, _, rospec, onCompletion):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_ENABLE_ROSPEC(self, rospec):
+        return self.request({
             'ENABLE_ROSPEC': {
                 'Ver':  1,
                 'Type': 24,
-                'ID':   0,
                 'ROSpecID': rospec['ROSpecID']
-            }}))
-        self.setState(LLRPProtocol.STATE_SENT_ENABLE_ROSPEC)
-        self._deferreds['ENABLE_ROSPEC_RESPONSE'].append(onCompletion)
+            }})
+
+    def send_DISABLE_ROSPEC(self, rospec):
+        return self.request({
+            'DISABLE_ROSPEC': {
+                'Ver':  1,
+                'Type': 25,
+                'ROSpecID': rospec['ROSpecID']
+            }})
+
+    def send_DELETE_ROSPEC(self, rospecID=0):
+        return self.request({
+            'DELETE_ROSPEC': {
+                'Ver':  1,
+                'Type': 21,
+                'ROSpecID': rospecID  # 0: all ROSpecs
+            }})
 
-    def send_ADD_ACCESSSPEC(self, accessSpec, onCompletion):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_ADD_ACCESSSPEC(self, accessSpec):
+        return self.request({
             'ADD_ACCESSSPEC': {
                 'Ver':  1,
                 'Type': 40,
-                'ID':   0,
                 'AccessSpec': accessSpec,
-            }}))
-        self._deferreds['ADD_ACCESSSPEC_RESPONSE'].append(onCompletion)
+            }})
 
-    def send_DISABLE_ACCESSSPEC(self, accessSpecID=1, onCompletion=None):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_DISABLE_ACCESSSPEC(self, accessSpecID=1):
+        return self.request({
             'DISABLE_ACCESSSPEC': {
                 'Ver':  1,
                 'Type': 43,
-                'ID':   0,
                 'AccessSpecID': accessSpecID,
-            }}))
+            }})
 
-        if onCompletion:
-            self._deferreds['DISABLE_ACCESSSPEC_RESPONSE'].append(onCompletion)
-
-    def send_ENABLE_ACCESSSPEC(self, _, accessSpecID, onCompletion=None):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_ENABLE_ACCESSSPEC(self, accessSpecID=1):
+        return self.request({
             'ENABLE_ACCESSSPEC': {
                 'Ver':  1,
                 'Type': 42,
-                'ID':   0,
                 'AccessSpecID': accessSpecID,
-            }}))
-
-        if onCompletion:
-            self._deferreds['ENABLE_ACCESSSPEC_RESPONSE'].append(onCompletion)
+            }})
 
-    def send_DELETE_ACCESSSPEC(self, placeHolderArg, readSpecParam,
-                               writeSpecParam, stopParam, accessSpecID=1,
-                               onCompletion=None):
-        # logger.info('Deleting current accessSpec.')
-        self.sendLLRPMessage(LLRPMessage(msgdict={
+    def send_DELETE_ACCESSSPEC(self, accessSpecID=1):
+        return self.request({
             'DELETE_ACCESSSPEC': {
                 'Ver': 1,
                 'Type': 41,
-                'ID': 0,
-                'AccessSpecID': accessSpecID  # ONE AccessSpec
-            }}))
-
-        # Hackfix to chain startAccess to send_DELETE, since appending a
-        # deferred doesn't seem to work...
-        loop = get_event_loop()
-        loop.call_soon(partial(self.startAccess,
-                               readWords=readSpecParam,
-                               writeWords=writeSpecParam,
-                               accessStopParam=stopParam,
-                               accessSpecID=accessSpecID))
+                'AccessSpecID': accessSpecID  # 0: all AccessSpecs
+            }})
 
-    def startAccess(self, readWords=None, writeWords=None, target=None,
-                    accessStopParam=None, accessSpecID=1, param=None,
-                    *args):
+    def buildAccessSpec(self, readWords=None, writeWords=None, target=None,
+                        accessStopParam=None, accessSpecID=1, param=None):
         m = Message_struct['AccessSpec']
         if not target:
             target = {
@@ -772,53 +1332,334 @@ class LLRPProtocol(Protocol):
                 'AccessReportTrigger': 1  # report at end of access
             }
         }
+        return accessSpec
+
+    async def add_access_spec(self, readWords=None, writeWords=None,
+                              target=None, accessStopParam=None,
+                              accessSpecID=1, param=None, timeout=None):
+        """Add an AccessSpec reading readWords, writing writeWords or
+           running the OpSpec param, and enable it."""
+        accessSpec = self.buildAccessSpec(readWords, writeWords, target,
+                                          accessStopParam, accessSpecID,
+                                          param)
+        await self.response(self.send_ADD_ACCESSSPEC(accessSpec), timeout)
+        await self.response(self.send_ENABLE_ACCESSSPEC(accessSpecID),
+                            timeout)
+
+    async def next_access(self, readSpecPar=None, writeSpecPar=None,
+                          stopSpecPar=None, accessSpecID=1, param=None,
+                          timeout=None):
+        """Replace AccessSpec accessSpecID with a new one."""
+        for send in (self.send_DISABLE_ACCESSSPEC,
+                     self.send_DELETE_ACCESSSPEC):
+            try:
+                await self.response(send(accessSpecID), timeout)
+            except LLRPResponseError as err:
+                logger.warn('%s', err)
+        await self.add_access_spec(readSpecPar, writeSpecPar,
+                                   accessStopParam=stopSpecPar,
+                                   accessSpecID=accessSpecID, param=param,
+                                   timeout=timeout)
 
-        d = Deferred()
-        d.addCallback(self.send_ENABLE_ACCESSSPEC, accessSpecID)
-        d.addErrback(self.panic, 'ADD_ACCESSSPEC failed')
-
-        self.send_ADD_ACCESSSPEC(accessSpec, onCompletion=d)
+    def startAccess(self, readWords=None, writeWords=None, target=None,
+                    accessStopParam=None, accessSpecID=1, param=None,
+                    *args):
+        return self.runTask(
+            self.add_access_spec(readWords, writeWords, target,
+                                 accessStopParam, accessSpecID, param),
+            'startAccess')
 
     def nextAccess(self, readSpecPar, writeSpecPar, stopSpecPar,
                    accessSpecID=1):
-        d = Deferred()
-        d.addCallback(self.send_DELETE_ACCESSSPEC, readSpecPar, writeSpecPar,
-                      stopSpecPar, accessSpecID)
-        d.addErrback(self.send_DELETE_ACCESSSPEC, readSpecPar, writeSpecPar,
-                     stopSpecPar, accessSpecID)
-        # d.addErrback(self.panic, 'DISABLE_ACCESSSPEC failed')
+        return self.runTask(
+            self.next_access(readSpecPar, writeSpecPar, stopSpecPar,
+                             accessSpecID),
+            'nextAccess')
+
+    async def connect_sequence(self):
+        """Get the reader capabilities, reset the reader with
+           reset_on_connect, and start inventory with start_inventory.
+
+           With pipeline_startup, the requests that do not depend on each
+           other's responses are written back to back.
+
+           On reconnection to a reader, its capabilities are not requested
+           again, and neither is its ROSpec reset if the reader still has
+           the one last added to it (see warm_connect)."""
+        if self.reader is not None and self.reader.capabilities:
+            await self.warm_connect()
+            return
+        cache = self.capabilities_cache
+        if cache is not None and self.pipeline_startup and \
+                self.inventory_on_connect:
+            identity, capdict = cache.lookup(self.getHost())
+            if capdict is not None:
+                await self.cached_connect(identity, capdict)
+                return
+        if self.pipeline_startup:
+            with self.pipelined():
+                got_caps = self.send_GET_READER_CAPABILITIES()
+                got_id = None
+                if cache is not None:
+                    got_id = self.send_GET_READER_CONFIG('Identification')
+                deleted = []
+                if self.reset_on_connect:
+                    deleted.append(self.send_DELETE_ACCESSSPEC(0))
+                    deleted.append(self.send_DELETE_ROSPEC(0))
+            self.setState(LLRPProtocol.STATE_SENT_GET_CAPABILITIES)
+            try:
+                caps = await self.response(got_caps)
+                self.setCapabilities(caps.msgdict[caps.getName()])
+                if got_id is not None:
+                    await self.cacheCapabilities(got_id, self.capabilities)
+            except Exception:
+                for future in deleted + [got_id]:
+                    if future is not None:
+                        future.add_done_callback(retrieve)
+                raise
+            self.setState(LLRPProtocol.STATE_CONNECTED)
+            for future in deleted:
+                try:
+                    await self.response(future)
+                except LLRPResponseError as err:
+                    logger.warn('%s', err)
+        else:
+            got_caps = self.send_GET_READER_CAPABILITIES()
+            self.setState(LLRPProtocol.STATE_SENT_GET_CAPABILITIES)
+            caps = await self.response(got_caps)
+            self.setCapabilities(caps.msgdict[caps.getName()])
+            if cache is not None:
+                await self.cacheCapabilities(
+                    self.send_GET_READER_CONFIG('Identification'),
+                    self.capabilities)
+            self.setState(LLRPProtocol.STATE_CONNECTED)
+            if self.reset_on_connect:
+                await self.stop_politely(disconnect=False)
+        if self.inventory_on_connect:
+            await self.start_inventory()
+
+    def getHost(self):
+        """Return the host of the reader, as given to the engine."""
+        if self.reader is not None:
+            return self.reader.host
+        return self.peer_ip
+
+    async def cacheCapabilities(self, got_id, capdict):
+        """Save the capabilities of the reader to capabilities_cache, once
+           it identified itself in the response to the GET_READER_CONFIG
+           request got_id; return its identity, or None."""
+        try:
+            config = await self.response(got_id)
+        except LLRPResponseError as err:
+            logger.warn('cannot identify reader: %s', err)
+            return None
+        identification = config.msgdict[config.getName()].get(
+            'Identification')
+        if identification is None:
+            logger.warn('reader did not identify itself')
+            return None
+        return self.capabilities_cache.update(self.getHost(), identification,
+                                              capdict)
+
+    async def cached_connect(self, identity, capdict):
+        """Start inventory with the capabilities cached for the reader,
+           without waiting for it to report them.
+
+           The reader is still asked for its capabilities and identity: if
+           it turns out to be another reader, or to run another firmware, it
+           is reset and set up again with its actual capabilities."""
+        requested = (self.antennas, self.tx_power)
+        key = self.getCapabilitiesKey()
+        self.capabilities = capdict
+        self.parseCapabilities(capdict)
+        spec = self.getROSpec()
+        rospec = spec['ROSpec']
+        logger.info('starting inventory with the cached capabilities of %s',
+                    identity)
+
+        with self.pipelined():
+            got_caps = self.send_GET_READER_CAPABILITIES()
+            got_id = self.send_GET_READER_CONFIG('Identification')
+            deleted = []
+            if self.reset_on_connect:
+                deleted.append(self.send_DELETE_ACCESSSPEC(0))
+                deleted.append(self.send_DELETE_ROSPEC(0))
+            configured = self.sendROSpecConfig(spec)
+            added = self.send_ADD_ROSPEC(rospec)
+            enabled = self.send_ENABLE_ROSPEC(rospec)
+        pending = [future for future in deleted + [configured, added, enabled]
+                   if future is not None]
+        self.setState(LLRPProtocol.STATE_SENT_GET_CAPABILITIES)
+        try:
+            caps = await self.response(got_caps)
+            caps = caps.msgdict[caps.getName()]
+            actual = await self.cacheCapabilities(got_id, caps)
+        except Exception:
+            for future in pending:
+                future.add_done_callback(retrieve)
+            raise
+
+        if actual != identity:
+            logger.info('reader is now %s, setting it up again', actual)
+            await gather(*[self.response(future) for future in pending],
+                         return_exceptions=True)
+            self.antennas, self.tx_power = requested
+            self.rospec = None
+            self.setCapabilities(caps)
+            self.setState(LLRPProtocol.STATE_CONNECTED)
+            await self.stop_politely(disconnect=False)
+            await self.start_inventory()
+            return
+
+        self.capabilities = caps
+        self.keepCapabilities(key, caps)
+        self.setState(LLRPProtocol.STATE_CONNECTED)
+        for future in deleted:
+            try:
+                await self.response(future)
+            except LLRPResponseError as err:
+                logger.warn('%s', err)
+        self.setState(LLRPProtocol.STATE_SENT_ADD_ROSPEC)
+        try:
+            if configured is not None:
+                await self.response(configured)
+            await self.response(added)
+        except Exception:
+            added.add_done_callback(retrieve)
+            enabled.add_done_callback(retrieve)
+            raise
+        self.setAddedROSpec(rospec)
+        self.setState(LLRPProtocol.STATE_SENT_ENABLE_ROSPEC)
+        await self.response(enabled)
+        self.setState(LLRPProtocol.STATE_INVENTORYING)
+        self.scheduleStop()
+
+    async def warm_connect(self):
+        """Reuse the state of the previous connection to the reader.
+
+           The reader is asked for its ROSpecs: if it only has the ROSpec
+           last added to it, which this connection would add again, the
+           inventory goes on with it instead of resetting the reader."""
+        self.restoreCapabilities()
+        self.setState(LLRPProtocol.STATE_CONNECTED)
+        rospec_bytes = self.reader.rospec_bytes
+        if not (self.inventory_on_connect and rospec_bytes and
+                sameROSpec(rospec_bytes,
+                           encodeROSpec(self.getROSpec()['ROSpec']))):
+            if self.reset_on_connect:
+                await self.stop_politely(disconnect=False)
+            if self.inventory_on_connect:
+                await self.start_inventory()
+            return
 
-        self.send_DISABLE_ACCESSSPEC(accessSpecID, onCompletion=d)
+        # the reader configuration may have changed in the meantime: push it
+        # along, it costs no round trip
+        with self.pipelined():
+            got_rospecs = self.send_GET_ROSPECS()
+            configured = self.sendROSpecConfig(self.rospec)
+        self.setState(LLRPProtocol.STATE_SENT_GET_ROSPECS)
+        try:
+            rospecs = await self.response(got_rospecs)
+        except Exception:
+            if configured is not None:
+                configured.add_done_callback(retrieve)
+            raise
+        rospecs = rospecs.msgdict['GET_ROSPECS_RESPONSE']['ROSpec']
+        if configured is not None:
+            await self.response(configured)
+        self.setState(LLRPProtocol.STATE_CONNECTED)
+        if len(rospecs) != 1 or \
+                not sameROSpec(rospecs[0]['ROSpecBytes'], rospec_bytes):
+            logger.info('reader ROSpecs changed since the last connection')
+            self.reader.rospec_bytes = None
+            if self.reset_on_connect:
+                await self.stop_politely(disconnect=False)
+            await self.start_inventory()
+            return
 
-    def startInventory(self, *args):
+        logger.info('resuming inventory with the ROSpec of the last '
+                    'connection (%s)', rospecs[0]['CurrentState'])
+        self.scheduleStop()
+        if rospecs[0]['CurrentState'] == 'Disabled':
+            enabled = self.send_ENABLE_ROSPEC(self.rospec['ROSpec'])
+            self.setState(LLRPProtocol.STATE_SENT_ENABLE_ROSPEC)
+            await self.response(enabled)
+        self.setState(LLRPProtocol.STATE_INVENTORYING)
+
+    async def start_inventory(self, timeout=None):
         """Add a ROSpec to the reader and enable it."""
         if self.state == LLRPProtocol.STATE_INVENTORYING:
             logger.warn('ignoring startInventory() while already inventorying')
-            return None
+            return
 
-        rospec = self.getROSpec()['ROSpec']
+        spec = self.getROSpec()
+        rospec = spec['ROSpec']
 
         logger.info('starting inventory')
 
-        started = Deferred()
-        started.addCallback(self._setState_wrapper,
-                            LLRPProtocol.STATE_INVENTORYING)
-        started.addErrback(self.panic, 'ENABLE_ROSPEC failed')
+        self.scheduleStop()
 
+        if self.pipeline_startup:
+            # the reader handles requests in order: ENABLE_ROSPEC can follow
+            # ADD_ROSPEC without waiting for its response
+            with self.pipelined():
+                configured = self.sendROSpecConfig(spec)
+                added = self.send_ADD_ROSPEC(rospec)
+                enabled = self.send_ENABLE_ROSPEC(rospec)
+            self.setState(LLRPProtocol.STATE_SENT_ADD_ROSPEC)
+            try:
+                if configured is not None:
+                    await self.response(configured, timeout)
+                await self.response(added, timeout)
+            except Exception:
+                added.add_done_callback(retrieve)
+                enabled.add_done_callback(retrieve)
+                raise
+            self.setAddedROSpec(rospec)
+        else:
+            configured = self.sendROSpecConfig(spec)
+            if configured is not None:
+                await self.response(configured, timeout)
+            added = self.send_ADD_ROSPEC(rospec)
+            self.setState(LLRPProtocol.STATE_SENT_ADD_ROSPEC)
+            await self.response(added, timeout)
+            self.setAddedROSpec(rospec)
+            enabled = self.send_ENABLE_ROSPEC(rospec)
+        self.setState(LLRPProtocol.STATE_SENT_ENABLE_ROSPEC)
+        await self.response(enabled, timeout)
+        self.setState(LLRPProtocol.STATE_INVENTORYING)
+
+    def scheduleStop(self):
+        """Stop the inventory and disconnect after duration seconds, if
+           set."""
         if self.duration:
             loop = get_event_loop()
             loop.call_later(self.duration, self.stopPolitely, True)
 
-        d = Deferred()
-        d.addCallback(self.send_ENABLE_ROSPEC, rospec, onCompletion=started)
-        d.addErrback(self.panic, 'ADD_ROSPEC failed')
+    def setAddedROSpec(self, rospec):
+        """Remember the ROSpec added to the reader, for the next connection
+           to it."""
+        if self.reader is not None:
+            self.reader.rospec_bytes = encodeROSpec(rospec)
 
-        self.send_ADD_ROSPEC(rospec, onCompletion=d)
+    def startInventory(self, *args):
+        return self.runTask(self.start_inventory(), 'startInventory')
 
     def getROSpec(self, force_new=False):
         if self.rospec and not force_new:
             return self.rospec
 
+        # ROSpecs already built with the same settings are reused
+        key = freeze((self.reader_mode, self.duration,
+                      self.report_every_n_tags, self.report_timeout_ms,
+                      self.tx_power, self.antennas, self.tag_content_selector,
+                      self.session, self.tag_population))
+        try:
+            self.rospec = self._rospecs[key]
+            return self.rospec
+        except KeyError:
+            pass
+
         # create an ROSpec to define the reader's inventorying behavior
         self.rospec = LLRPROSpec(
             self, 1, duration_sec=self.duration,
@@ -828,48 +1669,49 @@ class LLRPProtocol(Protocol):
             antennas=self.antennas,
             tag_content_selector=self.tag_content_selector,
             session=self.session,
-            tag_population=self.tag_population)
+            tag_population=self.tag_population,
+            reader_config=self.live_config)
         logger.debug('ROSpec: %s', self.rospec)
+        self._rospecs[key] = self.rospec
         return self.rospec
 
-    def stopPolitely(self, disconnect=False):
-        """Delete all active ROSpecs.  Return a Deferred that will be called
-           when the DELETE_ROSPEC_RESPONSE comes back."""
+    async def stop_politely(self, disconnect=False, timeout=None):
+        """Delete all AccessSpecs and ROSpecs, then disconnect if
+           disconnect is set."""
         logger.info('stopping politely')
         if disconnect:
             logger.info('will disconnect when stopped')
             self.disconnecting = True
-        self.sendLLRPMessage(LLRPMessage(msgdict={
-            'DELETE_ACCESSSPEC': {
-                'Ver': 1,
-                'Type': 41,
-                'ID': 0,
-                'AccessSpecID': 0  # all AccessSpecs
-            }}))
-        self.setState(LLRPProtocol.STATE_SENT_DELETE_ACCESSSPEC)
-
-        d = Deferred()
-        d.addCallback(self.stopAllROSpecs)
-        d.addErrback(self.panic, 'DELETE_ACCESSSPEC failed')
 
-        self._deferreds['DELETE_ACCESSSPEC_RESPONSE'].append(d)
-        return d
-
-    def stopAllROSpecs(self, *args):
-        self.sendLLRPMessage(LLRPMessage(msgdict={
-            'DELETE_ROSPEC': {
-                'Ver':  1,
-                'Type': 21,
-                'ID':   0,
-                'ROSpecID': 0
-            }}))
-        self.setState(LLRPProtocol.STATE_SENT_DELETE_ROSPEC)
+        try:
+            deleted = self.send_DELETE_ACCESSSPEC(0)
+            self.setState(LLRPProtocol.STATE_SENT_DELETE_ACCESSSPEC)
+            try:
+                await self.response(deleted, timeout)
+            except LLRPResponseError as err:
+                logger.error('%s', err)
 
-        d = Deferred()
-        d.addErrback(self.panic, 'DELETE_ROSPEC failed')
+            deleted = self.send_DELETE_ROSPEC(0)
+            self.setState(LLRPProtocol.STATE_SENT_DELETE_ROSPEC)
+            try:
+                await self.response(deleted, timeout)
+            except LLRPResponseError as err:
+                logger.error('%s', err)
+            else:
+                if self.reader is not None:
+                    self.reader.rospec_bytes = None
+                logger.info('reader finished inventory')
+                if self.disconnecting:
+                    self.setState(LLRPProtocol.STATE_DISCONNECTED)
+                else:
+                    self.setState(LLRPProtocol.STATE_CONNECTED)
+        finally:
+            if self.disconnecting:
+                logger.info('disconnecting')
+                self.transport.close()
 
-        self._deferreds['DELETE_ROSPEC_RESPONSE'].append(d)
-        return d
+    def stopPolitely(self, disconnect=False):
+        return self.runTask(self.stop_politely(disconnect), 'stopPolitely')
 
     @staticmethod
     def parsePowerTable(uhfbandcap):
@@ -930,10 +1772,51 @@ class LLRPProtocol(Protocol):
         self.tx_power = tx_pow_idx
         logger.debug('tx_power: %s (%s dBm)', tx_pow_idx, tx_pow_dbm)
 
-        if self.state == LLRPProtocol.STATE_INVENTORYING:
+        self.applySettings('setTxPower')
+
+    def setTagContentSelector(self, tag_content_selector):
+        """Change the fields reported for each tag."""
+        self.tag_content_selector = tag_content_selector
+        self.applySettings('setTagContentSelector')
+
+    def applySettings(self, what):
+        """Apply changed settings to a running inventory: through the reader
+           configuration with live_config, or else by pausing the inventory
+           to regenerate the ROSpec."""
+        if self.state != LLRPProtocol.STATE_INVENTORYING:
+            return
+        if self.live_config:
+            self.runTask(self.apply_reader_config(), what)
+        else:
             self.pause(0.5, force_regen_rospec=True)
 
-    def pause(self, duration_seconds=0, force=False, force_regen_rospec=False):
+    async def apply_reader_config(self, timeout=None):
+        """Set the reader configuration the ROSpec relies on with
+           live_config, after a change of settings."""
+        spec = self.getROSpec(force_new=True)
+        await self.set_reader_config(spec.reader_config, timeout)
+
+    async def get_reader_config(self, requestedData='All', antennaID=0,
+                                timeout=None):
+        """Return the GET_READER_CONFIG_RESPONSE of the reader."""
+        got_config = self.send_GET_READER_CONFIG(requestedData, antennaID)
+        config = await self.response(got_config, timeout)
+        return config.msgdict[config.getName()]
+
+    async def set_reader_config(self, config, timeout=None):
+        """Set the SET_READER_CONFIG parameters in config, e.g.
+           AntennaConfiguration, ROReportSpec or KeepaliveSpec."""
+        await self.response(self.send_SET_READER_CONFIG(config), timeout)
+
+    def sendROSpecConfig(self, spec):
+        """Send the reader configuration the LLRPROSpec spec relies on, if
+           any; return the Future of the response, or None."""
+        if spec.reader_config is None:
+            return None
+        return self.send_SET_READER_CONFIG(spec.reader_config)
+
+    async def pause_inventory(self, duration_seconds=0, force=False,
+                              force_regen_rospec=False, timeout=None):
         """Pause an inventory operation for a set amount of time."""
         logger.debug('pause(%s)', duration_seconds)
         if self.state != LLRPProtocol.STATE_INVENTORYING:
@@ -948,65 +1831,174 @@ class LLRPProtocol(Protocol):
 
         rospec = self.getROSpec(force_new=force_regen_rospec)['ROSpec']
 
-        self.sendLLRPMessage(LLRPMessage(msgdict={
-            'DISABLE_ROSPEC': {
-                'Ver':  1,
-                'Type': 25,
-                'ID':   0,
-                'ROSpecID': rospec['ROSpecID']
-            }}))
+        disabled = self.send_DISABLE_ROSPEC(rospec)
+        state = self.state
         self.setState(LLRPProtocol.STATE_PAUSING)
 
-        d = Deferred()
-        d.addCallback(self._setState_wrapper, LLRPProtocol.STATE_PAUSED)
-        d.addErrback(self.complain, 'pause() failed')
-        self._deferreds['DISABLE_ROSPEC_RESPONSE'].append(d)
-
         if duration_seconds > 0:
             loop = get_event_loop()
             loop.call_later(duration_seconds, self.resume)
 
-        return d
+        try:
+            await self.response(disabled, timeout)
+        except Exception:
+            self.setState(state)
+            raise
+        self.setState(LLRPProtocol.STATE_PAUSED)
 
-    def resume(self):
+    def pause(self, duration_seconds=0, force=False, force_regen_rospec=False):
+        return self.runTask(
+            self.pause_inventory(duration_seconds, force, force_regen_rospec),
+            'pause')
+
+    async def resume_inventory(self, timeout=None):
         logger.debug('Resuming')
         if self.state in (LLRPProtocol.STATE_CONNECTED,
                           LLRPProtocol.STATE_DISCONNECTED):
-            self.startInventory()
+            await self.start_inventory(timeout)
             return
 
         if self.state != LLRPProtocol.STATE_PAUSED:
             logger.debug('cannot resume() if not paused; ignoring')
-            return None
+            return
 
         logger.info('resuming')
 
         rospec = self.getROSpec()['ROSpec']
 
-        d = Deferred()
-        d.addCallback(self._setState_wrapper, LLRPProtocol.STATE_INVENTORYING)
-        d.addErrback(self.panic, 'resume() failed')
-        self.send_ENABLE_ROSPEC(None, rospec, onCompletion=d)
+        enabled = self.send_ENABLE_ROSPEC(rospec)
+        self.setState(LLRPProtocol.STATE_SENT_ENABLE_ROSPEC)
+        try:
+            await self.response(enabled, timeout)
+        except Exception:
+            self.setState(LLRPProtocol.STATE_PAUSED)
+            raise
+        self.setState(LLRPProtocol.STATE_INVENTORYING)
+
+    def resume(self):
+        return self.runTask(self.resume_inventory(), 'resume')
+
+    def nextMessageID(self):
+        """Return the ID of the next message sent on this connection."""
+        self._msgid = (self._msgid + 1) & BITMASK(32) or 1
+        return self._msgid
+
+    def request(self, msgdict):
+        """Send the message described by msgdict, with the next message ID,
+           and return a Future for its response (see response()).  Several
+           requests may be in flight at once."""
+        name = list(msgdict.keys())[0]
+        msgid = self.nextMessageID()
+        msgdict[name]['ID'] = msgid
+        future = get_event_loop().create_future()
+        self._requests[msgid] = (name + '_RESPONSE', future)
+        future.add_done_callback(partial(self._requestDone, msgid))
+        self.sendLLRPMessage(self.message_cache.getMessage(msgdict))
+        return future
+
+    def _requestDone(self, msgid, future):
+        if future.cancelled():
+            # timed out: forget the request
+            self._requests.pop(msgid, None)
+
+    @contextmanager
+    def pipelined(self):
+        """Within this context, the messages sent are written in a single
+           transport.writelines call when the context exits."""
+        self._tx_batch = []
+        try:
+            yield
+        finally:
+            batch, self._tx_batch = self._tx_batch, None
+            if batch:
+                self.transport.writelines(batch)
 
     def sendLLRPMessage(self, llrp_msg):
         assert isinstance(llrp_msg, LLRPMessage)
         assert llrp_msg.msgbytes, "LLRPMessage is empty"
+        if self._tx_batch is not None:
+            self._tx_batch.append(llrp_msg.msgbytes)
+            return
         self.transport.write(llrp_msg.msgbytes)
 
 
+class LLRPReader(object):
+    """Connection state of one reader of an LLRPEngine: its address, the
+       protocol of the current connection, if any, and the reconnection
+       backoff."""
+
+    def __init__(self, host, port, timeout, reader_initiated=False):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        # the reader connects to the engine (see LLRPEngine.listen); the
+        # engine never dials it
+        self.reader_initiated = reader_initiated
+        self.protocol = None
+        # connection attempts since the last one that started inventory
+        self.failures = 0
+        # pending reconnection (asyncio.TimerHandle)
+        self.reconnect_handle = None
+        # set once the reader is shut down, to stop reconnecting to it
+        self.closed = False
+
+        # state kept from one connection to the next (see
+        # LLRPProtocol.warm_connect): the capabilities reported by the
+        # reader, the settings parsed from them by requested settings, and
+        # the encoded ROSpec last added to the reader
+        self.capabilities = None
+        self.parsed_capabilities = {}
+        self.rospec_bytes = None
+
+    def getBackoff(self, base, maximum):
+        """Return the seconds to wait before the next connection attempt:
+           base doubled for each failure, up to maximum, with the lower half
+           of the delay drawn at random so that readers which lost their
+           connection together do not reconnect together."""
+        delay = min(maximum, base * (1 << min(self.failures, 16)))
+        return uniform(delay / 2, delay)
+
+    def cancelReconnect(self):
+        if self.reconnect_handle is not None:
+            self.reconnect_handle.cancel()
+            self.reconnect_handle = None
+
+    def __repr__(self):
+        return 'LLRPReader({}:{})'.format(self.host, self.port)
+
+
 class LLRPEngine(object):
     """
     """
 
     PORT = 5084
 
-    def __init__(self, onFinish=None, reconnect=False, **kwargs):
+    def __init__(self, onFinish=None, reconnect=False, decode_workers=0,
+                 reconnect_delay=1.0, reconnect_max_delay=60.0,
+                 max_connecting=16, **kwargs):
         self.onFinish = onFinish
         self.reconnect = reconnect
-        self.reconnect_delay = 1.0  # seconds
+        # reconnection backoff bounds, in seconds
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        if isinstance(kwargs.get('capabilities_cache'), str):
+            kwargs['capabilities_cache'] = CapabilitiesCache(
+                kwargs['capabilities_cache'])
         self.client_args = kwargs
-        self.connection_timeout = 1.0
-        self.host = (None, None)
+        # worker processes decoding the RO_ACCESS_REPORTs of all readers,
+        # started with the first connection and shut down once no reader is
+        # left
+        self.decode_workers = decode_workers
+        self.decode_executor = None
+
+        # readers added with new_reader: (host, port) -> LLRPReader
+        self.readers = OrderedDict()
+        # bound on the TCP connections being opened at once, created on first
+        # use so that it belongs to the running event loop
+        self.max_connecting = max_connecting
+        self._connect_limit = None
+        # servers accepting reader-initiated connections (see listen)
+        self.servers = []
 
         # callbacks to pass to connected clients
         # (map of LLRPProtocol.STATE_* -> [list of callbacks])
@@ -1016,6 +2008,7 @@ class LLRPEngine(object):
 
         # message callbacks to pass to connected clients
         self._message_callbacks = defaultdict(list)
+        self._tag_batch_callbacks = []
 
         self.protocols = set()
 
@@ -1029,24 +2022,83 @@ class LLRPEngine(object):
     def addTagReportCallback(self, cb):
         self._message_callbacks['RO_ACCESS_REPORT'].append(cb)
 
-    def new_reader(self, host, port, timeout):
-        self.host = (host, port)
-        self.connection_timeout = timeout
-        return self._connect()
+    def addTagBatchCallback(self, cb):
+        """Add a callback called with a list of RO_ACCESS_REPORT messages:
+           those received in one read, or within tag_batch_window_ms of the
+           first one when that option is set."""
+        self._tag_batch_callbacks.append(cb)
 
-    async def _connect(self):
-        loop = get_event_loop()
-        coro = loop.create_connection(self.build_protocol,
-                                      host=self.host[0],
-                                      port=self.host[1])
-        try:
-            result = await wait_for(coro, timeout=self.connection_timeout)
-            return result
-        except AioTimeoutError as ex:
-            self.clientConnectionFailed(ex)
+    def addMessageCallback(self, msg_type, cb):
+        self._message_callbacks[msg_type].append(cb)
 
-    def build_protocol(self):
-        proto = LLRPProtocol(factory=self, **self.client_args)
+    def setMessagePolicy(self, msg_name, policy):
+        """Set the policy for received messages of type msg_name on all
+           readers, current and future (see LLRPProtocol.setMessagePolicy)."""
+        message_policy = dict(self.client_args.get('message_policy', {}))
+        message_policy[msg_name] = policy
+        for proto in self.protocols:
+            proto.setMessagePolicy(msg_name, policy)
+        self.client_args['message_policy'] = message_policy
+
+    def new_reader(self, host, port, timeout):
+        """Return a coroutine connecting to the reader at host:port."""
+        reader = self.readers.get((host, port))
+        if reader is None:
+            reader = LLRPReader(host, port, timeout)
+            self.readers[(host, port)] = reader
+        reader.timeout = timeout
+        reader.closed = False
+        reader.cancelReconnect()
+        return self._connect(reader)
+
+    async def _connect(self, reader):
+        reader.reconnect_handle = None
+        if self._connect_limit is None:
+            self._connect_limit = Semaphore(self.max_connecting)
+        loop = get_event_loop()
+        async with self._connect_limit:
+            if reader.closed:
+                return None
+            coro = loop.create_connection(
+                partial(self.build_protocol, reader),
+                host=reader.host, port=reader.port)
+            try:
+                return await wait_for(coro, timeout=reader.timeout)
+            except (AioTimeoutError, OSError) as ex:
+                reason = ex
+        self.clientConnectionFailed(reader, reason)
+
+    async def listen(self, host=None, port=PORT, backlog=128):
+        """Accept connections initiated by readers on host:port.
+
+           Each connection is a reader of its own, identified by its
+           address and port, so that several readers behind a NAT can
+           connect from the same address; it is forgotten once the
+           connection is lost.  Their inventory starts once they report a
+           successful ConnectionAttemptEvent, as on client-initiated
+           connections.  May be called for several addresses."""
+        loop = get_event_loop()
+        server = await loop.create_server(self.build_protocol, host, port,
+                                          backlog=backlog,
+                                          reuse_address=True)
+        self.servers.append(server)
+        logger.info('listening for readers on %s',
+                    ', '.join('{}:{}'.format(*sock.getsockname()[:2])
+                              for sock in server.sockets))
+        return server
+
+    def stopListening(self):
+        for server in self.servers:
+            server.close()
+        self.servers = []
+
+    def build_protocol(self, reader=None):
+        if self.decode_workers and self.decode_executor is None:
+            self.decode_executor = ProcessPoolExecutor(self.decode_workers)
+        proto = LLRPProtocol(factory=self,
+                             decode_executor=self.decode_executor,
+                             **self.client_args)
+        proto.reader = reader
 
         # register state-change callbacks with new client
         for state, cbs in self._state_callbacks.items():
@@ -1057,6 +2109,8 @@ class LLRPEngine(object):
         for msg_type, cbs in self._message_callbacks.items():
             for cb in cbs:
                 proto.addMessageCallback(msg_type, cb)
+        for cb in self._tag_batch_callbacks:
+            proto.addTagBatchCallback(cb)
 
         return proto
 
@@ -1067,25 +2121,61 @@ class LLRPEngine(object):
             proto.nextAccess(readSpecPar=readParam, writeSpecPar=writeParam,
                              stopSpecPar=stopParam, accessSpecID=accessSpecID)
 
-    def clientConnectionLost(self, reason):
-        logger.info('lost connection: %s', reason)
+    def clientConnectionMade(self, proto):
+        self.protocols.add(proto)
+        if proto.reader is None:
+            # reader-initiated connection
+            reader = LLRPReader(proto.peer_ip, proto.peer_port, None,
+                                reader_initiated=True)
+            self.readers[proto.peername] = reader
+            proto.reader = reader
+        if proto.reader is not None:
+            proto.reader.protocol = proto
+
+    def clientConnectionLost(self, proto, reason):
+        logger.info('lost connection to %s: %s', proto.peername, reason)
+        self.protocols.discard(proto)
+        reader = proto.reader
+        if reader is not None and reader.protocol is proto:
+            reader.protocol = None
+            if reader.reader_initiated:
+                self.readers.pop((reader.host, reader.port), None)
+            elif not proto.inventoried:
+                # accepted, then dropped or rejected before inventory: back
+                # off as for a failed connection
+                reader.failures += 1
+        self.reconnectOrFinish(reader)
+
+    def clientConnectionFailed(self, reader, reason):
+        logger.info('connection to %s:%s failed: %s', reader.host,
+                    reader.port, str(reason) or type(reason).__name__)
+        reader.failures += 1
+        self.reconnectOrFinish(reader)
+
+    def reconnectOrFinish(self, reader):
+        """Schedule a new connection to reader if reconnecting, or call
+           onFinish once no reader is connected or about to be."""
         loop = get_event_loop()
-        if self.reconnect:
-            loop.call_later(self.reconnect_delay,
-                            lambda: ensure_future(self._connect()))
-        elif not self.protocols:
+        if self.reconnect and reader is not None and not reader.closed and \
+                not reader.reader_initiated:
+            if reader.reconnect_handle is None:
+                delay = reader.getBackoff(self.reconnect_delay,
+                                          self.reconnect_max_delay)
+                logger.info('reconnecting to %s:%s in %.1f s', reader.host,
+                            reader.port, delay)
+                reader.reconnect_handle = loop.call_later(
+                    delay, lambda: ensure_future(self._connect(reader)))
+        elif not self.protocols and not self.servers and \
+                all(r.reconnect_handle is None
+                    for r in self.readers.values()):
+            self.shutdownDecodeWorkers()
             if self.onFinish:
                 loop.call_soon(self.onFinish, None)
 
-    def clientConnectionFailed(self, reason):
-        logger.info('connection failed: %s', reason)
-        loop = get_event_loop()
-        if self.reconnect:
-            loop.call_later(self.reconnect_delay,
-                            lambda: ensure_future(self._connect()))
-        elif not self.protocols:
-            if self.onFinish:
-                loop.call_soon(self.onFinish, None)
+    def shutdownDecodeWorkers(self):
+        if self.decode_executor is not None:
+            self.decode_executor.shutdown(wait=False)
+            self.decode_executor = None
 
     def resumeInventory(self):
         for proto in self.protocols:
@@ -1109,12 +2199,90 @@ class LLRPEngine(object):
         for proto in protocols:
             proto.setTxPower(tx_power)
 
+    def setTagContentSelector(self, tag_content_selector, peername=None):
+        """Set the fields reported for each tag on one or all readers, as
+           setTxPower."""
+        if peername:
+            protocols = [p for p in self.protocols
+                         if p.peername[0] == peername]
+        else:
+            protocols = self.protocols
+        for proto in protocols:
+            proto.setTagContentSelector(tag_content_selector)
+
+    def closeReaders(self):
+        """Stop reconnecting to the readers, and accepting connections from
+           them."""
+        self.stopListening()
+        for reader in self.readers.values():
+            reader.closed = True
+            reader.cancelReconnect()
+
     def politeShutdown(self):
         """Stop inventory on all connected readers."""
+        self.closeReaders()
+        if not self.protocols:
+            self.reconnectOrFinish(None)
         loop = get_event_loop()
         for proto in self.protocols:
             loop.call_soon(proto.stopPolitely, True)
 
+    # Coroutines running a command on all connected readers concurrently;
+    # they raise the first error of a reader.
+
+    async def start_inventory(self, timeout=None):
+        await gather(*[proto.start_inventory(timeout)
+                       for proto in self.protocols])
+
+    async def pause_inventory(self, seconds=0, timeout=None):
+        await gather(*[proto.pause_inventory(seconds, timeout=timeout)
+                       for proto in self.protocols])
+
+    async def resume_inventory(self, timeout=None):
+        await gather(*[proto.resume_inventory(timeout)
+                       for proto in self.protocols])
+
+    async def stop_politely(self, disconnect=True, timeout=None):
+        if disconnect:
+            self.closeReaders()
+        await gather(*[proto.stop_politely(disconnect, timeout)
+                       for proto in self.protocols])
+
+    async def add_access_spec(self, readWords=None, writeWords=None,
+                              target=None, accessStopParam=None,
+                              accessSpecID=1, param=None, timeout=None):
+        await gather(*[proto.add_access_spec(readWords, writeWords, target,
+                                             accessStopParam, accessSpecID,
+                                             param, timeout)
+                       for proto in self.protocols])
+
+    async def set_reader_config(self, config, timeout=None):
+        await gather(*[proto.set_reader_config(config, timeout)
+                       for proto in self.protocols])
+
+    async def get_reader_config(self, requestedData='All', timeout=None):
+        """Return the configuration of each reader."""
+        protocols = list(self.protocols)
+        configs = await gather(*[proto.get_reader_config(requestedData,
+                                                         timeout=timeout)
+                                 for proto in protocols])
+        return {str(proto.peername[0]): config
+                for proto, config in zip(protocols, configs)}
+
+    def getIngestStats(self):
+        """Return the ingest queue statistics of each reader, by peer
+           (address, port), so that readers sharing an address are told
+           apart."""
+        return {proto.peername: proto.getIngestStats()
+                for proto in self.protocols}
+
+    def getTimeToFirstReport(self):
+        """Return the seconds from connection to first tag report of each
+           reader, by peer (address, port), None for the readers that have
+           not reported yet."""
+        return {proto.peername: proto.time_to_first_report
+                for proto in self.protocols}
+
     def getProtocolStates(self):
         states = {str(proto.peername[0]):
                     LLRPProtocol.getStateName(proto.state)
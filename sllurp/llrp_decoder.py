@@ -1,11 +1,13 @@
 from logging import getLogger
-from struct import calcsize as scalc, error as serror, unpack as sunpack
+from struct import Struct
 
 
 logger = getLogger(__name__)
 
-tve_header = '!B'
-tve_header_len = scalc(tve_header)
+tve_header = Struct('!B')
+tve_header_len = tve_header.size
+par_header = Struct('!HH')
+par_header_len = par_header.size
 
 tve_param_formats = {
     # param type: (param name, struct format)
@@ -25,30 +27,103 @@ tve_param_formats = {
 }
 
 
-def decode_tve_parameter(data):
+tlv_param_formats = {
+    # param type: (param name, struct format, field names)
+    128: ('UTCTimestamp', '!Q', ('Microseconds',)),
+    139: ('ReceiveSensitivityTableEntry', '!HH',
+          ('Index', 'ReceiveSensitivityValue')),
+    141: ('GPIOCapabilities', '!HH', ('NumGPIs', 'NumGPOs')),
+    145: ('TransmitPowerLevelTableEntry', '!HH',
+          ('Index', 'TransmitPowerValue')),
+    149: ('PerAntennaReceiveSensitivityRange', '!HHH',
+          ('AntennaID', 'ReceiveSensitivityIndexMin',
+           'ReceiveSensitivityIndexMax')),
+    223: ('RFReceiver', '!H', ('ReceiverSensitivity',)),
+    224: ('RFTransmitter', '!HHH',
+          ('HopTableId', 'ChannelIndex', 'TransmitPower')),
+    239: ('AccessReportSpec', '!B', ('AccessReportTrigger',)),
+    288: ('FieldError', '!H', ('FieldNum',)),
+    335: ('C1G2RFControl', '!HH', ('ModeIndex', 'Tari')),
+    363: ('MaximumReceiveSensitivity', '!H', ('MaximumSensitivityValue',)),
+    365: ('RFSurveyFrequencyCapabilities', '!II',
+          ('MinimumFrequency', 'MaximumFrequency')),
+}
+
+# compiled tables, built once from the formats above: TVE entries are
+# indexed by their 7-bit type, TLV entries keyed by their 10-bit type
+tve_param_table = [None] * 128
+tlv_param_table = {}
+# functions called when a TVE parameter is registered, to drop the tables
+# derived from tve_param_table
+tve_param_listeners = []
+
+
+def register_tve_parameter(ptype, name, fmt):
+    """Register a TV-encoded parameter, e.g. a vendor extension.
+
+    Once registered, the parameter is decoded by decode_tve_parameter as
+    {name: tuple of values}."""
+    if not 0 <= ptype < len(tve_param_table):
+        raise ValueError('invalid TVE parameter type {}'.format(ptype))
+    tve_param_formats[ptype] = (name, fmt)
+    tve_param_table[ptype] = (name, Struct(fmt))
+    for listener in tve_param_listeners:
+        listener()
+
+
+def register_tlv_parameter(ptype, name, fmt, fields):
+    """Register a fixed-layout TLV parameter.
+
+    Once registered, decode_tlv_parameter decodes the body of the parameter
+    into a dictionary mapping each of the fields to its value."""
+    tlv_param_formats[ptype] = (name, fmt, tuple(fields))
+    tlv_param_table[ptype] = (name, Struct(fmt), tuple(fields))
+
+
+for _ptype, (_name, _fmt) in list(tve_param_formats.items()):
+    register_tve_parameter(_ptype, _name, _fmt)
+for _ptype, (_name, _fmt, _fields) in list(tlv_param_formats.items()):
+    register_tlv_parameter(_ptype, _name, _fmt, _fields)
+
+
+def decode_tve_parameter(data, offset, end):
     """Generic byte decoding function for TVE parameters.
 
-    Given an array of bytes, tries to interpret a TVE parameter from the
-    beginning of the array.  Returns the decoded data and the number of bytes
-    it read."""
+    Given an array of bytes, tries to interpret a TVE parameter starting at
+    offset, without reading past end.  Returns the decoded data and the
+    offset of the next parameter, or None and the unchanged offset."""
 
     # decode the TVE field's header (1 bit "reserved" + 7-bit type)
-    (msgtype,) = sunpack(tve_header, data[:tve_header_len])
+    msgtype = data[offset]
     if not msgtype & 0b10000000:
         # not a TV-encoded param
-        return None, 0
-    msgtype = msgtype & 0x7f
-    try:
-        param_name, param_fmt = tve_param_formats[msgtype]
-        logger.debug('found %s (type=%s)', param_name, msgtype)
-    except KeyError as err:
-        return None, 0
+        return None, offset
+    entry = tve_param_table[msgtype & 0x7f]
+    if entry is None:
+        return None, offset
 
     # decode the body
-    nbytes = scalc(param_fmt)
-    end = tve_header_len + nbytes
-    try:
-        unpacked = sunpack(param_fmt, data[tve_header_len:end])
-        return {param_name: unpacked}, end
-    except serror:
-        return None, 0
+    param_name, param_struct = entry
+    body = offset + tve_header_len
+    next_offset = body + param_struct.size
+    if next_offset > end:
+        return None, offset
+    return {param_name: param_struct.unpack_from(data, body)}, next_offset
+
+
+def decode_tlv_parameter(data, offset, end, ptype):
+    """Generic byte decoding function for fixed-layout TLV parameters.
+
+    Tries to interpret a TLV parameter of type ptype starting at offset,
+    without reading past end.  Returns the decoded fields and the offset of
+    the next parameter, or None and the unchanged offset."""
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header.unpack_from(data, offset)
+    if msgtype & 0x3ff != ptype:
+        return None, offset
+    param_name, param_struct, fields = tlv_param_table[ptype]
+    if length < par_header_len + param_struct.size or offset + length > end:
+        return None, offset
+    values = param_struct.unpack_from(data, offset + par_header_len)
+    return dict(zip(fields, values)), offset + length
@@ -23,13 +23,21 @@
 # TODO: use generic functions from llrp_decoder where possible
 #
 
-from logging import getLogger
+from logging import getLogger, DEBUG
 from binascii import hexlify
-from collections import defaultdict
-from struct import calcsize as scalc, pack as spack, unpack as sunpack
+from array import array
+from collections import OrderedDict, defaultdict
+from struct import (Struct, calcsize as scalc, pack as spack,
+                    unpack_from as sunpack_from)
 from . import LLRPError
-from .llrp_decoder import decode_tve_parameter
-from .util import BIT, BITMASK, func, reverse_dict
+from .llrp_decoder import (decode_tlv_parameter, decode_tve_parameter,
+                           tve_param_listeners, tve_param_table)
+from .util import BIT, BITMASK, reverse_dict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #
 # Define exported symbols
@@ -39,9 +47,10 @@ __all__ = [
     # Class
     "LLRPROSpec",
     "LLRPMessageDict",
-
-    # Misc
-    "func",
+    "TagReportColumns",
+    "TagRead",
+    "TagReportStream",
+    "EPC",
 ]
 
 logger = getLogger(__name__)
@@ -59,13 +68,37 @@ def encode(data):
     return Message_struct[data]['encode']
 
 
+def skip_parameter(data, offset, end, ptype):
+    """Return the offset past the TLV parameter of type ptype at offset, or
+       offset if there is none."""
+    if offset >= end:
+        return offset
+    msgtype, length = par_header_unpack(data, offset)
+    if msgtype & BITMASK(10) != ptype:
+        return offset
+    return offset + length
+
+
+def encode_par_begin(data, partype):
+    """Append the header of a TLV parameter to the bytearray data and return
+       its offset; encode_par_end fills in its length."""
+    start = len(data)
+    data += par_header_pack(partype, 0)
+    return start
+
+
+def encode_par_end(data, start):
+    """Set the length of the TLV parameter started at offset start."""
+    par_length_pack_into(data, start + 2, len(data) - start)
+
+
 def bin2dump(data, label=''):
     def isprint(c):
-        return ord(c) >= 32 and ord(c) <= 126
+        return c >= 32 and c <= 126
 
     def conv(c):
         if isprint(c):
-            return c
+            return chr(c)
         return '.'
 
     l = len(data)
@@ -78,7 +111,7 @@ def bin2dump(data, label=''):
     line = ' ' * 80
     i = 0
     while i < l:
-        num = '%02x' % sunpack('B', data[i])
+        num = '%02x' % data[i]
         line = line[: p * 3] + num + line[p * 3 + 2:]
         line = line[:50 + p] + conv(data[i])
 
@@ -108,6 +141,9 @@ msg_header = '!HII'
 msg_header_len = scalc(msg_header)
 par_header = '!HH'
 par_header_len = scalc(par_header)
+par_header_unpack = Struct(par_header).unpack_from
+par_header_pack = Struct(par_header).pack
+par_length_pack_into = Struct('!H').pack_into
 tve_header = '!B'
 tve_header_len = scalc(tve_header)
 
@@ -127,6 +163,32 @@ Capability_Name2Type = {
 
 Capability_Type2Name = reverse_dict(Capability_Name2Type)
 
+# GET_READER_CONFIG requested data
+ReaderConfig_Name2Type = {
+    'All':                          0,
+    'Identification':               1,
+    'AntennaProperties':            2,
+    'AntennaConfiguration':         3,
+    'ROReportSpec':                 4,
+    'ReaderEventNotificationSpec':  5,
+    'AccessReportSpec':             6,
+    'LLRPConfigurationStateValue':  7,
+    'KeepaliveSpec':                8,
+    'GPIPortCurrentState':          9,
+    'GPOWriteData':                 10,
+    'EventsAndReports':             11
+}
+
+ReaderConfig_Type2Name = reverse_dict(ReaderConfig_Name2Type)
+
+# Identification ID types
+IDType_Name2Type = {
+    'MAC_Address':  0,
+    'EPC':          1
+}
+
+IDType_Type2Name = reverse_dict(IDType_Name2Type)
+
 # 10.2.1 ROSpec states
 ROSpecState_Name2Type = {
     'Disabled':             0,
@@ -225,6 +287,16 @@ ROReportTrigger_Name2Type = {
     'Upon_N_Milliseconds_Or_End_Of_ROSpec': 6,
 }
 
+ROReportTrigger_Type2Name = reverse_dict(ROReportTrigger_Name2Type)
+
+# 13.2.4 KeepaliveSpec trigger
+KeepaliveTrigger_Name2Type = {
+    'Null': 0,
+    'Periodic': 1,
+}
+
+KeepaliveTrigger_Type2Name = reverse_dict(KeepaliveTrigger_Name2Type)
+
 # 16.2.1.1.2.1 UHFRFModeTable, to be filled in by capabilities parser
 ModeIndex_Name2Type = defaultdict(int)
 
@@ -251,9 +323,8 @@ Message_struct = {}
 
 
 # 16.1.1 GET_READER_CAPABILITIES
-def encode_GetReaderCapabilities(msg):
-    req = msg['RequestedData']
-    return spack('!B', req)
+def encode_GetReaderCapabilities(msg, data):
+    data += spack('!B', msg['RequestedData'])
 
 
 Message_struct['GET_READER_CAPABILITIES'] = {
@@ -267,31 +338,31 @@ Message_struct['GET_READER_CAPABILITIES'] = {
 
 
 # 16.1.2 GET_READER_CAPABILITIES_RESPONSE
-def decode_GetReaderCapabilitiesResponse(data):
+def decode_GetReaderCapabilitiesResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_GetReaderCapabilitiesResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
-    ret, body = decode('GeneralDeviceCapabilities')(body)
+    ret, offset = decode('GeneralDeviceCapabilities')(data, offset, end)
     if ret:
         msg['GeneralDeviceCapabilities'] = ret
 
-    ret, body = decode('LLRPCapabilities')(body)
+    ret, offset = decode('LLRPCapabilities')(data, offset, end)
     if ret:
         msg['LLRPCapabilities'] = ret
 
-    ret, body = decode('RegulatoryCapabilities')(body)
+    ret, offset = decode('RegulatoryCapabilities')(data, offset, end)
     if ret:
         msg['RegulatoryCapabilities'] = ret
 
-    if len(body):
-        msg['AirProtocolLLRPCapabilities'] = body
+    if offset < end:
+        msg['AirProtocolLLRPCapabilities'] = bytes(data[offset:end])
 
     return msg
 
@@ -311,8 +382,8 @@ Message_struct['GET_READER_CAPABILITIES_RESPONSE'] = {
 
 
 # 16.1.3 ADD_ROSPEC
-def encode_AddROSpec(msg):
-    return encode('ROSpec')(msg['ROSpec'])
+def encode_AddROSpec(msg, data):
+    encode('ROSpec')(msg['ROSpec'], data)
 
 
 Message_struct['ADD_ROSPEC'] = {
@@ -326,20 +397,21 @@ Message_struct['ADD_ROSPEC'] = {
 
 
 # 16.1.4 ADD_ROSPEC_RESPONSE
-def decode_AddROSpecResponse(data):
+def decode_AddROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_AddROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -355,10 +427,8 @@ Message_struct['ADD_ROSPEC_RESPONSE'] = {
 
 
 # 16.1.5 DELETE_ROSPEC
-def encode_DeleteROSpec(msg):
-        msgid = msg['ROSpecID']
-
-        return spack('!I', msgid)
+def encode_DeleteROSpec(msg, data):
+    data += spack('!I', msg['ROSpecID'])
 
 
 Message_struct['DELETE_ROSPEC'] = {
@@ -372,20 +442,21 @@ Message_struct['DELETE_ROSPEC'] = {
 
 
 # 16.1.6 DELETE_ROSPEC_RESPONSE
-def decode_DeleteROSpecResponse(data):
+def decode_DeleteROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_DeleteROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -401,10 +472,8 @@ Message_struct['DELETE_ROSPEC_RESPONSE'] = {
 
 
 # 16.1.7 START_ROSPEC
-def encode_StartROSpec(msg):
-        msgid = msg['ROSpecID']
-
-        return spack('!I', msgid)
+def encode_StartROSpec(msg, data):
+    data += spack('!I', msg['ROSpecID'])
 
 
 Message_struct['START_ROSPEC'] = {
@@ -418,20 +487,21 @@ Message_struct['START_ROSPEC'] = {
 
 
 # 16.1.8 START_ROSPEC_RESPONSE
-def decode_StartROSpecResponse(data):
+def decode_StartROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_StartROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -447,10 +517,8 @@ Message_struct['START_ROSPEC_RESPONSE'] = {
 
 
 # 16.1.9 STOP_ROSPEC
-def encode_StopROSpec(msg):
-        msgid = msg['ROSpecID']
-
-        return spack('!I', msgid)
+def encode_StopROSpec(msg, data):
+    data += spack('!I', msg['ROSpecID'])
 
 
 Message_struct['STOP_ROSPEC'] = {
@@ -464,20 +532,21 @@ Message_struct['STOP_ROSPEC'] = {
 
 
 # 16.1.10 STOP_ROSPEC_RESPONSE
-def decode_StopROSpecResponse(data):
+def decode_StopROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_StopROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -493,10 +562,8 @@ Message_struct['STOP_ROSPEC_RESPONSE'] = {
 
 
 # 16.1.11 ENABLE_ROSPEC
-def encode_EnableROSpec(msg):
-    msgid = msg['ROSpecID']
-
-    return spack('!I', msgid)
+def encode_EnableROSpec(msg, data):
+    data += spack('!I', msg['ROSpecID'])
 
 
 Message_struct['ENABLE_ROSPEC'] = {
@@ -510,20 +577,21 @@ Message_struct['ENABLE_ROSPEC'] = {
 
 
 # 16.1.12 ENABLE_ROSPEC_RESPONSE
-def decode_EnableROSpecResponse(data):
+def decode_EnableROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_EnableROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -539,10 +607,8 @@ Message_struct['ENABLE_ROSPEC_RESPONSE'] = {
 
 
 # 16.1.13 DISABLE_ROSPEC
-def encode_DisableROSpec(msg):
-        msgid = msg['ROSpecID']
-
-        return spack('!I', msgid)
+def encode_DisableROSpec(msg, data):
+    data += spack('!I', msg['ROSpecID'])
 
 
 Message_struct['DISABLE_ROSPEC'] = {
@@ -556,20 +622,21 @@ Message_struct['DISABLE_ROSPEC'] = {
 
 
 # 16.1.14 DISABLE_ROSPEC_RESPONSE
-def decode_DisableROSpecResponse(data):
+def decode_DisableROSpecResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_DisableROSpecResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -584,21 +651,215 @@ Message_struct['DISABLE_ROSPEC_RESPONSE'] = {
 }
 
 
+# 16.1.15 GET_ROSPECS
+def encode_GetROSpecs(msg, data):
+    pass
+
+
+Message_struct['GET_ROSPECS'] = {
+    'type': 26,
+    'fields': [
+        'Ver', 'Type', 'ID',
+    ],
+    'encode': encode_GetROSpecs
+}
+
+
+# 16.1.16 GET_ROSPECS_RESPONSE
+def decode_GetROSpecsResponse(data, offset, end):
+    msg = LLRPMessageDict()
+    logger.debug('decode_GetROSpecsResponse')
+
+    # Decode parameters
+    ret, offset = decode('LLRPStatus')(data, offset, end)
+    if ret:
+        msg['LLRPStatus'] = ret
+    else:
+        raise LLRPError('missing or invalid LLRPStatus parameter')
+
+    msg['ROSpec'] = []
+    while offset < end:
+        ret, offset = decode('ROSpec')(data, offset, end)
+        if not ret:
+            raise LLRPError('junk at end of message: ' +
+                            bin2dump(data[offset:end]))
+        msg['ROSpec'].append(ret)
+
+    return msg
+
+
+Message_struct['GET_ROSPECS_RESPONSE'] = {
+    'type': 36,
+    'fields': [
+        'Ver', 'Type', 'ID',
+        'LLRPStatus',
+        'ROSpec'
+    ],
+    'decode': decode_GetROSpecsResponse
+}
+
+
+# 16.1.27 GET_READER_CONFIG
+def encode_GetReaderConfig(msg, data):
+    data += spack('!HBHH', msg.get('AntennaID', 0),
+                  ReaderConfig_Name2Type[msg['RequestedData']],
+                  msg.get('GPIPortNum', 0), msg.get('GPOPortNum', 0))
+
+
+Message_struct['GET_READER_CONFIG'] = {
+    'type': 2,
+    'fields': [
+        'Ver', 'Type', 'ID',
+        'AntennaID',
+        'RequestedData',
+        'GPIPortNum',
+        'GPOPortNum'
+    ],
+    'encode': encode_GetReaderConfig
+}
+
+
+# 16.1.28 GET_READER_CONFIG_RESPONSE
+def decode_GetReaderConfigResponse(data, offset, end):
+    msg = LLRPMessageDict()
+    logger.debug('decode_GetReaderConfigResponse')
+
+    # Decode parameters
+    ret, offset = decode('LLRPStatus')(data, offset, end)
+    if ret:
+        msg['LLRPStatus'] = ret
+    else:
+        raise LLRPError('missing or invalid LLRPStatus parameter')
+
+    ret, offset = decode('Identification')(data, offset, end)
+    if ret:
+        msg['Identification'] = ret
+
+    ret, offset = decode('AntennaProperties')(data, offset, end)
+    while ret:
+        msg.setdefault('AntennaProperties', []).append(ret)
+        ret, offset = decode('AntennaProperties')(data, offset, end)
+
+    ret, offset = decode('AntennaConfiguration')(data, offset, end)
+    while ret:
+        msg.setdefault('AntennaConfiguration', []).append(ret)
+        ret, offset = decode('AntennaConfiguration')(data, offset, end)
+
+    # ReaderEventNotificationSpec is not decoded
+    offset = skip_parameter(data, offset, end, 244)
+
+    ret, offset = decode('ROReportSpec')(data, offset, end)
+    if ret:
+        msg['ROReportSpec'] = ret
+
+    ret, offset = decode('AccessReportSpec')(data, offset, end)
+    if ret:
+        msg['AccessReportSpec'] = ret
+
+    # LLRPConfigurationStateValue is not decoded
+    offset = skip_parameter(data, offset, end, 217)
+
+    ret, offset = decode('KeepaliveSpec')(data, offset, end)
+    if ret:
+        msg['KeepaliveSpec'] = ret
+
+    # GPIPortCurrentState, GPOWriteData, EventsAndReports and custom
+    # parameters are not decoded
+
+    return msg
+
+
+Message_struct['GET_READER_CONFIG_RESPONSE'] = {
+    'type': 12,
+    'fields': [
+        'Ver', 'Type', 'ID',
+        'LLRPStatus',
+        'Identification',
+        'AntennaProperties',
+        'AntennaConfiguration',
+        'ROReportSpec',
+        'AccessReportSpec',
+        'KeepaliveSpec'
+    ],
+    'decode': decode_GetReaderConfigResponse
+}
+
+
+# 16.1.29 SET_READER_CONFIG
+def encode_SetReaderConfig(msg, data):
+    data += spack('!B', (msg.get('ResetToFactoryDefault') and 1 or 0) << 7)
+    for antprops in msg.get('AntennaProperties', ()):
+        encode('AntennaProperties')(antprops, data)
+    for antconf in msg.get('AntennaConfiguration', ()):
+        encode('AntennaConfiguration')(antconf, data)
+    if 'ROReportSpec' in msg:
+        encode('ROReportSpec')(msg['ROReportSpec'], data)
+    if 'AccessReportSpec' in msg:
+        encode('AccessReportSpec')(msg['AccessReportSpec'], data)
+    if 'KeepaliveSpec' in msg:
+        encode('KeepaliveSpec')(msg['KeepaliveSpec'], data)
+
+
+Message_struct['SET_READER_CONFIG'] = {
+    'type': 3,
+    'fields': [
+        'Ver', 'Type', 'ID',
+        'ResetToFactoryDefault',
+        'AntennaProperties',
+        'AntennaConfiguration',
+        'ROReportSpec',
+        'AccessReportSpec',
+        'KeepaliveSpec'
+    ],
+    'encode': encode_SetReaderConfig
+}
+
+
+# 16.1.30 SET_READER_CONFIG_RESPONSE
+def decode_SetReaderConfigResponse(data, offset, end):
+    # just an LLRPStatus wrapper, same format as ADD_ROSPEC_RESPONSE
+    return decode_AddROSpecResponse(data, offset, end)
+
+
+Message_struct['SET_READER_CONFIG_RESPONSE'] = {
+    'type': 13,
+    'fields': [
+        'Ver', 'Type', 'ID',
+        'LLRPStatus'
+    ],
+    'decode': decode_SetReaderConfigResponse
+}
+
+
+# ways of decoding the tags of an RO_ACCESS_REPORT
+TAG_FORMATS = ('dict', 'columns', 'records', 'stream')
+
+
 # 16.1.30 RO_ACCESS_REPORT
-def decode_ROAccessReport(data):
+def decode_ROAccessReport(data, offset, end, tag_format='dict'):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_ROAccessReport')
+
+    if tag_format == 'columns':
+        msg['TagReportData'] = decode_TagReportColumns(data, offset, end)
+        return msg
+    elif tag_format == 'records':
+        msg['TagReportData'] = decode_TagReportRecords(data, offset, end)
+        return msg
+    elif tag_format == 'stream':
+        msg['TagReportData'] = TagReportStream(data, offset, end)
+        return msg
+    elif tag_format != 'dict':
+        raise LLRPError('unknown tag format {}'.format(tag_format))
 
     # Decode parameters
     msg['TagReportData'] = []
     while True:
         try:
-            ret, data = decode('TagReportData')(data)
+            ret, offset = decode('TagReportData')(data, offset, end)
         except TypeError as ex:  # XXX
             logger.error('Unable to decode TagReportData: %s' % str(ex))
             break
-        # print('len(ret) = {}'.format(len(ret)))
-        # print('len(data) = {}'.format(len(data)))
         if ret:
             msg['TagReportData'].append(ret)
         else:
@@ -618,7 +879,7 @@ Message_struct['RO_ACCESS_REPORT'] = {
 
 
 # 16.1.35 KEEPALIVE
-def decode_Keepalive(msg):
+def decode_Keepalive(data, offset, end):
     return ''
 
 
@@ -632,8 +893,8 @@ Message_struct['KEEPALIVE'] = {
 
 
 # 16.1.36 KEEPALIVE_ACK
-def encode_KeepaliveAck(msg):
-    return ''
+def encode_KeepaliveAck(msg, data):
+    pass
 
 
 Message_struct['KEEPALIVE_ACK'] = {
@@ -646,18 +907,19 @@ Message_struct['KEEPALIVE_ACK'] = {
 
 
 # 16.1.33 READER_EVENT_NOTIFICATION
-def decode_ReaderEventNotification(data):
+def decode_ReaderEventNotification(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_ReaderEventNotification')
 
     # Decode parameters
-    ret, body = decode('ReaderEventNotificationData')(data)
+    ret, offset = decode('ReaderEventNotificationData')(data, offset, end)
     if ret:
         msg['ReaderEventNotificationData'] = ret
 
     # Check the end of the message
-        if len(body) > 0:
-                raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -673,8 +935,8 @@ Message_struct['READER_EVENT_NOTIFICATION'] = {
 
 
 # 16.1.40 CLOSE_CONNECTION
-def encode_CloseConnection(msg):
-    return ''
+def encode_CloseConnection(msg, data):
+    pass
 
 
 Message_struct['CLOSE_CONNECTION'] = {
@@ -687,20 +949,21 @@ Message_struct['CLOSE_CONNECTION'] = {
 
 
 # 16.1.41 CLOSE_CONNECTION_RESPONSE
-def decode_CloseConnectionResponse(data):
+def decode_CloseConnectionResponse(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
+    logger.debug('decode_CloseConnectionResponse')
 
     # Decode parameters
-    ret, body = decode('LLRPStatus')(data)
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
         raise LLRPError('missing or invalid LLRPStatus parameter')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if offset < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[offset:end]))
 
     return msg
 
@@ -717,25 +980,10 @@ Message_struct['CLOSE_CONNECTION_RESPONSE'] = {
 
 
 # 16.2.2.1 UTCTimestamp Parameter
-def decode_UTCTimestamp(data):
-    logger.debug(func())
-    par = {}
-
-    if len(data) == 0:
-        return None, data
-
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['UTCTimestamp']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['Microseconds'], ) = sunpack('!Q', body)
-
-    return par, data[length:]
+def decode_UTCTimestamp(data, offset, end):
+    logger.debug('decode_UTCTimestamp')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['UTCTimestamp']['type'])
 
 
 Message_struct['UTCTimestamp'] = {
@@ -748,33 +996,33 @@ Message_struct['UTCTimestamp'] = {
 }
 
 
-def decode_RegulatoryCapabilities(data):
-    logger.debug(func())
+def decode_RegulatoryCapabilities(data, offset, end):
+    logger.debug('decode_RegulatoryCapabilities')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['RegulatoryCapabilities']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_RegulatoryCapabilities (type=%d len=%d)',
+                 msgtype, length)
 
     fmt = '!HH'
     fmt_len = scalc(fmt)
     # Decode fields
     (par['CountryCode'],
-     par['CommunicationsStandard']) = sunpack(fmt, body[:fmt_len])
+     par['CommunicationsStandard']) = sunpack_from(fmt, data, body)
 
-    body = body[fmt_len:]
-    ret, body = decode('UHFBandCapabilities')(body)
+    body += fmt_len
+    ret, body = decode('UHFBandCapabilities')(data, body, offset + length)
     if ret:
         par['UHFBandCapabilities'] = ret
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['RegulatoryCapabilities'] = {
@@ -789,39 +1037,40 @@ Message_struct['RegulatoryCapabilities'] = {
 }
 
 
-def decode_UHFBandCapabilities(data):
-    logger.debug(func())
+def decode_UHFBandCapabilities(data, offset, end):
+    logger.debug('decode_UHFBandCapabilities')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['UHFBandCapabilities']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_UHFBandCapabilities (type=%d len=%d)',
+                 msgtype, length)
 
     # Decode fields
     i = 0
-    ret, body = decode('TransmitPowerLevelTableEntry')(body)
+    ret, body = decode('TransmitPowerLevelTableEntry')(data, body, end)
     while ret:
         par['TransmitPowerLevelTableEntry' + str(i)] = ret
-        ret, body = decode('TransmitPowerLevelTableEntry')(body)
+        ret, body = decode('TransmitPowerLevelTableEntry')(data, body, end)
         i += 1
 
-    ret, body = decode('FrequencyInformation')(body)
+    ret, body = decode('FrequencyInformation')(data, body, end)
     if ret:
         par['FrequencyInformation'] = ret
 
-    ret, body = decode('UHFRFModeTable')(body)
+    ret, body = decode('UHFRFModeTable')(data, body, end)
     if ret:
         par['UHFRFModeTable'] = ret
 
-    ret, body = decode('RFSurveyFrequencyCapabilities')(body)
+    ret, body = decode('RFSurveyFrequencyCapabilities')(data, body, end)
     if ret:
         par['RFSurveyFrequencyCapabilities'] = ret
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['UHFBandCapabilities'] = {
@@ -837,23 +1086,11 @@ Message_struct['UHFBandCapabilities'] = {
 }
 
 
-def decode_TransmitPowerLevelTableEntry(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['TransmitPowerLevelTableEntry']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    par['Index'], par['TransmitPowerValue'] = sunpack('!HH', body)
-
-    return par, data[length:]
+def decode_TransmitPowerLevelTableEntry(data, offset, end):
+    logger.debug('decode_TransmitPowerLevelTableEntry')
+    return decode_tlv_parameter(
+        data, offset, end,
+        Message_struct['TransmitPowerLevelTableEntry']['type'])
 
 
 Message_struct['TransmitPowerLevelTableEntry'] = {
@@ -867,37 +1104,38 @@ Message_struct['TransmitPowerLevelTableEntry'] = {
 }
 
 
-def decode_FrequencyInformation(data):
-    logger.debug(func())
+def decode_FrequencyInformation(data, offset, end):
+    logger.debug('decode_FrequencyInformation')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['FrequencyInformation']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_FrequencyInformation (type=%d len=%d)',
+                 msgtype, length)
 
     fmt_len = scalc('!B')
     # Decode fields
-    (flags, ) = sunpack('!B', body[:fmt_len])
+    (flags, ) = sunpack_from('!B', data, body)
     par['Hopping'] = flags & BIT(7) == BIT(7)
-    body = body[fmt_len:]
+    body += fmt_len
 
     i = 0
-    ret, body = decode('FrequencyHopTable')(body)
+    ret, body = decode('FrequencyHopTable')(data, body, end)
     while ret:
         par['FrequencyHopTable' + str(i)] = ret
-        ret, body = decode('FrequencyHopTable')(body)
+        ret, body = decode('FrequencyHopTable')(data, body, end)
         i += 1
 
-    ret, body = decode('FixedFrequencyTable')(body)
+    ret, body = decode('FixedFrequencyTable')(data, body, end)
     if ret:
         par['FixedFrequencyTable'] = ret
 
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['FrequencyInformation'] = {
@@ -912,18 +1150,18 @@ Message_struct['FrequencyInformation'] = {
 }
 
 
-def decode_FrequencyHopTable(data):
-    logger.debug(func())
+def decode_FrequencyHopTable(data, offset, end):
+    logger.debug('decode_FrequencyHopTable')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['FrequencyHopTable']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_FrequencyHopTable (type=%d len=%d)',
+                 msgtype, length)
 
     fmt = '!BBH'
     fmt_len = scalc(fmt)
@@ -933,14 +1171,14 @@ def decode_FrequencyHopTable(data):
     # Decode fields
     (par['HopTableId'],
      flags,
-     par['NumHops']) = sunpack(fmt, body[: fmt_len])
-    body = body[fmt_len:]
+     par['NumHops']) = sunpack_from(fmt, data, body)
+    body += fmt_len
     num = int(par['NumHops'])
     for x in range(1, num + 1):
-        par['Frequency' + str(x)] = sunpack(id_fmt, body[: id_fmt_len])
-        body = body[id_fmt_len:]
+        par['Frequency' + str(x)] = sunpack_from(id_fmt, data, body)
+        body += id_fmt_len
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['FrequencyHopTable'] = {
@@ -955,18 +1193,18 @@ Message_struct['FrequencyHopTable'] = {
 }
 
 
-def decode_FixedFrequencyTable(data):
-    logger.debug(func())
+def decode_FixedFrequencyTable(data, offset, end):
+    logger.debug('decode_FixedFrequencyTable')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['FixedFrequencyTable']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_FixedFrequencyTable (type=%d len=%d)',
+                 msgtype, length)
 
     fmt = '!H'
     fmt_len = scalc(fmt)
@@ -974,14 +1212,14 @@ def decode_FixedFrequencyTable(data):
     id_fmt = '!I'
     id_fmt_len = scalc(id_fmt)
     # Decode fields
-    par['NumFrequencies'] = sunpack(fmt, body[: fmt_len])
-    body = body[fmt_len:]
+    (par['NumFrequencies'], ) = sunpack_from(fmt, data, body)
+    body += fmt_len
     num = int(par['NumFrequencies'])
     for x in range(1, num + 1):
-        par['Frequency' + str(x)] = sunpack(id_fmt, body[:id_fmt_len])
-        body = body[id_fmt_len:]
+        par['Frequency' + str(x)] = sunpack_from(id_fmt, data, body)
+        body += id_fmt_len
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['FixedFrequencyTable'] = {
@@ -991,35 +1229,35 @@ Message_struct['FixedFrequencyTable'] = {
         'NumFrequencies',
         'Frequencies'
     ],
-    'decode': decode_FrequencyInformation
+    'decode': decode_FixedFrequencyTable
 }
 
 
-def decode_UHFRFModeTable(data):
-    logger.debug(func())
+def decode_UHFRFModeTable(data, offset, end):
+    logger.debug('decode_UHFRFModeTable')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+    logger.debug('decode_UHFRFModeTable (type=%d len=%d)', msgtype, length)
 
     if msgtype != Message_struct['UHFRFModeTable']['type']:
-        return (None, data)
+        return (None, offset)
 
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_UHFRFModeTable (type=%d len=%d)', msgtype, length)
 
     # Decode fields
     i = 0
-    ret, body = decode('UHFC1G2RFModeTableEntry')(body)
+    ret, body = decode('UHFC1G2RFModeTableEntry')(data, body, end)
     while ret:
         par['UHFC1G2RFModeTableEntry' + str(i)] = ret
-        ret, body = decode('UHFC1G2RFModeTableEntry')(body)
+        ret, body = decode('UHFC1G2RFModeTableEntry')(data, body, end)
         i += 1
 
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['UHFRFModeTable'] = {
@@ -1032,20 +1270,20 @@ Message_struct['UHFRFModeTable'] = {
 }
 
 
-def decode_UHFC1G2RFModeTableEntry(data):
-    logger.debug(func())
+def decode_UHFC1G2RFModeTableEntry(data, offset, end):
+    logger.debug('decode_UHFC1G2RFModeTableEntry')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+    logger.debug('decode_UHFC1G2RFModeTableEntry (type=%d len=%d)',
+                 msgtype, length)
 
     if msgtype != Message_struct['UHFC1G2RFModeTableEntry']['type']:
-        return (None, data)
+        return (None, offset)
 
-    body = data[par_header_len:length]
+    body = offset + par_header_len
 
     # Decode fields
     (par['ModeIdentifier'],
@@ -1057,13 +1295,13 @@ def decode_UHFC1G2RFModeTableEntry(data):
      par['PIE'],
      par['MinTari'],
      par['MaxTari'],
-     par['StepTari']) = sunpack('!IBBBBIIIII', body)
+     par['StepTari']) = sunpack_from('!IBBBBIIIII', data, body)
 
     # parse RC
     par['R'] = RC >> 7
     par['C'] = (RC >> 6) & 1
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['UHFC1G2RFModeTableEntry'] = {
@@ -1084,26 +1322,11 @@ Message_struct['UHFC1G2RFModeTableEntry'] = {
 }
 
 
-def decode_RFSurveyFrequencyCapabilities(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-
-    if msgtype != Message_struct['RFSurveyFrequencyCapabilities']['type']:
-        return (None, data)
-
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['MinimumFrequency'],
-     par['MaximumFrequency']) = sunpack('!II', body)
-
-    return par, data[length:]
+def decode_RFSurveyFrequencyCapabilities(data, offset, end):
+    logger.debug('decode_RFSurveyFrequencyCapabilities')
+    return decode_tlv_parameter(
+        data, offset, end,
+        Message_struct['RFSurveyFrequencyCapabilities']['type'])
 
 
 Message_struct['RFSurveyFrequencyCapabilities'] = {
@@ -1118,20 +1341,20 @@ Message_struct['RFSurveyFrequencyCapabilities'] = {
 
 
 # 16.2.3.2 LLRPCapabilities Parameter
-def decode_LLRPCapabilities(data):
-    logger.debug(func())
+def decode_LLRPCapabilities(data, offset, end):
+    logger.debug('decode_LLRPCapabilities')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['LLRPCapabilities']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_LLRPCapabilities (type=%d len=%d)',
+                 msgtype, length)
 
     # Decode fields
     (flags,
@@ -1141,7 +1364,8 @@ def decode_LLRPCapabilities(data):
      par['MaxNumSpecsPerROSpec'],
      par['MaxNumInventoryParametersSpecsPerAISpec'],
      par['MaxNumAccessSpec'],
-     par['MaxNumOpSpecsPerAccessSpec']) = sunpack('!BBHIIIII', body)
+     par['MaxNumOpSpecsPerAccessSpec']) = sunpack_from('!BBHIIIII', data,
+                                                       body)
 
     par['CanDoRFSurvey'] = (flags & BIT(7) == BIT(7))
     par['CanReportBufferFillWarning'] = (flags & BIT(6) == BIT(6))
@@ -1149,7 +1373,7 @@ def decode_LLRPCapabilities(data):
     par['CanDoTagInventoryStateAwareSingulation'] = (flags & BIT(4) == BIT(4))
     par['SupportsEventAndReportHolding'] = (flags & BIT(3) == BIT(3))
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['LLRPCapabilities'] = {
@@ -1174,20 +1398,21 @@ Message_struct['LLRPCapabilities'] = {
 
 
 # 16.2.3.2 GeneralDeviceCapabilities Parameter
-def decode_GeneralDeviceCapabilities(data):
-    logger.debug(func())
+def decode_GeneralDeviceCapabilities(data, offset, end):
+    logger.debug('decode_GeneralDeviceCapabilities')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['GeneralDeviceCapabilities']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_GeneralDeviceCapabilities (type=%d len=%d)',
+                 msgtype, length)
 
     fmt = '!HHIIH'
     fmt_len = scalc(fmt)
@@ -1196,35 +1421,36 @@ def decode_GeneralDeviceCapabilities(data):
      flags,
      par['DeviceManufacturerName'],
      par['ModelName'],
-     par['FirmwareVersionByteCount']) = sunpack(fmt, body[:fmt_len])
+     par['FirmwareVersionByteCount']) = sunpack_from(fmt, data, body)
 
     par['CanSetAntennaProperties'] = (flags & BIT(15) == BIT(15))
     par['HasUTCClockCapability'] = (flags & BIT(14) == BIT(14))
 
-    pastVer = fmt_len + par['FirmwareVersionByteCount']
-    par['ReaderFirmwareVersion'] = body[fmt_len:pastVer].decode()
-    body = body[pastVer:]
-    ret, body = decode('ReceiveSensitivityTableEntry')(body)
+    body += fmt_len
+    pastVer = body + par['FirmwareVersionByteCount']
+    par['ReaderFirmwareVersion'] = bytes(data[body:pastVer]).decode()
+    body = pastVer
+    ret, body = decode('ReceiveSensitivityTableEntry')(data, body, end)
     if ret:
         par['ReceiveSensitivityTableEntry'] = ret
 
-    ret, body = decode('PerAntennaReceiveSensitivityRange')(body)
+    ret, body = decode('PerAntennaReceiveSensitivityRange')(data, body, end)
     if ret:
         par['PerAntennaReceiveSensitivityRange'] = ret
 
-    ret, body = decode('GPIOCapabilities')(body)
+    ret, body = decode('GPIOCapabilities')(data, body, end)
     if ret:
         par['GPIOCapabilities'] = ret
 
-    ret, body = decode('PerAntennaAirProtocol')(body)
+    ret, body = decode('PerAntennaAirProtocol')(data, body, end)
     if ret:
         par['PerAntennaAirProtocol'] = ret
 
-    ret, body = decode('MaximumReceiveSensitivity')(body)
+    ret, body = decode('MaximumReceiveSensitivity')(data, body, end)
     if ret:
         par['MaximumReceiveSensitivity'] = ret
 
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['GeneralDeviceCapabilities'] = {
@@ -1248,23 +1474,11 @@ Message_struct['GeneralDeviceCapabilities'] = {
 }
 
 
-def decode_MaximumReceiveSensitivity(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['MaximumReceiveSensitivity']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['MaximumSensitivityValue']) = sunpack('!H', body)
-
-    return par, data[length:]
+def decode_MaximumReceiveSensitivity(data, offset, end):
+    logger.debug('decode_MaximumReceiveSensitivity')
+    return decode_tlv_parameter(
+        data, offset, end,
+        Message_struct['MaximumReceiveSensitivity']['type'])
 
 
 Message_struct['MaximumReceiveSensitivity'] = {
@@ -1277,24 +1491,11 @@ Message_struct['MaximumReceiveSensitivity'] = {
 }
 
 
-def decode_ReceiveSensitivityTableEntry(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['ReceiveSensitivityTableEntry']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['Index'],
-     par['ReceiveSensitivityValue']) = sunpack('!HH', body)
-
-    return par, data[length:]
+def decode_ReceiveSensitivityTableEntry(data, offset, end):
+    logger.debug('decode_ReceiveSensitivityTableEntry')
+    return decode_tlv_parameter(
+        data, offset, end,
+        Message_struct['ReceiveSensitivityTableEntry']['type'])
 
 
 Message_struct['ReceiveSensitivityTableEntry'] = {
@@ -1308,25 +1509,11 @@ Message_struct['ReceiveSensitivityTableEntry'] = {
 }
 
 
-def decode_PerAntennaReceiveSensitivityRange(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['PerAntennaReceiveSensitivityRange']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['AntennaID'],
-     par['ReceiveSensitivityIndexMin'],
-     par['ReceiveSensitivityIndexMax']) = sunpack('!HHH', body)
-
-    return par, data[length:]
+def decode_PerAntennaReceiveSensitivityRange(data, offset, end):
+    logger.debug('decode_PerAntennaReceiveSensitivityRange')
+    return decode_tlv_parameter(
+        data, offset, end,
+        Message_struct['PerAntennaReceiveSensitivityRange']['type'])
 
 
 Message_struct['PerAntennaReceiveSensitivityRange'] = {
@@ -1341,32 +1528,33 @@ Message_struct['PerAntennaReceiveSensitivityRange'] = {
 }
 
 
-def decode_PerAntennaAirProtocol(data):
-    logger.debug(func())
+def decode_PerAntennaAirProtocol(data, offset, end):
+    logger.debug('decode_PerAntennaAirProtocol')
     par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    if offset >= end:
+        return None, offset
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['PerAntennaAirProtocol']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_PerAntennaAirProtocol (type=%d len=%d)',
+                 msgtype, length)
 
     fmt = '!HH'
     fmt_len = scalc(fmt)
 
     # Decode fields
     (par['AntennaID'],
-     par['NumProtocols']) = sunpack(fmt, body[:fmt_len])
-    body = body[fmt_len:]
+     par['NumProtocols']) = sunpack_from(fmt, data, body)
+    body += fmt_len
     num = int(par['NumProtocols'])
     id_fmt = '!B'
-    for i in xrange(num):
-        par['ProtocolID{}'.format(i+1)] = sunpack(id_fmt, body[i])[0]
+    for i in range(num):
+        par['ProtocolID{}'.format(i+1)] = sunpack_from(id_fmt, data,
+                                                       body + i)[0]
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['PerAntennaAirProtocol'] = {
@@ -1381,24 +1569,10 @@ Message_struct['PerAntennaAirProtocol'] = {
 }
 
 
-def decode_GPIOCapabilities(data):
-    logger.debug(func())
-    par = {}
-    if len(data) == 0:
-        return None, data
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['GPIOCapabilities']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
-
-    # Decode fields
-    (par['NumGPIs'],
-     par['NumGPIs']) = sunpack('!HH', body)
-
-    return par, data[length:]
+def decode_GPIOCapabilities(data, offset, end):
+    logger.debug('decode_GPIOCapabilities')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['GPIOCapabilities']['type'])
 
 
 Message_struct['GPIOCapabilities'] = {
@@ -1412,10 +1586,10 @@ Message_struct['GPIOCapabilities'] = {
 }
 
 
-def decode_ErrorMessage(data):
+def decode_ErrorMessage(data, offset, end):
     msg = LLRPMessageDict()
-    logger.debug(func())
-    ret, body = decode('LLRPStatus')(data)
+    logger.debug('decode_ErrorMessage')
+    ret, offset = decode('LLRPStatus')(data, offset, end)
     if ret:
         msg['LLRPStatus'] = ret
     else:
@@ -1426,34 +1600,55 @@ def decode_ErrorMessage(data):
 Message_struct['ErrorMessage'] = {
     'type': 100,
     'fields': [
-        'Type',
-        'MessageLength',
-        'MessageID',
+        'Ver', 'Type', 'ID',
         'LLRPStatus'
     ],
     'decode': decode_ErrorMessage
 }
 
+# name of ErrorMessage in the LLRP specification; decoded messages keep the
+# ErrorMessage key
+Message_struct['ERROR_MESSAGE'] = Message_struct['ErrorMessage']
+
 
 # 16.2.4.1 ROSpec Parameter
-def encode_ROSpec(par):
-    msgtype = Message_struct['ROSpec']['type']
+def encode_ROSpec(par, data):
     msgid = par['ROSpecID'] & BITMASK(10)
     priority = par['Priority'] & BITMASK(7)
     state = ROSpecState_Name2Type[par['CurrentState']] & BITMASK(7)
 
-    msg_header = '!HHIBB'
-    msg_header_len = scalc(msg_header)
+    start = encode_par_begin(data, Message_struct['ROSpec']['type'])
+    data += spack('!IBB', msgid, priority, state)
+    encode('ROBoundarySpec')(par['ROBoundarySpec'], data)
+    encode('AISpec')(par['AISpec'], data)
+    if 'ROReportSpec' in par:
+        encode('ROReportSpec')(par['ROReportSpec'], data)
+    encode_par_end(data, start)
+
+
+# 16.2.4.1 ROSpec Parameter: only the ROSpecID, Priority and CurrentState
+# fields are decoded, the whole parameter is kept in ROSpecBytes
+def decode_ROSpec(data, offset, end):
+    logger.debug('decode_ROSpec')
+    par = {}
+
+    if offset >= end:
+        return None, offset
 
-    data = encode('ROBoundarySpec')(par['ROBoundarySpec'])
-    data += encode('AISpec')(par['AISpec'])
-    data += encode('ROReportSpec')(par['ROReportSpec'])
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['ROSpec']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_ROSpec (type=%d len=%d)', msgtype, length)
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len,
-                       msgid, priority, state) + data
+    # Decode fields
+    (par['ROSpecID'], par['Priority'],
+     state) = sunpack_from('!IBB', data, body)
+    par['CurrentState'] = ROSpecState_Type2Name.get(state, state)
+    par['ROSpecBytes'] = bytes(data[offset:offset + length])
 
-    return data
+    return par, offset + length
 
 
 Message_struct['ROSpec'] = {
@@ -1468,31 +1663,26 @@ Message_struct['ROSpec'] = {
         'RFSurveySpec',
         'ROReportSpec'
     ],
-    'encode': encode_ROSpec
+    'encode': encode_ROSpec,
+    'decode': decode_ROSpec
 }
 
 
 # 17.2.5.1 AccessSpec
-def encode_AccessSpec(par):
-    msgtype = Message_struct['AccessSpec']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!I', int(par['AccessSpecID']))
+def encode_AccessSpec(par, data):
+    start = encode_par_begin(data, Message_struct['AccessSpec']['type'])
+    data += spack('!I', int(par['AccessSpecID']))
     data += spack('!H', int(par['AntennaID']))
     data += spack('!B', par['ProtocolID'])
     data += spack('!B', par['C'] and (1 << 7) or 0)
     data += spack('!I', par['ROSpecID'])
 
-    data += encode('AccessSpecStopTrigger')(par['AccessSpecStopTrigger'])
-    data += encode('AccessCommand')(par['AccessCommand'])
+    encode('AccessSpecStopTrigger')(par['AccessSpecStopTrigger'], data)
+    encode('AccessCommand')(par['AccessCommand'], data)
     if 'AccessReportSpec' in par:
-        data += encode('AccessReportSpec')(par['AccessReportSpec'])
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
+        encode('AccessReportSpec')(par['AccessReportSpec'], data)
 
-    return data
+    encode_par_end(data, start)
 
 
 # 17.2.5.1 AccessSpec
@@ -1514,8 +1704,8 @@ Message_struct['AccessSpec'] = {
 
 
 # 17.1.21 ADD_ACCESSSPEC
-def encode_AddAccessSpec(msg):
-    return encode('AccessSpec')(msg['AccessSpec'])
+def encode_AddAccessSpec(msg, data):
+    encode('AccessSpec')(msg['AccessSpec'], data)
 
 
 # 17.1.21 ADD_ACCESSSPEC
@@ -1530,9 +1720,9 @@ Message_struct['ADD_ACCESSSPEC'] = {
 
 
 # 17.1.22 ADD_ACCESSSPEC_RESPONSE
-def decode_AddAccessSpecResponse(msg):
+def decode_AddAccessSpecResponse(data, offset, end):
     # just an LLRPStatus wrapper, same format as ADD_ROSPEC_RESPONSE
-    return decode_AddROSpecResponse(msg)
+    return decode_AddROSpecResponse(data, offset, end)
 
 
 # 17.1.22 ADD_ACCESSSPEC_RESPONSE
@@ -1547,8 +1737,8 @@ Message_struct['ADD_ACCESSSPEC_RESPONSE'] = {
 
 
 # 17.1.23 DELETE_ACCESSSPEC
-def encode_DeleteAccessSpec(msg):
-    return spack('!I', msg['AccessSpecID'])
+def encode_DeleteAccessSpec(msg, data):
+    data += spack('!I', msg['AccessSpecID'])
 
 
 # 17.1.23 DELETE_ACCESSSPEC
@@ -1563,9 +1753,9 @@ Message_struct['DELETE_ACCESSSPEC'] = {
 
 
 # 17.1.24 DELETE_ACCESSSPEC_RESPONSE
-def decode_DeleteAccessSpecResponse(msg):
+def decode_DeleteAccessSpecResponse(data, offset, end):
     # just an LLRPStatus wrapper, same format as ADD_ROSPEC_RESPONSE
-    return decode_DeleteROSpecResponse(msg)
+    return decode_DeleteROSpecResponse(data, offset, end)
 
 
 # 17.1.24 DELETE_ACCESSSPEC_RESPONSE
@@ -1580,8 +1770,8 @@ Message_struct['DELETE_ACCESSSPEC_RESPONSE'] = {
 
 
 # 17.1.25 ENABLE_ACCESSSPEC
-def encode_EnableAccessSpec(msg):
-    return spack('!I', msg['AccessSpecID'])
+def encode_EnableAccessSpec(msg, data):
+    data += spack('!I', msg['AccessSpecID'])
 
 
 # 17.1.25 ENABLE_ACCESSSPEC
@@ -1596,9 +1786,9 @@ Message_struct['ENABLE_ACCESSSPEC'] = {
 
 
 # 17.1.26 ENABLE_ACCESSSPEC_RESPONSE
-def decode_EnableAccessSpecResponse(msg):
+def decode_EnableAccessSpecResponse(data, offset, end):
     # just an LLRPStatus wrapper, same format as ADD_ROSPEC_RESPONSE
-    return decode_EnableROSpecResponse(msg)
+    return decode_EnableROSpecResponse(data, offset, end)
 
 
 # 17.1.26 ENABLE_ACCESSSPEC_RESPONSE
@@ -1613,8 +1803,8 @@ Message_struct['ENABLE_ACCESSSPEC_RESPONSE'] = {
 
 
 # 17.1.27 DISABLE_ACCESSSPEC
-def encode_DisableAccessSpec(msg):
-    return spack('!I', msg['AccessSpecID'])
+def encode_DisableAccessSpec(msg, data):
+    data += spack('!I', msg['AccessSpecID'])
 
 
 # 17.1.27 DISABLE_ACCESSSPEC
@@ -1629,9 +1819,9 @@ Message_struct['DISABLE_ACCESSSPEC'] = {
 
 
 # 17.1.28 DISABLE_ACCESSSPEC_RESPONSE
-def decode_DisableAccessSpecResponse(msg):
+def decode_DisableAccessSpecResponse(data, offset, end):
     # just an LLRPStatus wrapper, same format as ADD_ROSPEC_RESPONSE
-    return decode_DisableROSpecResponse(msg)
+    return decode_DisableROSpecResponse(data, offset, end)
 
 
 # 17.1.28 DISABLE_ACCESSSPEC_RESPONSE
@@ -1645,18 +1835,10 @@ Message_struct['DISABLE_ACCESSSPEC_RESPONSE'] = {
 }
 
 
-def encode_AccessSpecStopTrigger(par):
-    msgtype = Message_struct['AccessSpecStopTrigger']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!B', int(par['AccessSpecStopTriggerType']))
-    data += spack('!H', int(par['OperationCountValue']))
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-
-    return data
+def encode_AccessSpecStopTrigger(par, data):
+    data += spack('!HHBH', Message_struct['AccessSpecStopTrigger']['type'], 7,
+                  int(par['AccessSpecStopTriggerType']),
+                  int(par['OperationCountValue']))
 
 
 Message_struct['AccessSpecStopTrigger'] = {
@@ -1670,27 +1852,22 @@ Message_struct['AccessSpecStopTrigger'] = {
 }
 
 
-def encode_AccessCommand(par):
-    msgtype = Message_struct['AccessCommand']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
+def encode_AccessCommand(par, data):
+    start = encode_par_begin(data, Message_struct['AccessCommand']['type'])
 
-    data = encode_C1G2TagSpec(par['TagSpecParameter'])
+    encode_C1G2TagSpec(par['TagSpecParameter'], data)
 
     if 'WriteData' in par['OpSpecParameter']:
         if par['OpSpecParameter']['WriteDataWordCount'] > 1:
-            data += encode_C1G2BlockWrite(par['OpSpecParameter'])
+            encode_C1G2BlockWrite(par['OpSpecParameter'], data)
         else:
-            data += encode_C1G2Write(par['OpSpecParameter'])
+            encode_C1G2Write(par['OpSpecParameter'], data)
     elif 'LockPayload' in par['OpSpecParameter']:
-        data += encode_C1G2Lock(par['OpSpecParameter'])
+        encode_C1G2Lock(par['OpSpecParameter'], data)
     else:
-        data += encode_C1G2Read(par['OpSpecParameter'])
+        encode_C1G2Read(par['OpSpecParameter'], data)
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['AccessCommand'] = {
@@ -1704,20 +1881,16 @@ Message_struct['AccessCommand'] = {
 }
 
 
-def encode_C1G2TagSpec(par):
-    msgtype = Message_struct['C1G2TagSpec']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
+def encode_C1G2TagSpec(par, data):
+    start = encode_par_begin(data, Message_struct['C1G2TagSpec']['type'])
 
     targets = par['C1G2TargetTag']
     if type(targets) != list:
         targets = (targets,)
     for target in targets:
-        data = encode_C1G2TargetTag(target)
+        encode_C1G2TargetTag(target, data)
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['C1G2TagSpec'] = {
@@ -1731,34 +1904,26 @@ Message_struct['C1G2TagSpec'] = {
 
 
 def encode_bitstring(bstr, length_bytes):
-    def B(x):
-        return spack('!B', x)
-    Bs = map(B, sunpack('>' + 'B'*len(bstr), bstr))
-    Bs += ['\x00'] * (length_bytes - len(bstr))
-    return ''.join(Bs)
+    return bytes(bstr[:length_bytes]).ljust(length_bytes, b'\x00')
 
 
-def encode_C1G2TargetTag(par):
-    msgtype = Message_struct['C1G2TargetTag']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
+def encode_C1G2TargetTag(par, data):
+    start = encode_par_begin(data, Message_struct['C1G2TargetTag']['type'])
 
-    data = spack('!B', ((int(par['MB']) << 6) |
-                       (par['M'] and (1 << 5) or 0)))
+    data += spack('!B', ((int(par['MB']) << 6) |
+                        (par['M'] and (1 << 5) or 0)))
     data += spack('!H', int(par['Pointer']))
     data += spack('!H', int(par['MaskBitCount']))
     if int(par['MaskBitCount']):
-        numBytes = ((par['MaskBitCount'] - 1) / 8) + 1
+        numBytes = ((par['MaskBitCount'] - 1) // 8) + 1
         data += encode_bitstring(par['TagMask'], numBytes)
 
     data += spack('!H', int(par['DataBitCount']))
     if int(par['DataBitCount']):
-        numBytes = ((par['DataBitCount'] - 1) / 8) + 1
+        numBytes = ((par['DataBitCount'] - 1) // 8) + 1
         data += encode_bitstring(par['TagData'], numBytes)
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['C1G2TargetTag'] = {
@@ -1778,19 +1943,11 @@ Message_struct['C1G2TargetTag'] = {
 
 
 # 16.2.1.3.2.2 C1G2Read
-def encode_C1G2Read(par):
-    msgtype = Message_struct['C1G2Read']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-    data = spack('!H', int(par['OpSpecID']))
-    data += spack('!I', int(par['AccessPassword']))
-    data += spack('!B', int(par['MB']) << 6)
-    data += spack('!H', int(par['WordPtr']))
-    data += spack('!H', int(par['WordCount']))
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+def encode_C1G2Read(par, data):
+    data += spack('!HHHIBHH', Message_struct['C1G2Read']['type'], 15,
+                  int(par['OpSpecID']), int(par['AccessPassword']),
+                  int(par['MB']) << 6, int(par['WordPtr']),
+                  int(par['WordCount']))
 
 
 Message_struct['C1G2Read'] = {
@@ -1808,21 +1965,15 @@ Message_struct['C1G2Read'] = {
 
 
 # 16.2.1.3.2.3 C1G2Write
-def encode_C1G2Write(par):
-    msgtype = Message_struct['C1G2Write']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!H', int(par['OpSpecID']))
+def encode_C1G2Write(par, data):
+    start = encode_par_begin(data, Message_struct['C1G2Write']['type'])
+    data += spack('!H', int(par['OpSpecID']))
     data += spack('!I', int(par['AccessPassword']))
     data += spack('!B', int(par['MB']) << 6)
     data += spack('!H', int(par['WordPtr']))
     data += spack('!H', int(par['WriteDataWordCount']))
     data += par['WriteData']
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['C1G2Write'] = {
@@ -1841,19 +1992,13 @@ Message_struct['C1G2Write'] = {
 
 
 # 16.2.1.3.2.5 C1G2Lock Parameter
-def encode_C1G2Lock(par):
-    msgtype = Message_struct['C1G2Lock']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!H', int(par['OpSpecID']))
+def encode_C1G2Lock(par, data):
+    start = encode_par_begin(data, Message_struct['C1G2Lock']['type'])
+    data += spack('!H', int(par['OpSpecID']))
     data += spack('!I', int(par['AccessPassword']))
     for payload in par['LockPayload']:
-        data += encode_C1G2LockPayload(payload)
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+        encode_C1G2LockPayload(payload, data)
+    encode_par_end(data, start)
 
 
 Message_struct['C1G2Lock'] = {
@@ -1869,17 +2014,9 @@ Message_struct['C1G2Lock'] = {
 
 
 # 16.2.1.3.2.5.1 C1G2LockPayload Parameter
-def encode_C1G2LockPayload(par):
-    msgtype = Message_struct['C1G2LockPayload']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!B', int(par['Privilege']))
-    data += spack('!b', int(par['DataField']))
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+def encode_C1G2LockPayload(par, data):
+    data += spack('!HHBb', Message_struct['C1G2LockPayload']['type'], 6,
+                  int(par['Privilege']), int(par['DataField']))
 
 
 Message_struct['C1G2LockPayload'] = {
@@ -1895,21 +2032,15 @@ Message_struct['C1G2LockPayload'] = {
 
 
 # 16.2.1.3.2.7 C1G2BlockWrite
-def encode_C1G2BlockWrite(par):
-    msgtype = Message_struct['C1G2BlockWrite']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!H', int(par['OpSpecID']))
+def encode_C1G2BlockWrite(par, data):
+    start = encode_par_begin(data, Message_struct['C1G2BlockWrite']['type'])
+    data += spack('!H', int(par['OpSpecID']))
     data += spack('!I', int(par['AccessPassword']))
     data += spack('!B', int(par['MB']) << 6)
     data += spack('!H', int(par['WordPtr']))
     data += spack('!H', int(par['WriteDataWordCount']))
     data += par['WriteData']
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['C1G2BlockWrite'] = {
@@ -1927,17 +2058,15 @@ Message_struct['C1G2BlockWrite'] = {
 }
 
 
-def encode_AccessReportSpec(par):
-    msgtype = Message_struct['AccessReportSpec']['type']
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!B', par['AccessReportTrigger'])
+def encode_AccessReportSpec(par, data):
+    data += spack('!HHB', Message_struct['AccessReportSpec']['type'], 5,
+                  par['AccessReportTrigger'])
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
 
-    return data
+def decode_AccessReportSpec(data, offset, end):
+    logger.debug('decode_AccessReportSpec')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['AccessReportSpec']['type'])
 
 
 Message_struct['AccessReportSpec'] = {
@@ -1946,24 +2075,17 @@ Message_struct['AccessReportSpec'] = {
         'Type',
         'AccessReportTrigger'
     ],
-    'encode': encode_AccessReportSpec
+    'encode': encode_AccessReportSpec,
+    'decode': decode_AccessReportSpec
 }
 
 
 # 16.2.4.1.1 ROBoundarySpec Parameter
-def encode_ROBoundarySpec(par):
-    msgtype = Message_struct['ROBoundarySpec']['type']
-
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = encode('ROSpecStartTrigger')(par['ROSpecStartTrigger'])
-    data += encode('ROSpecStopTrigger')(par['ROSpecStopTrigger'])
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-
-    return data
+def encode_ROBoundarySpec(par, data):
+    start = encode_par_begin(data, Message_struct['ROBoundarySpec']['type'])
+    encode('ROSpecStartTrigger')(par['ROSpecStartTrigger'], data)
+    encode('ROSpecStopTrigger')(par['ROSpecStopTrigger'], data)
+    encode_par_end(data, start)
 
 
 Message_struct['ROBoundarySpec'] = {
@@ -1978,19 +2100,11 @@ Message_struct['ROBoundarySpec'] = {
 
 
 # 16.2.4.1.1.1 ROSpecStartTrigger Parameter
-def encode_ROSpecStartTrigger(par):
-    msgtype = Message_struct['ROSpecStartTrigger']['type']
+def encode_ROSpecStartTrigger(par, data):
     t_type = StartTrigger_Name2Type[par['ROSpecStartTriggerType']]
 
-    msg_header = '!HHB'
-    msg_header_len = scalc(msg_header)
-
-    data = b''
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len, t_type) + data
-
-    return data
+    data += spack('!HHB', Message_struct['ROSpecStartTrigger']['type'], 5,
+                  t_type)
 
 
 Message_struct['ROSpecStartTrigger'] = {
@@ -2006,21 +2120,12 @@ Message_struct['ROSpecStartTrigger'] = {
 
 
 # 16.2.4.1.1.2 ROSpecStopTrigger Parameter
-def encode_ROSpecStopTrigger(par):
-    msgtype = Message_struct['ROSpecStopTrigger']['type']
+def encode_ROSpecStopTrigger(par, data):
     t_type = StopTrigger_Name2Type[par['ROSpecStopTriggerType']]
     duration = int(par['DurationTriggerValue'])
 
-    msg_header = '!HHBI'
-    msg_header_len = scalc(msg_header)
-
-    data = b''
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len,
-                       t_type, duration) + data
-
-    return data
+    data += spack('!HHBI', Message_struct['ROSpecStopTrigger']['type'], 9,
+                  t_type, duration)
 
 
 Message_struct['ROSpecStopTrigger'] = {
@@ -2036,29 +2141,22 @@ Message_struct['ROSpecStopTrigger'] = {
 
 
 # 16.2.4.2 AISpec Parameter
-def encode_AISpec(par):
-    msgtype = Message_struct['AISpec']['type']
-
-    msg_header = '!HHH'
-    msg_header_len = scalc(msg_header)
-    data = b''
-
+def encode_AISpec(par, data):
     antid = par['AntennaIDs']
     antennas = []
     if type(antid) is str:
         antennas = antid.split()
     else:
         antennas.extend(antid)
+
+    start = encode_par_begin(data, Message_struct['AISpec']['type'])
+    data += spack('!H', len(antennas))
     for a in antennas:
         data += spack('!H', int(a))
 
-    data += encode('AISpecStopTrigger')(par['AISpecStopTrigger'])
-    data += encode('InventoryParameterSpec')(par['InventoryParameterSpec'])
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len, len(antennas)) + data
-
-    return data
+    encode('AISpecStopTrigger')(par['AISpecStopTrigger'], data)
+    encode('InventoryParameterSpec')(par['InventoryParameterSpec'], data)
+    encode_par_end(data, start)
 
 
 Message_struct['AISpec'] = {
@@ -2075,26 +2173,20 @@ Message_struct['AISpec'] = {
 
 
 # 16.2.4.2.1 AISpecStopTrigger Parameter
-def encode_AISpecStopTrigger(par):
-    msgtype = Message_struct['AISpecStopTrigger']['type']
+def encode_AISpecStopTrigger(par, data):
     t_type = StopTrigger_Name2Type[par['AISpecStopTriggerType']]
     duration = int(par['DurationTriggerValue'])
 
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!B', t_type)
+    start = encode_par_begin(data,
+                             Message_struct['AISpecStopTrigger']['type'])
+    data += spack('!B', t_type)
     data += spack('!I', int(duration))
     if 'GPITriggerValue' in par:
         # TODO implement GPITriggerValue Message_struct
-        data += encode('GPITriggerValue')(par['GPITriggerValue'])
+        encode('GPITriggerValue')(par['GPITriggerValue'], data)
     if 'TagObservationTrigger' in par:
-        data += encode('TagObservationTrigger')(par['TagObservationTrigger'])
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-
-    return data
+        encode('TagObservationTrigger')(par['TagObservationTrigger'], data)
+    encode_par_end(data, start)
 
 
 Message_struct['AISpecStopTrigger'] = {
@@ -2111,27 +2203,15 @@ Message_struct['AISpecStopTrigger'] = {
 
 
 # 17.2.4.2.1.1
-def encode_TagObservationTrigger(par):
-    msgtype = Message_struct['TagObservationTrigger']['type']
+def encode_TagObservationTrigger(par, data):
     t_type = TagObservationTrigger_Name2Type[par['TriggerType']]
     n_tags = int(par['NumberOfTags'])
     n_attempts = int(par['NumberOfAttempts'])
     t = int(par['T'])
     timeout = int(par['Timeout'])
 
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-
-    data = spack('!B', t_type)
-    data += spack('!B', 0)
-    data += spack('!H', n_tags)
-    data += spack('!H', n_attempts)
-    data += spack('!H', t)
-    data += spack('!I', timeout)
-
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len) + data
-    return data
+    data += spack('!HHBBHHHI', Message_struct['TagObservationTrigger']['type'],
+                  16, t_type, 0, n_tags, n_attempts, t, timeout)
 
 
 Message_struct['TagObservationTrigger'] = {
@@ -2149,22 +2229,16 @@ Message_struct['TagObservationTrigger'] = {
 
 
 # 16.2.4.2.2 InventoryParameterSpec Parameter
-def encode_InventoryParameterSpec(par):
-    msgtype = Message_struct['InventoryParameterSpec']['type']
-
-    msg_header = '!HH'
-    msg_header_len = scalc(msg_header)
-    data = spack('!H', par['InventoryParameterSpecID'])
+def encode_InventoryParameterSpec(par, data):
+    start = encode_par_begin(data,
+                             Message_struct['InventoryParameterSpec']['type'])
+    data += spack('!H', par['InventoryParameterSpecID'])
     data += spack('!B', par['ProtocolID'])
 
     for antconf in par['AntennaConfiguration']:
-        logger.debug('encoding AntennaConfiguration: %s', antconf)
-        data += encode('AntennaConfiguration')(antconf)
+        encode('AntennaConfiguration')(antconf, data)
 
-    data = spack(msg_header, msgtype,
-                       msg_header_len + len(data)) + data
-
-    return data
+    encode_par_end(data, start)
 
 
 Message_struct['InventoryParameterSpec'] = {
@@ -2180,19 +2254,50 @@ Message_struct['InventoryParameterSpec'] = {
 
 
 # 16.2.6.6 AntennaConfiguration Parameter
-def encode_AntennaConfiguration(par):
-    msgtype = Message_struct['AntennaConfiguration']['type']
-    msg_header = '!HH'
-    data = spack('!H', int(par['AntennaID']))
+def encode_AntennaConfiguration(par, data):
+    start = encode_par_begin(data,
+                             Message_struct['AntennaConfiguration']['type'])
+    data += spack('!H', int(par['AntennaID']))
     if 'RFReceiver' in par:
-        data += encode('RFReceiver')(par['RFReceiver'])
+        encode('RFReceiver')(par['RFReceiver'], data)
     if 'RFTransmitter' in par:
-        data += encode('RFTransmitter')(par['RFTransmitter'])
+        encode('RFTransmitter')(par['RFTransmitter'], data)
     if 'C1G2InventoryCommand' in par:
-        data += encode('C1G2InventoryCommand')(par['C1G2InventoryCommand'])
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+        encode('C1G2InventoryCommand')(par['C1G2InventoryCommand'], data)
+    encode_par_end(data, start)
+
+
+def decode_AntennaConfiguration(data, offset, end):
+    logger.debug('decode_AntennaConfiguration')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['AntennaConfiguration']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+
+    # Decode fields
+    (par['AntennaID'], ) = sunpack_from('!H', data, body)
+    body += 2
+
+    ret, body = decode('RFReceiver')(data, body, end)
+    if ret:
+        par['RFReceiver'] = ret
+
+    ret, body = decode('RFTransmitter')(data, body, end)
+    if ret:
+        par['RFTransmitter'] = ret
+
+    ret, body = decode('C1G2InventoryCommand')(data, body, end)
+    if ret:
+        par['C1G2InventoryCommand'] = ret
+
+    return par, end
 
 
 Message_struct['AntennaConfiguration'] = {
@@ -2206,18 +2311,21 @@ Message_struct['AntennaConfiguration'] = {
         # C1G2InventoryCommand?
         'C1G2InventoryCommand'
     ],
-    'encode': encode_AntennaConfiguration
+    'encode': encode_AntennaConfiguration,
+    'decode': decode_AntennaConfiguration
 }
 
 
 # 16.2.6.7 RFReceiver Parameter
-def encode_RFReceiver(par):
-    msgtype = Message_struct['RFReceiver']['type']
-    msg_header = '!HH'
-    data = spack('!H', par['ReceiverSensitivity'])
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+def encode_RFReceiver(par, data):
+    data += spack('!HHH', Message_struct['RFReceiver']['type'], 6,
+                  par['ReceiverSensitivity'])
+
+
+def decode_RFReceiver(data, offset, end):
+    logger.debug('decode_RFReceiver')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['RFReceiver']['type'])
 
 
 Message_struct['RFReceiver'] = {
@@ -2226,20 +2334,22 @@ Message_struct['RFReceiver'] = {
         'Type',
         'ReceiverSensitivity',
     ],
-    'encode': encode_RFReceiver
+    'encode': encode_RFReceiver,
+    'decode': decode_RFReceiver
 }
 
 
 # 16.2.6.8 RFTransmitter Parameter
-def encode_RFTransmitter(par):
-    msgtype = Message_struct['RFTransmitter']['type']
-    msg_header = '!HH'
-    data = spack('!H', par['HopTableId'])
-    data += spack('!H', par['ChannelIndex'])
-    data += spack('!H', par['TransmitPower'])
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+def encode_RFTransmitter(par, data):
+    data += spack('!HHHHH', Message_struct['RFTransmitter']['type'], 10,
+                  par['HopTableId'], par['ChannelIndex'],
+                  par['TransmitPower'])
+
+
+def decode_RFTransmitter(data, offset, end):
+    logger.debug('decode_RFTransmitter')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['RFTransmitter']['type'])
 
 
 Message_struct['RFTransmitter'] = {
@@ -2250,26 +2360,61 @@ Message_struct['RFTransmitter'] = {
         'ChannelIndex',
         'TransmitPower',
     ],
-    'encode': encode_RFTransmitter
+    'encode': encode_RFTransmitter,
+    'decode': decode_RFTransmitter
 }
 
 
 # 16.3.1.2.1 C1G2InventoryCommand Parameter
-def encode_C1G2InventoryCommand(par):
-    msgtype = Message_struct['C1G2InventoryCommand']['type']
-    msg_header = '!HH'
-    data = spack('!B', (par['TagInventoryStateAware'] and 1 or 0) << 7)
+def encode_C1G2InventoryCommand(par, data):
+    start = encode_par_begin(data,
+                             Message_struct['C1G2InventoryCommand']['type'])
+    data += spack('!B', (par['TagInventoryStateAware'] and 1 or 0) << 7)
     if 'C1G2Filter' in par:
-        data += encode('C1G2Filter')(par['C1G2Filter'])
+        encode('C1G2Filter')(par['C1G2Filter'], data)
     if 'C1G2RFControl' in par:
-        data += encode('C1G2RFControl')(par['C1G2RFControl'])
+        encode('C1G2RFControl')(par['C1G2RFControl'], data)
     if 'C1G2SingulationControl' in par:
-        data += encode('C1G2SingulationControl')(par['C1G2SingulationControl'])
+        encode('C1G2SingulationControl')(par['C1G2SingulationControl'],
+                                         data)
     # XXX custom parameters
+    encode_par_end(data, start)
+
+
+# C1G2Filter and custom parameters are not decoded
+def decode_C1G2InventoryCommand(data, offset, end):
+    logger.debug('decode_C1G2InventoryCommand')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['C1G2InventoryCommand']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+
+    # Decode fields
+    par['TagInventoryStateAware'] = (data[body] & BIT(7) == BIT(7))
+    body += 1
+
+    filter_type = Message_struct['C1G2Filter']['type']
+    next_body = skip_parameter(data, body, end, filter_type)
+    while next_body != body:
+        body = next_body
+        next_body = skip_parameter(data, body, end, filter_type)
+
+    ret, body = decode('C1G2RFControl')(data, body, end)
+    if ret:
+        par['C1G2RFControl'] = ret
+
+    ret, body = decode('C1G2SingulationControl')(data, body, end)
+    if ret:
+        par['C1G2SingulationControl'] = ret
 
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+    return par, end
 
 
 Message_struct['C1G2InventoryCommand'] = {
@@ -2281,12 +2426,13 @@ Message_struct['C1G2InventoryCommand'] = {
         'C1G2SingulationControl'
         # XXX custom parameters
     ],
-    'encode': encode_C1G2InventoryCommand
+    'encode': encode_C1G2InventoryCommand,
+    'decode': decode_C1G2InventoryCommand
 }
 
 
 # 16.3.1.2.1.1 C1G2Filter Parameter
-def encode_C1G2Filter(par):
+def encode_C1G2Filter(par, data):
     raise NotImplementedError
 
 
@@ -2298,14 +2444,15 @@ Message_struct['C1G2Filter'] = {
 
 
 # 16.3.1.2.1.2 C1G2RFControl Parameter
-def encode_C1G2RFControl(par):
-    msgtype = Message_struct['C1G2RFControl']['type']
-    msg_header = '!HH'
-    data = spack('!H', par['ModeIndex'])
-    data += spack('!H', par['Tari'])
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+def encode_C1G2RFControl(par, data):
+    data += spack('!HHHH', Message_struct['C1G2RFControl']['type'], 8,
+                  par['ModeIndex'], par['Tari'])
+
+
+def decode_C1G2RFControl(data, offset, end):
+    logger.debug('decode_C1G2RFControl')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['C1G2RFControl']['type'])
 
 
 Message_struct['C1G2RFControl'] = {
@@ -2314,20 +2461,37 @@ Message_struct['C1G2RFControl'] = {
         'ModeIndex',
         'Tari',
     ],
-    'encode': encode_C1G2RFControl
+    'encode': encode_C1G2RFControl,
+    'decode': decode_C1G2RFControl
 }
 
 
 # 16.3.1.2.1.3 C1G2SingulationControl Parameter
-def encode_C1G2SingulationControl(par):
-    msgtype = Message_struct['C1G2SingulationControl']['type']
-    msg_header = '!HH'
-    data = spack('!B', par['Session'] << 6)
-    data += spack('!H', par['TagPopulation'])
-    data += spack('!I', par['TagTransitTime'])
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
-    return data
+def encode_C1G2SingulationControl(par, data):
+    data += spack('!HHBHI', Message_struct['C1G2SingulationControl']['type'],
+                  11, par['Session'] << 6, par['TagPopulation'],
+                  par['TagTransitTime'])
+
+
+def decode_C1G2SingulationControl(data, offset, end):
+    logger.debug('decode_C1G2SingulationControl')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['C1G2SingulationControl']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+
+    # Decode fields
+    (session, par['TagPopulation'],
+     par['TagTransitTime']) = sunpack_from('!BHI', data, body)
+    par['Session'] = session >> 6
+
+    return par, offset + length
 
 
 Message_struct['C1G2SingulationControl'] = {
@@ -2337,26 +2501,47 @@ Message_struct['C1G2SingulationControl'] = {
         'TagPopulation',
         'TagTransitTime',
     ],
-    'encode': encode_C1G2SingulationControl
+    'encode': encode_C1G2SingulationControl,
+    'decode': decode_C1G2SingulationControl
 }
 
 
 # 16.2.7.1 ROReportSpec Parameter
-def encode_ROReportSpec(par):
-    msgtype = Message_struct['ROReportSpec']['type']
+def encode_ROReportSpec(par, data):
     n = int(par['N'])
     roReportTrigger = ROReportTrigger_Name2Type[par['ROReportTrigger']]
 
-    msg_header = '!HHBH'
-    msg_header_len = scalc(msg_header)
+    start = encode_par_begin(data, Message_struct['ROReportSpec']['type'])
+    data += spack('!BH', roReportTrigger, n)
+    encode('TagReportContentSelector')(par['TagReportContentSelector'],
+                                       data)
+    encode_par_end(data, start)
 
-    data = encode('TagReportContentSelector')(par['TagReportContentSelector'])
 
-    data = spack(msg_header, msgtype,
-                       len(data) + msg_header_len,
-                       roReportTrigger, n) + data
+def decode_ROReportSpec(data, offset, end):
+    logger.debug('decode_ROReportSpec')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['ROReportSpec']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+
+    # Decode fields
+    (trigger, par['N']) = sunpack_from('!BH', data, body)
+    par['ROReportTrigger'] = ROReportTrigger_Type2Name.get(trigger, trigger)
+    body += 3
 
-    return data
+    ret, body = decode('TagReportContentSelector')(data, body, end)
+    if ret:
+        par['TagReportContentSelector'] = ret
+
+    return par, end
 
 
 Message_struct['ROReportSpec'] = {
@@ -2366,16 +2551,13 @@ Message_struct['ROReportSpec'] = {
         'ROReportTrigger',
         'TagReportContentSelector'
     ],
-    'encode': encode_ROReportSpec
+    'encode': encode_ROReportSpec,
+    'decode': decode_ROReportSpec
 }
 
 
 # 16.2.7.1 TagReportContentSelector Parameter
-def encode_TagReportContentSelector(par):
-    msgtype = Message_struct['TagReportContentSelector']['type']
-
-    msg_header = '!HH'
-
+def encode_TagReportContentSelector(par, data):
     flags = 0
     i = 15
     for field in Message_struct['TagReportContentSelector']['fields']:
@@ -2383,11 +2565,32 @@ def encode_TagReportContentSelector(par):
             flags = flags | (1 << i)
         i = i - 1
 
-    data = spack('!H', flags)
-    data = spack(msg_header, msgtype,
-                       len(data) + scalc(msg_header)) + data
+    data += spack('!HHH', Message_struct['TagReportContentSelector']['type'],
+                  6, flags)
+
+
+# the C1G2EPCMemorySelector parameters are not decoded
+def decode_TagReportContentSelector(data, offset, end):
+    logger.debug('decode_TagReportContentSelector')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['TagReportContentSelector']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+
+    # Decode fields
+    (flags, ) = sunpack_from('!H', data, body)
+    i = 15
+    for field in Message_struct['TagReportContentSelector']['fields']:
+        par[field] = (flags & BIT(i) == BIT(i))
+        i = i - 1
 
-    return data
+    return par, offset + length
 
 
 Message_struct['TagReportContentSelector'] = {
@@ -2404,54 +2607,53 @@ Message_struct['TagReportContentSelector'] = {
         'EnableTagSeenCount',
         'EnableAccessSpecID'
     ],
-    'encode': encode_TagReportContentSelector
+    'encode': encode_TagReportContentSelector,
+    'decode': decode_TagReportContentSelector
 }
 
 
 # 16.2.7.3 TagReportData Parameter
-def decode_TagReportData(data):
+def decode_TagReportData(data, offset, end):
+    # called once per tag seen: trace only the decoded result
     par = {}
-    logger.debug(func())
 
-    if len(data) == 0:
-        return None, data
+    if offset + par_header_len > end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['TagReportData']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
+        return (None, offset)
+    if length < par_header_len or offset + length > end:
+        raise LLRPError('truncated TagReportData parameter')
+    body = offset + par_header_len
+    end = offset + length
 
     # Decode parameters
-    ret, body = decode('EPCData')(body)
+    ret, body = decode('EPCData')(data, body, end)
     if ret:
-        logger.debug("got EPCData; won't try EPC-96")
         par['EPCData'] = ret
     else:
-        logger.debug('failed to decode EPCData; trying EPC-96')
-        ret, body = decode('EPC-96')(body)
+        ret, body = decode('EPC-96')(data, body, end)
         if ret:
             par['EPC-96'] = ret['EPC']
-            logger.debug('EPC-96: %s', ret['EPC'])
         else:
             raise LLRPError('missing or invalid EPCData parameter')
 
     # grab TV-encoded parameters
-    while body:
-        ret, nbytes = decode_tve_parameter(body)
+    while body < end:
+        ret, body = decode_tve_parameter(data, body, end)
         if ret:
             par.update(ret)
-            body = body[nbytes:]
         else:
             break
 
-    ret, body = decode_OpSpecResult(body)
+    ret, body = decode_OpSpecResult(data, body, end)
     if ret:
         par['OpSpecResult'] = ret
 
-    logger.debug('par=%s', par)
-    return par, data[length:]
+    logger.debug('decode_TagReportData: %s', par)
+    return par, end
 
 
 Message_struct['TagReportData'] = {
@@ -2479,16 +2681,358 @@ Message_struct['TagReportData'] = {
 }
 
 
-def decode_OpSpecResult(data):
+# TagReportData fields decoded by decode_TagReportColumns:
+# (name, array typecode, numpy dtype)
+TagReport_columns = (
+    ('ROSpecID', 'I', 'u4'),
+    ('AntennaID', 'H', 'u2'),
+    ('PeakRSSI', 'b', 'i1'),
+    ('ChannelIndex', 'H', 'u2'),
+    ('FirstSeenTimestampUTC', 'Q', 'u8'),
+    ('LastSeenTimestampUTC', 'Q', 'u8'),
+    ('TagSeenCount', 'H', 'u2'),
+    ('AccessSpecID', 'I', 'u4'),
+)
+# column of the mask of the TagReport_columns fields each tag reported
+TagReport_present_column = ('Present', 'H', 'u2')
+
+# TVE type -> (TagReport_columns index or None, Struct), for
+# decode_TagReportColumns; built on first use, and again once a TVE
+# parameter is registered
+tve_columns = None
+
+
+def build_tve_columns():
+    global tve_columns
+    column_index = dict((name, i) for i, (name, _, _)
+                        in enumerate(TagReport_columns))
+    table = [None] * len(tve_param_table)
+    for ptype, entry in enumerate(tve_param_table):
+        if entry is not None:
+            table[ptype] = (column_index.get(entry[0]), entry[1])
+    tve_columns = table
+    return table
+
+
+def invalidate_tve_columns():
+    global tve_columns
+    tve_columns = None
+
+
+tve_param_listeners.append(invalidate_tve_columns)
+
+
+class TagReportColumns(object):
+    """The tags of an RO_ACCESS_REPORT, decoded column by column.
+
+       columns['EPC'] is the list of raw EPCs (bytes) and columns[name] the
+       array.array of values of each field in TagReport_columns, with 0 for
+       tags which did not report that field.  columns['Present'] tells them
+       apart: bit i of the mask of a tag is set if it reported the field
+       TagReport_columns[i].
+    """
+    __slots__ = ('columns', 'count')
+
+    def __init__(self, columns, count):
+        self.columns = columns
+        self.count = count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterate over the tags as tuples of their EPC, of their
+           TagReport_columns fields and of their presence mask, like the
+           records of a NumPy array."""
+        names = ['EPC'] + [name for name, _, _ in TagReport_columns] + \
+            [TagReport_present_column[0]]
+        return zip(*[self.columns[name] for name in names])
+
+    def __repr__(self):
+        return '<TagReportColumns: {} tags>'.format(self.count)
+
+
+def decode_TagReportColumns(data, offset, end):
+    """Decode all the TagReportData of a report into columns.
+
+       Returns a NumPy structured array with one record per tag when NumPy
+       is available, or a TagReportColumns instance otherwise.  AirProtocol
+       data and OpSpecResults are not decoded.  In the NumPy array, EPCs
+       shorter than the longest one of the report are padded with NUL
+       bytes.  Fields a tag did not report are 0, with their bit clear in
+       the Present mask of the tag (see TagReportColumns).
+    """
+    logger.debug('decode_TagReportColumns')
+    tag_type = Message_struct['TagReportData']['type']
+    epc96_type = Message_struct['EPC-96']['type']
+    columns_table = tve_columns or build_tve_columns()
+    epcs = []
+    columns = [array(code) for _, code, _ in TagReport_columns]
+    present_column = array(TagReport_present_column[1])
+    defaults = [0] * len(TagReport_columns)
+
+    while offset + par_header_len <= end:
+        msgtype, length = par_header_unpack(data, offset)
+        if msgtype & BITMASK(10) != tag_type or length < par_header_len:
+            break
+        pend = offset + length
+        body = offset + par_header_len
+        if pend > end or body >= pend:
+            raise LLRPError('truncated TagReportData parameter')
+
+        # EPC-96 (TV) or EPCData (TLV)
+        if data[body] & BITMASK(7) == epc96_type and data[body] & BIT(7):
+            if body + 13 > pend:
+                raise LLRPError('truncated EPC-96 parameter')
+            epcs.append(intern_epc(bytes(data[body + 1:body + 13])))
+            body += 13
+        else:
+            if body + par_header_len > pend:
+                raise LLRPError('missing or invalid EPCData parameter')
+            msgtype, plen = par_header_unpack(data, body)
+            if msgtype & BITMASK(10) != Message_struct['EPCData']['type'] \
+                    or plen < par_header_len + 2 or body + plen > pend:
+                raise LLRPError('missing or invalid EPCData parameter')
+            epcs.append(intern_epc(bytes(data[body + par_header_len + 2:
+                                              body + plen])))
+            body += plen
+
+        # TV-encoded fields
+        values = list(defaults)
+        present = 0
+        while body < pend:
+            msgtype = data[body]
+            if not msgtype & 0x80:
+                break
+            entry = columns_table[msgtype & 0x7f]
+            if entry is None:
+                break
+            i, param_struct = entry
+            if body + 1 + param_struct.size > pend:
+                raise LLRPError('truncated TagReportData parameter')
+            if i is not None:
+                (values[i], ) = param_struct.unpack_from(data, body + 1)
+                present |= 1 << i
+            body += 1 + param_struct.size
+
+        for column, value in zip(columns, values):
+            column.append(value)
+        present_column.append(present)
+        offset = pend
+
+    present_name = TagReport_present_column[0]
+    if numpy is None:
+        cols = {'EPC': epcs}
+        for (name, _, _), column in zip(TagReport_columns, columns):
+            cols[name] = column
+        cols[present_name] = present_column
+        return TagReportColumns(cols, len(epcs))
+
+    epc_len = max([len(epc) for epc in epcs] or [1])
+    dtype = [('EPC', 'V{}'.format(epc_len))]
+    dtype.extend((name, dt) for name, _, dt in TagReport_columns)
+    dtype.append((present_name, TagReport_present_column[2]))
+    batch = numpy.zeros(len(epcs), dtype=dtype)
+    batch['EPC'] = epcs
+    for (name, _, _), column in zip(TagReport_columns, columns):
+        batch[name] = numpy.frombuffer(column, dtype=column.typecode)
+    batch[present_name] = numpy.frombuffer(present_column,
+                                           dtype=present_column.typecode)
+    return batch
+
+
+class TagRead(object):
+    """One tag of a TagReportData parameter, as a compact record.
+
+       Each TV-encoded field of the report is an attribute holding its value
+       (not a 1-tuple), or None if the reader did not report it.  EPC holds
+       the EPC (raw bytes, see EPC).  Fields registered by vendor extensions
+       which are not attributes go to the Other dictionary.
+    """
+    __slots__ = ('EPC', 'EPCLengthBits', 'ROSpecID', 'SpecIndex',
+                 'InventoryParameterSpecID', 'AntennaID', 'PeakRSSI',
+                 'ChannelIndex', 'FirstSeenTimestampUTC',
+                 'FirstSeenTimestampUptime', 'LastSeenTimestampUTC',
+                 'LastSeenTimestampUptime', 'TagSeenCount',
+                 'ClientRequestOpSpecResult', 'AccessSpecID', 'OpSpecResult',
+                 'Other')
+
+    def __init__(self, EPC, EPCLengthBits):
+        self.EPC = EPC
+        self.EPCLengthBits = EPCLengthBits
+        self.ROSpecID = None
+        self.SpecIndex = None
+        self.InventoryParameterSpecID = None
+        self.AntennaID = None
+        self.PeakRSSI = None
+        self.ChannelIndex = None
+        self.FirstSeenTimestampUTC = None
+        self.FirstSeenTimestampUptime = None
+        self.LastSeenTimestampUTC = None
+        self.LastSeenTimestampUptime = None
+        self.TagSeenCount = None
+        self.ClientRequestOpSpecResult = None
+        self.AccessSpecID = None
+        self.OpSpecResult = None
+        self.Other = None
+
+    def asdict(self):
+        """Return the tag as decode_TagReportData would have decoded it."""
+        par = {}
+        if self.EPCLengthBits == 96:
+            par['EPC-96'] = str(self.EPC)
+        else:
+            par['EPCData'] = {'EPCLengthBits': self.EPCLengthBits,
+                              'EPC': str(self.EPC)}
+        for name in self.__slots__[2:-2]:
+            value = getattr(self, name)
+            if value is not None:
+                par[name] = (value, )
+        if self.Other:
+            for name, value in self.Other.items():
+                par[name] = (value, )
+        if self.OpSpecResult is not None:
+            par['OpSpecResult'] = self.OpSpecResult
+        return par
+
+    def __repr__(self):
+        return 'TagRead({!r})'.format(self.asdict())
+
+
+def decode_TagReportRecords(data, offset, end):
+    """Decode all the TagReportData of a report into a list of TagRead."""
+    logger.debug('decode_TagReportRecords')
+    tag_type = Message_struct['TagReportData']['type']
+    tags = []
+
+    while offset + par_header_len <= end:
+        msgtype, length = par_header_unpack(data, offset)
+        if msgtype & BITMASK(10) != tag_type or length < par_header_len:
+            break
+        pend = offset + length
+        if pend > end:
+            raise LLRPError('truncated TagReportData parameter')
+
+        # EPC-96 (TV) or EPCData (TLV)
+        epc, nbits, body = decode_tag_epc(data, offset + par_header_len,
+                                          pend)
+        tag = TagRead(epc, nbits)
+
+        # TV-encoded fields
+        while body < pend:
+            msgtype = data[body]
+            if not msgtype & 0x80:
+                break
+            entry = tve_param_table[msgtype & 0x7f]
+            if entry is None:
+                break
+            name, param_struct = entry
+            if body + 1 + param_struct.size > pend:
+                raise LLRPError('truncated TagReportData parameter')
+            (value, ) = param_struct.unpack_from(data, body + 1)
+            try:
+                setattr(tag, name, value)
+            except AttributeError:
+                if tag.Other is None:
+                    tag.Other = {}
+                tag.Other[name] = value
+            body += 1 + param_struct.size
+
+        ret, body = decode_OpSpecResult(data, body, pend)
+        if ret:
+            tag.OpSpecResult = ret
+
+        tags.append(tag)
+        offset = pend
+
+    return tags
+
+
+def decode_tag_epc(data, offset, end):
+    """Decode the EPC-96 or EPCData parameter starting a TagReportData.
+
+       Returns the EPC, its length in bits and the offset past the
+       parameter."""
+    if offset >= end:
+        raise LLRPError('missing or invalid EPCData parameter')
+    if data[offset] & BITMASK(7) == Message_struct['EPC-96']['type'] and \
+            data[offset] & BIT(7):
+        if offset + 13 > end:
+            raise LLRPError('truncated EPC-96 parameter')
+        return intern_epc(bytes(data[offset + 1:offset + 13])), 96, \
+            offset + 13
+    if offset + par_header_len + 2 > end:
+        raise LLRPError('missing or invalid EPCData parameter')
+    msgtype, length = par_header_unpack(data, offset)
+    if msgtype & BITMASK(10) != Message_struct['EPCData']['type'] or \
+            length < par_header_len + 2 or offset + length > end:
+        raise LLRPError('missing or invalid EPCData parameter')
+    (nbits, ) = epc_length_struct.unpack_from(data, offset + par_header_len)
+    return intern_epc(bytes(data[offset + par_header_len + 2:
+                                 offset + length])), nbits, offset + length
+
+
+def decode_TagReportEPCs(data, offset, end):
+    """Return the EPCs of all the TagReportData of a report, skipping over
+       their other fields."""
+    tag_type = Message_struct['TagReportData']['type']
+    epcs = []
+
+    while offset + par_header_len <= end:
+        msgtype, length = par_header_unpack(data, offset)
+        if msgtype & BITMASK(10) != tag_type or length < par_header_len:
+            break
+        pend = offset + length
+        if pend > end:
+            raise LLRPError('truncated TagReportData parameter')
+        epc, _, _ = decode_tag_epc(data, offset + par_header_len, pend)
+        epcs.append(epc)
+        offset = pend
+
+    return epcs
+
+
+class TagReportStream(object):
+    """The tags of an RO_ACCESS_REPORT, decoded one at a time.
+
+       Iterating over the stream decodes each TagReportData in turn from the
+       message bytes, as decode_TagReportData does, so only the current tag
+       is held in memory.  The stream can be iterated over more than once.
+       A malformed TagReportData raises LLRPError during the iteration
+       rather than when the message is decoded.
+    """
+    __slots__ = ('data', 'offset', 'end')
+
+    def __init__(self, data, offset, end):
+        self.data = data
+        self.offset = offset
+        self.end = end
+
+    def __iter__(self):
+        decoder = decode('TagReportData')
+        offset = self.offset
+        while True:
+            ret, offset = decoder(self.data, offset, self.end)
+            if not ret:
+                return
+            yield ret
+
+    def __repr__(self):
+        return '<TagReportStream: {} bytes>'.format(self.end - self.offset)
+
+
+def decode_OpSpecResult(data, offset, end):
     # handle any of the C1G2*OpSpecResult types
     par = {}
-    logger.debug(func())
+    logger.debug('decode_OpSpecResult')
 
-    if len(data) == 0:
-        return None, data
+    if offset + par_header_len > end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     c1g2opspecresults = ('C1G2ReadOpSpecResult',
                          'C1G2WriteOpSpecResult',
@@ -2501,31 +3045,42 @@ def decode_OpSpecResult(data):
                          'C1G2GetBlockPermalockStatusOpSpecResult')
     ok_types = (Message_struct[x]['type'] for x in c1g2opspecresults)
     if msgtype not in ok_types:
-        return (None, data)
-    body = data[par_header_len:length]
+        return (None, offset)
+    if length < par_header_len + 3 or offset + length > end:
+        raise LLRPError('truncated OpSpecResult parameter')
+    body = offset + par_header_len
+    pend = offset + length
 
     # all OpSpecResults begin with Result and OpSpecID
-    par['Result'], par['OpSpecID'] = sunpack('!BH', body[:3])
-    body = body[3:]
+    par['Result'], par['OpSpecID'] = sunpack_from('!BH', data, body)
+    body += 3
+    if body + 2 > pend and msgtype in (
+            Message_struct['C1G2ReadOpSpecResult']['type'],
+            Message_struct['C1G2WriteOpSpecResult']['type'],
+            Message_struct['C1G2BlockWriteOpSpecResult']['type'],
+            Message_struct['C1G2GetBlockPermalockStatusOpSpecResult']['type']):
+        raise LLRPError('truncated OpSpecResult parameter')
 
     if msgtype == Message_struct['C1G2ReadOpSpecResult']['type']:
-        wordcnt = sunpack('!H', body[:2])[0]
+        wordcnt = sunpack_from('!H', data, body)[0]
+        if body + 2 + wordcnt * 2 > pend:
+            raise LLRPError('truncated OpSpecResult parameter')
         par['ReadDataWordCount'] = wordcnt
-        end = 2 + (wordcnt*2)
-        par['ReadData'] = body[2:end]
+        par['ReadData'] = bytes(data[body + 2:body + 2 + (wordcnt*2)])
 
     elif msgtype in (Message_struct['C1G2WriteOpSpecResult']['type'],
                      Message_struct['C1G2BlockWriteOpSpecResult']['type']):
-        par['NumWordsWritten'] = sunpack('!H', body[:2])[0]
+        par['NumWordsWritten'] = sunpack_from('!H', data, body)[0]
 
     if msgtype == Message_struct['C1G2GetBlockPermalockStatusOpSpecResult']\
         ['type']:
-        wordcnt = sunpack('!H', body[:2])[0]
+        wordcnt = sunpack_from('!H', data, body)[0]
+        if body + 2 + wordcnt * 2 > pend:
+            raise LLRPError('truncated OpSpecResult parameter')
         par['StatusWordCount'] = wordcnt
-        end = 2 + (wordcnt*2)
-        par['PermalockStatus'] = body[2:end]
+        par['PermalockStatus'] = bytes(data[body + 2:body + 2 + (wordcnt*2)])
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['OpSpecResult'] = {
@@ -2650,26 +3205,77 @@ Message_struct['C1G2GetBlockPermalockStatusOpSpecResult'] = {
 
 
 # 16.2.7.3.1 EPCData Parameter
-def decode_EPCData(data):
+class EPC(bytes):
+    """An EPC, as raw bytes.
+
+       str() gives its hexadecimal representation, computed on first use.
+       EPCs decoded from reports are interned through intern_epc(), so that
+       a tag seen over and over is represented by the same object.  The
+       'records' and 'columns' tag formats hold EPC objects; the 'dict'
+       format keeps the hexadecimal str, without interning.
+    """
+
+    def __str__(self):
+        try:
+            return self._hex
+        except AttributeError:
+            self._hex = hexlify(self).decode()
+            return self._hex
+
+    def __repr__(self):
+        return 'EPC({})'.format(self)
+
+
+# bounded intern cache of the EPCs seen in reports: raw bytes -> EPC, from
+# least to most recently used
+EPC_CACHE_SIZE = 4096
+epc_cache = OrderedDict()
+
+
+def intern_epc(raw):
+    """Return the EPC for raw bytes, from the cache when it was seen before.
+
+       When the cache is full, the least recently used EPC is evicted."""
+    try:
+        epc = epc_cache[raw]
+    except KeyError:
+        pass
+    else:
+        epc_cache.move_to_end(raw)
+        return epc
+    epc = EPC(raw)
+    epc_cache[epc] = epc
+    if len(epc_cache) > EPC_CACHE_SIZE:
+        epc_cache.popitem(last=False)
+    return epc
+
+
+# EPCLengthBits field of EPCData
+epc_length_struct = Struct('!H')
+
+
+def decode_EPCData(data, offset, end):
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset + par_header_len > end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['EPCData']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    if length < par_header_len + epc_length_struct.size or \
+            offset + length > end:
+        raise LLRPError('truncated EPCData parameter')
+    body = offset + par_header_len
+    logger.debug('decode_EPCData (type=%d len=%d)', msgtype, length)
 
     # Decode fields
-    (par['EPCLengthBits'], ) = sunpack('!H',
-                                             body[0:scalc('!H')])
-    par['EPC'] = body[scalc('!H'):].encode('hex')
+    (par['EPCLengthBits'], ) = epc_length_struct.unpack_from(data, body)
+    par['EPC'] = hexlify(data[body + epc_length_struct.size:
+                              offset + length]).decode()
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['EPCData'] = {
@@ -2684,26 +3290,24 @@ Message_struct['EPCData'] = {
 
 
 # 16.2.7.3.2 EPC-96 Parameter
-def decode_EPC96(data):
+def decode_EPC96(data, offset, end):
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:tve_header_len]
-    (msgtype, ) = sunpack(tve_header, header)
-    msgtype = msgtype & BITMASK(7)
+    msgtype = data[offset] & BITMASK(7)
     if msgtype != Message_struct['EPC-96']['type']:
-        return (None, data)
+        return (None, offset)
     length = tve_header_len + (96 // 8)
-    body = data[tve_header_len:length]
-
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+    if offset + length > end:
+        raise LLRPError('truncated EPC-96 parameter')
+    body = offset + tve_header_len
 
     # Decode fields
-    par['EPC'] = hexlify(body).decode()
+    par['EPC'] = hexlify(data[body:offset + length]).decode()
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['EPC-96'] = {
@@ -2717,24 +3321,23 @@ Message_struct['EPC-96'] = {
 
 
 # 16.2.7.3.3 ROSpecID Parameter
-def decode_ROSpecID(data):
+def decode_ROSpecID(data, offset, end):
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:tve_header_len]
-    (msgtype, ), length = sunpack(tve_header, header), 1 + 4
+    (msgtype, ), length = sunpack_from(tve_header, data, offset), 1 + 4
     msgtype = msgtype & BITMASK(7)
     if msgtype != Message_struct['ROSpecID']['type']:
-        return (None, data)
-    body = data[tve_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + tve_header_len
+    logger.debug('decode_ROSpecID (type=%d len=%d)', msgtype, length)
 
     # Decode fields
-    (par['ROSpecID'], ) = sunpack('!I', body)
+    (par['ROSpecID'], ) = sunpack_from('!I', data, body)
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['ROSpecID'] = {
@@ -2748,34 +3351,35 @@ Message_struct['ROSpecID'] = {
 
 
 # 16.2.7.6 ReaderEventNotificationData Parameter
-def decode_ReaderEventNotificationData(data):
+def decode_ReaderEventNotificationData(data, offset, end):
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_ReaderEventNotificationData (type=%d len=%d)',
+                 msgtype, length)
 
     # Decode parameters
-    ret, body = decode('UTCTimestamp')(body)
+    ret, body = decode('UTCTimestamp')(data, body, end)
     if ret:
         par['UTCTimestamp'] = ret
     else:
         raise LLRPError('missing or invalid UTCTimestamp parameter')
 
-    ret, body = decode('ConnectionAttemptEvent')(body)
+    ret, body = decode('ConnectionAttemptEvent')(data, body, end)
     if ret:
         par['ConnectionAttemptEvent'] = ret
 
-    ret, body = decode('AntennaEvent')(body)
+    ret, body = decode('AntennaEvent')(data, body, end)
     if ret:
         par['AntennaEvent'] = ret
 
-    return par, body
+    return par, end
 
 
 Message_struct['ReaderEventNotificationData'] = {
@@ -2799,27 +3403,26 @@ Message_struct['ReaderEventNotificationData'] = {
 
 
 # 16.2.7.6.9 AntennaEvent Parameter
-def decode_AntennaEvent(data):
-    logger.debug(func())
+def decode_AntennaEvent(data, offset, end):
+    logger.debug('decode_AntennaEvent')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['AntennaEvent']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_AntennaEvent (type=%d len=%d)', msgtype, length)
 
     # Decode fields
-    (event_type, antenna_id) = sunpack('!BH', body)
+    (event_type, antenna_id) = sunpack_from('!BH', data, body)
     par['EventType'] = event_type and 'Connected' or 'Disconnected'
     par['AntennaID'] = antenna_id
 
-    return par, data[length:]
+    return par, offset + length
 
 
 Message_struct['AntennaEvent'] = {
@@ -2834,26 +3437,143 @@ Message_struct['AntennaEvent'] = {
 
 
 # 16.2.7.6.10 ConnectionAttemptEvent Parameter
-def decode_ConnectionAttemptEvent(data):
-    logger.debug(func())
+def decode_ConnectionAttemptEvent(data, offset, end):
+    logger.debug('decode_ConnectionAttemptEvent')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['ConnectionAttemptEvent']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_ConnectionAttemptEvent (type=%d len=%d)',
+                 msgtype, length)
 
     # Decode fields
-    (status, ) = sunpack('!H', body)
+    (status, ) = sunpack_from('!H', data, body)
     par['Status'] = ConnEvent_Type2Name[status]
 
-    return par, data[length:]
+    return par, offset + length
+
+
+# 16.2.6.2 Identification Parameter
+def decode_Identification(data, offset, end):
+    logger.debug('decode_Identification')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['Identification']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+    logger.debug('decode_Identification (type=%d len=%d)', msgtype, length)
+
+    # Decode fields
+    (idtype, count) = sunpack_from('!BH', data, body)
+    body += 3
+    par['IDType'] = IDType_Type2Name.get(idtype, idtype)
+    par['ReaderID'] = bytes(data[body:body + count])
+
+    return par, offset + length
+
+
+Message_struct['Identification'] = {
+    'type': 218,
+    'fields': [
+        'Type',
+        'IDType',
+        'ByteCount',
+        'ReaderID'
+    ],
+    'decode': decode_Identification
+}
+
+
+# 16.2.6.4 KeepaliveSpec Parameter
+def encode_KeepaliveSpec(par, data):
+    data += spack('!HHBI', Message_struct['KeepaliveSpec']['type'], 9,
+                  KeepaliveTrigger_Name2Type[par['KeepaliveTriggerType']],
+                  par.get('PeriodicTriggerValue', 0))
+
+
+def decode_KeepaliveSpec(data, offset, end):
+    logger.debug('decode_KeepaliveSpec')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['KeepaliveSpec']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+
+    # Decode fields
+    (trigger, par['PeriodicTriggerValue']) = sunpack_from('!BI', data, body)
+    par['KeepaliveTriggerType'] = KeepaliveTrigger_Type2Name.get(trigger,
+                                                                 trigger)
+
+    return par, offset + length
+
+
+Message_struct['KeepaliveSpec'] = {
+    'type': 220,
+    'fields': [
+        'Type',
+        'KeepaliveTriggerType',
+        'PeriodicTriggerValue'
+    ],
+    'encode': encode_KeepaliveSpec,
+    'decode': decode_KeepaliveSpec
+}
+
+
+# 16.2.6.5 AntennaProperties Parameter
+def encode_AntennaProperties(par, data):
+    data += spack('!HHBHh', Message_struct['AntennaProperties']['type'], 9,
+                  (par['AntennaConnected'] and 1 or 0) << 7,
+                  par['AntennaID'], par['AntennaGain'])
+
+
+def decode_AntennaProperties(data, offset, end):
+    logger.debug('decode_AntennaProperties')
+    par = {}
+
+    if offset >= end:
+        return None, offset
+
+    msgtype, length = par_header_unpack(data, offset)
+    msgtype = msgtype & BITMASK(10)
+    if msgtype != Message_struct['AntennaProperties']['type']:
+        return (None, offset)
+    body = offset + par_header_len
+
+    # Decode fields
+    (flags, par['AntennaID'],
+     par['AntennaGain']) = sunpack_from('!BHh', data, body)
+    par['AntennaConnected'] = (flags & BIT(7) == BIT(7))
+
+    return par, offset + length
+
+
+Message_struct['AntennaProperties'] = {
+    'type': 221,
+    'fields': [
+        'Type',
+        'AntennaConnected',
+        'AntennaID',
+        'AntennaGain'
+    ],
+    'encode': encode_AntennaProperties,
+    'decode': decode_AntennaProperties
+}
 
 
 Message_struct['ConnectionAttemptEvent'] = {
@@ -2867,52 +3587,54 @@ Message_struct['ConnectionAttemptEvent'] = {
 
 
 # 16.2.8.1 LLRPStatus Parameter
-def decode_LLRPStatus(data):
-    logger.debug(func())
+def decode_LLRPStatus(data, offset, end):
     par = {}
-    logger.debug('decode_LLRPStatus: %s', hexlify(data))
+    if logger.isEnabledFor(DEBUG):
+        logger.debug('decode_LLRPStatus: %s', hexlify(data[offset:end]))
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['LLRPStatus']['type']:
         logger.debug('got msgtype={0}, expected {1}'.format(msgtype,
                      Message_struct['LLRPStatus']['type']))
         logger.debug('note length=%d', length)
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d)', func(), msgtype, length)
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_LLRPStatus (type=%d len=%d)', msgtype, length)
 
     # Decode fields
-    offset = scalc('!HH')
-    (code, n) = sunpack('!HH', body[:offset])
+    fmt_len = scalc('!HH')
+    (code, n) = sunpack_from('!HH', data, body)
     try:
         par['StatusCode'] = Error_Type2Name[code]
     except KeyError:
         logger.warning('Unknown field code %s', code)
-    par['ErrorDescription'] = body[offset:offset + n].decode()
+    body += fmt_len
+    par['ErrorDescription'] = bytes(data[body:body + n]).decode()
 
     # Decode parameters
-    ret, body = decode('FieldError')(body[offset + n:])
+    ret, body = decode('FieldError')(data, body + n, end)
     if ret:
         par['FieldError'] = ret
     else:
         logger.debug('no FieldError')
 
-    ret, body = decode('ParameterError')(body)
+    ret, body = decode('ParameterError')(data, body, end)
     if ret:
         par['ParameterError'] = ret
     else:
         logger.debug('no ParameterError')
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if body < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[body:end]))
 
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['LLRPStatus'] = {
@@ -2929,27 +3651,10 @@ Message_struct['LLRPStatus'] = {
 
 
 # 16.2.8.1.1 FieldError Parameter
-def decode_FieldError(data):
-    logger.debug(func())
-    par = {}
-
-    if len(data) == 0:
-        return None, data
-
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
-    msgtype = msgtype & BITMASK(10)
-    if msgtype != Message_struct['FieldError']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d data=%s)', func(), msgtype, length,
-                 repr(body))
-
-    # Decode fields
-    offset = scalc('!H')
-    (par['FieldNum'], ) = sunpack('!H', body[:offset])
-
-    return par, data[length:]
+def decode_FieldError(data, offset, end):
+    logger.debug('decode_FieldError')
+    return decode_tlv_parameter(data, offset, end,
+                                Message_struct['FieldError']['type'])
 
 
 Message_struct['FieldError'] = {
@@ -2964,41 +3669,41 @@ Message_struct['FieldError'] = {
 
 
 # 16.2.8.1.2 ParameterError Parameter
-def decode_ParameterError(data):
-    logger.debug(func())
+def decode_ParameterError(data, offset, end):
+    logger.debug('decode_ParameterError')
     par = {}
 
-    if len(data) == 0:
-        return None, data
+    if offset >= end:
+        return None, offset
 
-    header = data[0:par_header_len]
-    msgtype, length = sunpack(par_header, header)
+    msgtype, length = par_header_unpack(data, offset)
     msgtype = msgtype & BITMASK(10)
     if msgtype != Message_struct['ParameterError']['type']:
-        return (None, data)
-    body = data[par_header_len:length]
-    logger.debug('%s (type=%d len=%d data=%s)', func(), msgtype, length,
-                 repr(body))
+        return (None, offset)
+    body = offset + par_header_len
+    end = offset + length
+    logger.debug('decode_ParameterError (type=%d len=%d data=%r)', msgtype,
+                 length, data[body:end])
 
     # Decode fields
-    offset = scalc('!HH')
-    par['ParameterType'], par['ErrorCode'] = sunpack('!HH',
-                                                           body[:offset])
+    fmt_len = scalc('!HH')
+    par['ParameterType'], par['ErrorCode'] = sunpack_from('!HH', data, body)
 
     # Decode parameters
-    ret, body = decode('FieldError')(body[offset:])
+    ret, body = decode('FieldError')(data, body + fmt_len, end)
     if ret:
         par['FieldError'] = ret
 
-    ret, body = decode('ParameterError')(body)
+    ret, body = decode('ParameterError')(data, body, end)
     if ret:
         par['ParameterError'] = ret
 
     # Check the end of the message
-    if len(body) > 0:
-        raise LLRPError('junk at end of message: ' + bin2dump(body))
+    if body < end:
+        raise LLRPError('junk at end of message: ' +
+                        bin2dump(data[body:end]))
 
-    return par, data[length:]
+    return par, end
 
 
 Message_struct['ParameterError'] = {
@@ -3050,7 +3755,7 @@ class LLRPROSpec(dict):
                  antennas=(1,), tx_power=91, duration_sec=None,
                  report_every_n_tags=None, report_timeout_ms=0,
                  tag_content_selector={},
-                 session=2, tag_population=4):
+                 session=2, tag_population=4, reader_config=False):
         # Sanity checks
         if msgid <= 0:
             raise LLRPError('invalid ROSpec message ID {} (need >0)'.format(
@@ -3168,6 +3873,23 @@ class LLRPROSpec(dict):
                     },
             })
 
+        # with reader_config, the transmit power and the report spec are
+        # left to the reader configuration, which can change while the
+        # ROSpec runs: they are moved to the SET_READER_CONFIG parameters
+        # self.reader_config
+        self.reader_config = None
+        if reader_config:
+            rospec = self['ROSpec']
+            antconfs = rospec['AISpec']['InventoryParameterSpec']\
+                ['AntennaConfiguration']
+            self.reader_config = {
+                'AntennaConfiguration': [{
+                    'AntennaID': antconf['AntennaID'],
+                    'RFTransmitter': antconf.pop('RFTransmitter'),
+                } for antconf in antconfs],
+                'ROReportSpec': rospec.pop('ROReportSpec'),
+            }
+
     def __repr__(self):
         return llrp_data2xml(self)
 
@@ -3183,6 +3905,14 @@ Message_Type2Name = {}
 for m in Message_struct:
     if 'type' in Message_struct[m]:
         i = Message_struct[m]['type']
+        # aliases keep the name of the type they were defined with
+        if Message_struct.get(Message_Type2Name.get(i)) is Message_struct[m]:
+            continue
+        # TV parameters (e.g. EPC-96) share types with messages (e.g.
+        # SET_READER_CONFIG_RESPONSE): keep the message
+        if i in Message_Type2Name and \
+                'Ver' not in Message_struct[m].get('fields', ()):
+            continue
         Message_Type2Name[i] = m
     else:
         logger.debug('Pseudo-warning: Message_struct type {} '
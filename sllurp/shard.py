@@ -0,0 +1,293 @@
+"""Spread readers across worker processes, each running its own LLRPEngine.
+
+Workers push the tags they read into a shared-memory ring of fixed-size
+records, one ring per worker, which the parent process drains into a single
+callback.  Control commands are fanned out to the workers through pipes.
+"""
+
+from asyncio import get_event_loop, new_event_loop, set_event_loop, sleep
+from functools import partial
+from logging import getLogger
+from multiprocessing import Pipe, Process
+from struct import Struct
+from . import LLRPError
+from .llrp import LLRPEngine
+from .llrp_proto import TagRead, intern_epc
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+
+logger = getLogger(__name__)
+
+# ring header: head (records written), tail (records read), dropped records
+RING_HEADER = Struct('<QQQ')
+RING_HEADER_LEN = 64
+# tag record: LastSeenTimestampUTC, reader index, AntennaID, ChannelIndex,
+# TagSeenCount, PeakRSSI, mask of the fields present, EPC length, EPC
+TAG_RECORD = Struct('<QHHHHbBB32s')
+RING_INDEX = Struct('<Q')
+# optional TagRead fields of a tag record, by bit of its presence mask
+TAG_RECORD_FIELDS = ('LastSeenTimestampUTC', 'AntennaID', 'ChannelIndex',
+                     'TagSeenCount', 'PeakRSSI')
+
+
+class TagRing(object):
+    """Single-producer, single-consumer ring of TAG_RECORDs in a
+       shared-memory block."""
+
+    def __init__(self, shm, capacity):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = capacity
+
+    @classmethod
+    def create(cls, capacity):
+        shm = shared_memory.SharedMemory(
+            create=True, size=RING_HEADER_LEN + capacity * TAG_RECORD.size)
+        RING_HEADER.pack_into(shm.buf, 0, 0, 0, 0)
+        return cls(shm, capacity)
+
+    def push(self, reader, tag):
+        """Write a TagRead; return False if the ring is full."""
+        head, tail, dropped = RING_HEADER.unpack_from(self.buf, 0)
+        if head - tail >= self.capacity:
+            RING_INDEX.pack_into(self.buf, 16, dropped + 1)
+            return False
+        epc = tag.EPC[:32]
+        present = 0
+        for bit, name in enumerate(TAG_RECORD_FIELDS):
+            if getattr(tag, name) is not None:
+                present |= 1 << bit
+        TAG_RECORD.pack_into(self.buf,
+                             RING_HEADER_LEN +
+                             (head % self.capacity) * TAG_RECORD.size,
+                             tag.LastSeenTimestampUTC or 0, reader,
+                             tag.AntennaID or 0, tag.ChannelIndex or 0,
+                             tag.TagSeenCount or 0, tag.PeakRSSI or 0,
+                             present, len(epc), epc)
+        # publish the record only once it is written
+        RING_INDEX.pack_into(self.buf, 0, head + 1)
+        return True
+
+    def drain(self):
+        """Return the (reader index, TagRead) records written so far."""
+        head, tail, _ = RING_HEADER.unpack_from(self.buf, 0)
+        tags = []
+        for i in range(tail, head):
+            (last_seen, reader, antenna, channel, count, rssi, present,
+             epc_len, epc) = TAG_RECORD.unpack_from(
+                 self.buf,
+                 RING_HEADER_LEN + (i % self.capacity) * TAG_RECORD.size)
+            tag = TagRead(intern_epc(epc[:epc_len]), epc_len * 8)
+            for bit, value in enumerate((last_seen, antenna, channel, count,
+                                         rssi)):
+                if present & (1 << bit):
+                    setattr(tag, TAG_RECORD_FIELDS[bit], value)
+            tags.append((reader, tag))
+        RING_INDEX.pack_into(self.buf, 8, head)
+        return tags
+
+    def getDropped(self):
+        return RING_HEADER.unpack_from(self.buf, 0)[2]
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+class _WorkerEngine(LLRPEngine):
+    """LLRPEngine pushing the tags of its readers into a ring, along with
+       the index of the reader in the host list of LLRPShardedEngine."""
+
+    def __init__(self, ring, reader_index, **engine_args):
+        super().__init__(tag_format='records', **engine_args)
+        self.ring = ring
+        # host -> reader index
+        self.reader_index = reader_index
+
+    async def listen(self, *args, **kwargs):
+        raise LLRPError('workers of LLRPShardedEngine cannot accept '
+                        'reader-initiated connections')
+
+    def build_protocol(self, reader=None):
+        if reader is None:
+            raise LLRPError('workers of LLRPShardedEngine only connect to '
+                            'the readers of their host list')
+        proto = super().build_protocol(reader)
+        proto.addMessageCallback(
+            'RO_ACCESS_REPORT',
+            partial(self.pushTags, self.reader_index[reader.host]))
+        return proto
+
+    def setTxPower(self, tx_power, host=None):
+        """Set the transmit power on all readers, or on the reader of host
+           in the host list."""
+        for proto in self.protocols:
+            if host is None or proto.reader.host == host:
+                proto.setTxPower(tx_power)
+
+    def pushTags(self, index, lmsg):
+        for tag in lmsg.msgdict['RO_ACCESS_REPORT']['TagReportData']:
+            self.ring.push(index, tag)
+
+
+def _run_worker(readers, port, timeout, engine_args, shm, capacity, conn):
+    """Worker process: inventory readers [(index, host), ...] and push the
+       tags they report into the ring."""
+    loop = new_event_loop()
+    set_event_loop(loop)
+    ring = TagRing(shm, capacity)
+    engine = _WorkerEngine(ring, {host: index for index, host in readers},
+                           **engine_args)
+
+    async def stop():
+        engine.politeShutdown()
+        for _ in range(50):
+            if not engine.protocols:
+                break
+            await sleep(0.1)
+        loop.stop()
+
+    def command():
+        cmd, args = conn.recv()
+        logger.debug('worker command %s%s', cmd, args)
+        if cmd == 'stop':
+            loop.remove_reader(conn.fileno())
+            loop.create_task(stop())
+        elif cmd == 'pause':
+            engine.pauseInventory(*args)
+        elif cmd == 'resume':
+            engine.resumeInventory()
+        elif cmd == 'setTxPower':
+            engine.setTxPower(*args)
+
+    loop.add_reader(conn.fileno(), command)
+    for _, host in readers:
+        loop.create_task(engine.new_reader(host, port, timeout=timeout))
+    try:
+        loop.run_forever()
+    finally:
+        ring.close()
+        loop.close()
+
+
+class LLRPShardedEngine(object):
+    """Inventory readers from several worker processes.
+
+       Readers are spread round-robin over the workers; engine_args are
+       passed to the LLRPEngine of each worker.  Tag callbacks get lists of
+       (host, TagRead) pairs, drained from the shared-memory rings every
+       poll_interval seconds.  A worker drops the tags it cannot fit in its
+       ring of ring_size records (see getDropped).  Workers give up
+       connecting to a reader after timeout seconds.  Workers decode tags as
+       'records' and only connect to the readers in hosts; they do not
+       accept reader-initiated connections.
+    """
+
+    def __init__(self, hosts, workers=2, port=LLRPEngine.PORT,
+                 ring_size=65536, poll_interval=0.01, timeout=3,
+                 **engine_args):
+        if shared_memory is None:
+            raise LLRPError('LLRPShardedEngine requires Python 3.8 or later')
+        tag_format = engine_args.pop('tag_format', 'records')
+        if tag_format != 'records':
+            raise LLRPError('LLRPShardedEngine workers decode tags as '
+                            'records, not {}'.format(tag_format))
+        self.hosts = list(hosts)
+        self.nworkers = max(1, min(workers, len(self.hosts)))
+        self.port = port
+        # connection timeout, in seconds
+        self.timeout = timeout
+        self.ring_size = ring_size
+        self.poll_interval = poll_interval
+        self.engine_args = engine_args
+        self._tag_callbacks = []
+        self._workers = []  # (process, ring, pipe connection)
+        self._poll_handle = None
+
+    def addTagCallback(self, cb):
+        self._tag_callbacks.append(cb)
+
+    def start(self):
+        """Start the workers and drain their rings from the current event
+           loop."""
+        for w in range(self.nworkers):
+            readers = [(i, host) for i, host in enumerate(self.hosts)
+                       if i % self.nworkers == w]
+            ring = TagRing.create(self.ring_size)
+            parent_conn, child_conn = Pipe()
+            proc = Process(target=_run_worker,
+                           args=(readers, self.port, self.timeout,
+                                 self.engine_args,
+                                 ring.shm, self.ring_size, child_conn),
+                           daemon=True)
+            proc.start()
+            child_conn.close()
+            self._workers.append((proc, ring, parent_conn))
+        self._poll_handle = get_event_loop().call_later(self.poll_interval,
+                                                        self._poll)
+
+    def _poll(self):
+        self.drain()
+        self._poll_handle = get_event_loop().call_later(self.poll_interval,
+                                                        self._poll)
+
+    def drain(self):
+        """Run the tag callbacks on the tags read since the last drain."""
+        tags = []
+        for _, ring, _ in self._workers:
+            tags.extend((self.hosts[reader], tag)
+                        for reader, tag in ring.drain())
+        if tags:
+            for fn in self._tag_callbacks:
+                fn(tags)
+
+    def _sendCommand(self, cmd, *args):
+        for _, _, conn in self._workers:
+            conn.send((cmd, args))
+
+    def pauseInventory(self, seconds=0):
+        self._sendCommand('pause', seconds)
+
+    def resumeInventory(self):
+        self._sendCommand('resume')
+
+    def setTxPower(self, tx_power, host=None):
+        """Set the transmit power on all readers, or on the reader of host,
+           as given in hosts."""
+        if host is None:
+            self._sendCommand('setTxPower', tx_power)
+            return
+        try:
+            worker = self.hosts.index(host) % self.nworkers
+        except ValueError:
+            raise LLRPError('unknown reader host {}'.format(host))
+        self._workers[worker][2].send(('setTxPower', (tx_power, host)))
+
+    def getDropped(self):
+        """Return the number of tags dropped by each worker."""
+        return [ring.getDropped() for _, ring, _ in self._workers]
+
+    def stop(self, timeout=10):
+        """Stop inventory politely, wait for the workers to exit and run the
+           tag callbacks on the last tags."""
+        if self._poll_handle is not None:
+            self._poll_handle.cancel()
+            self._poll_handle = None
+        self._sendCommand('stop')
+        for proc, _, _ in self._workers:
+            proc.join(timeout)
+            if proc.is_alive():
+                logger.warning('worker %d did not stop; terminating',
+                               proc.pid)
+                proc.terminate()
+        self.drain()
+        for _, ring, conn in self._workers:
+            conn.close()
+            ring.close()
+            ring.shm.unlink()
+        self._workers = []
@@ -10,7 +10,9 @@ def BITMASK(n):
 
 
 def func():
-    "Return the current function's name."
+    """Return the current function's name.
+
+    This walks the whole call stack: keep it out of per-message code."""
     return stack()[1][3]
 
 
@@ -0,0 +1,89 @@
+from json import load
+
+import pytest
+
+from sllurp import capabilities
+from sllurp.capabilities import CapabilitiesCache, reduceCapabilities
+
+IDENTIFICATION = {'ReaderID': b'\x00\x16\x25\x12\x34\x56'}
+
+
+def make_capabilities(firmware='5.12.0', antennas=4):
+    return {
+        'GeneralDeviceCapabilities': {
+            'MaxNumberOfAntennaSupported': antennas,
+            'DeviceManufacturerName': 25882,
+            'ModelName': 2001002,
+            'ReaderFirmwareVersion': firmware,
+            'HasUTCClockCapability': True,
+        },
+        'RegulatoryCapabilities': {
+            'UHFBandCapabilities': {
+                'TransmitPowerLevelTableEntry1': {
+                    'Index': 1, 'TransmitPowerValue': 1000},
+                'TransmitPowerLevelTableEntry2': {
+                    'Index': 2, 'TransmitPowerValue': 1025},
+                'UHFRFModeTable': {
+                    'UHFC1G2RFModeTableEntry0': {'ModeIdentifier': 0,
+                                                 'Mod': 0, 'MaxTari': 6250},
+                },
+                'FrequencyInformation': {'Hopping': True},
+            },
+        },
+    }
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'capabilities.json')
+
+
+def test_miss(path):
+    cache = CapabilitiesCache(path)
+    assert cache.lookup('reader') == (None, None)
+    assert cache.getCapabilities('001625123456/5.12.0') is None
+
+
+def test_update_and_load(path):
+    capdict = make_capabilities()
+    identity = CapabilitiesCache(path).update('reader', IDENTIFICATION,
+                                              capdict)
+    assert identity == '001625123456/5.12.0'
+
+    cache = CapabilitiesCache(path)
+    assert cache.lookup('reader') == (identity, reduceCapabilities(capdict))
+    assert 'FrequencyInformation' not in \
+        cache.getCapabilities(identity)['RegulatoryCapabilities'][
+            'UHFBandCapabilities']
+
+
+def test_firmware_change_is_a_new_identity(path):
+    cache = CapabilitiesCache(path)
+    old = cache.update('reader', IDENTIFICATION, make_capabilities())
+    new = cache.update('reader', IDENTIFICATION,
+                       make_capabilities(firmware='6.0.0'))
+    assert old != new
+    assert cache.lookup('reader')[0] == new
+    assert cache.getCapabilities(old) is not None
+
+
+def test_corrupt_file_is_ignored(path):
+    with open(path, 'w') as cachefile:
+        cachefile.write('{not json')
+    assert CapabilitiesCache(path).lookup('reader') == (None, None)
+
+
+def test_save_is_atomic(path, monkeypatch):
+    cache = CapabilitiesCache(path)
+    cache.update('reader', IDENTIFICATION, make_capabilities())
+    with open(path) as cachefile:
+        saved = load(cachefile)
+
+    def failing_replace(src, dst):
+        raise OSError('disk full')
+
+    # a save failing before the file is replaced leaves it untouched
+    monkeypatch.setattr(capabilities, 'replace', failing_replace)
+    cache.update('other', IDENTIFICATION, make_capabilities(antennas=2))
+    with open(path) as cachefile:
+        assert load(cachefile) == saved
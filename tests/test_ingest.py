@@ -0,0 +1,128 @@
+from asyncio import new_event_loop
+
+import pytest
+
+from sllurp import LLRPError
+from sllurp.benchmark import build_report
+from sllurp.llrp import IngestQueue, LLRPMessage, reportEPCs
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.reading = True
+
+    def pause_reading(self):
+        self.reading = False
+
+    def resume_reading(self):
+        self.reading = True
+
+
+class FakeProtocol(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+
+
+@pytest.fixture
+def loop():
+    loop = new_event_loop()
+    yield loop
+    loop.close()
+
+
+def run_queue(loop, policy, messages, maxsize=2):
+    """Queue messages [(name, msg)] in one go, then run the callbacks;
+       return the queue and the messages the callbacks got."""
+    got = []
+    queue = IngestQueue(FakeProtocol(), maxsize, policy)
+
+    async def fill():
+        for name, msg in messages:
+            queue.put(name, [got.append], msg)
+        while queue._task is not None:
+            await queue._task
+
+    loop.run_until_complete(fill())
+    return queue, got
+
+
+def test_invalid_settings():
+    with pytest.raises(LLRPError):
+        IngestQueue(FakeProtocol(), 0)
+    with pytest.raises(LLRPError):
+        IngestQueue(FakeProtocol(), 1, 'drop-everything')
+
+
+def test_drop_oldest(loop):
+    queue, got = run_queue(loop, 'drop-oldest',
+                           [('KEEPALIVE', i) for i in range(4)])
+    assert got == [2, 3]
+    assert queue.getStats()['dropped'] == 2
+    assert queue.getStats()['high_water'] == 2
+
+
+def test_drop_newest(loop):
+    queue, got = run_queue(loop, 'drop-newest',
+                           [('KEEPALIVE', i) for i in range(4)])
+    assert got == [0, 1]
+    assert queue.dropped == 2
+
+
+def test_pause(loop):
+    protocol = FakeProtocol()
+    queue = IngestQueue(protocol, 2, 'pause')
+    got = []
+
+    async def fill():
+        for i in range(3):
+            queue.put('KEEPALIVE', [got.append], i)
+        assert queue.paused and not protocol.transport.reading
+        while queue._task is not None:
+            await queue._task
+
+    loop.run_until_complete(fill())
+    assert got == [0, 1, 2]
+    assert not queue.paused and protocol.transport.reading
+    assert queue.dropped == 0
+
+
+def test_drop_duplicates(loop):
+    report = build_report(2)
+    other = build_report(3)
+    queue, got = run_queue(loop, 'drop-duplicates', [
+        ('RO_ACCESS_REPORT', report),
+        ('RO_ACCESS_REPORT', other),
+        # all its EPCs are queued: dropped
+        ('RO_ACCESS_REPORT', report),
+        # a new EPC: the oldest message is dropped instead
+        ('RO_ACCESS_REPORT', build_report(4)),
+    ])
+    assert got == [other, build_report(4)]
+    assert queue.dropped == 2
+
+
+def test_drop_duplicates_scans_only_when_full(loop):
+    msgs = [LLRPMessage(msgbytes=build_report(2), lazy=True)
+            for _ in range(2)]
+
+    async def fill():
+        queue = IngestQueue(FakeProtocol(), 2, 'drop-duplicates')
+        queue.put('RO_ACCESS_REPORT', [], msgs[0])
+        assert queue._unscanned == 1
+        queue.put('RO_ACCESS_REPORT', [], msgs[1])
+        queue.put('RO_ACCESS_REPORT', [], build_report(1))
+        assert queue._unscanned == 0
+        assert queue.dropped == 1
+        await queue._task
+
+    loop.run_until_complete(fill())
+    # the queue scans the EPCs without decoding the messages
+    assert not any(msg._decoded for msg in msgs)
+
+
+def test_report_epcs_of_message_and_bytes():
+    report = build_report(2)
+    epcs = reportEPCs(report)
+    assert epcs == reportEPCs(LLRPMessage(msgbytes=report, lazy=True))
+    assert sorted(str(epc) for epc in epcs) == [
+        '300000000000000000000000', '300000000000000000000001']
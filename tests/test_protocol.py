@@ -0,0 +1,92 @@
+from struct import pack
+
+from sllurp.llrp import LLRPEngine, LLRPMessage, LLRPProtocol, LLRPReader
+
+
+def reader_event(*params):
+    """Return a READER_EVENT_NOTIFICATION holding params."""
+    body = pack('!HHQ', 128, 12, 0) + b''.join(params)  # UTCTimestamp
+    rend = pack('!HH', 246, 4 + len(body)) + body
+    return pack('!HII', (1 << 10) | 63, 10 + len(rend), 0) + rend
+
+
+# ConnectionAttemptEvent with status Success
+CONNECTION_ACCEPTED = reader_event(pack('!HHH', 256, 6, 0))
+
+
+def error_message(msgid):
+    status = pack('!HHHH', 287, 8, 0, 0)  # LLRPStatus: Success
+    return pack('!HII', (1 << 10) | 100, 10 + len(status), msgid) + status
+
+
+def make_protocol():
+    proto = LLRPProtocol(factory=None)
+    proto.tasks = []
+    proto.runTask = lambda coro, what: (proto.tasks.append(what),
+                                        coro.close())
+    return proto
+
+
+def test_error_message_key():
+    msg = LLRPMessage(msgbytes=error_message(5))
+    assert msg.getName() == 'ErrorMessage'
+    assert list(msg.msgdict) == ['ErrorMessage']
+
+
+def test_error_message_aliases():
+    proto = make_protocol()
+    got = []
+    proto.addMessageCallback('ERROR_MESSAGE', got.append)
+    proto.data_received(error_message(5))
+    assert [msg.msgdict['ErrorMessage']['ID'] for msg in got] == [5]
+    assert proto.getMessagePolicy('ERROR_MESSAGE') == 'decode'
+
+
+def test_connection_attempt_runs_connect_sequence_once():
+    proto = make_protocol()
+    proto.data_received(CONNECTION_ACCEPTED)
+    assert proto.state == LLRPProtocol.STATE_CONNECTING
+    proto.data_received(CONNECTION_ACCEPTED)
+    proto.state = LLRPProtocol.STATE_INVENTORYING
+    proto.data_received(CONNECTION_ACCEPTED)
+    assert proto.tasks == ['connect sequence']
+
+
+def test_reader_event_policy_applies_after_handshake():
+    proto = make_protocol()
+    got = []
+    proto.addMessageCallback('READER_EVENT_NOTIFICATION', got.append)
+    proto.setMessagePolicy('READER_EVENT_NOTIFICATION', 'raw')
+    # still decoded for the state machine during the handshake
+    proto.data_received(CONNECTION_ACCEPTED)
+    assert proto.tasks == ['connect sequence']
+    assert got == [CONNECTION_ACCEPTED]
+
+    proto.state = LLRPProtocol.STATE_INVENTORYING
+    proto.setMessagePolicy('READER_EVENT_NOTIFICATION', 'drop')
+    proto.data_received(CONNECTION_ACCEPTED)
+    assert got == [CONNECTION_ACCEPTED]
+
+
+def test_backoff_resets_once_inventory_starts():
+    engine = LLRPEngine()
+    engine.protocols = set()
+    reader = LLRPReader('reader', LLRPEngine.PORT, 3)
+    reader.closed = True
+    reader.failures = 3
+
+    proto = make_protocol()
+    proto.reader = reader
+    proto.peername = ('10.0.0.1', 5084)
+    reader.protocol = proto
+    engine.clientConnectionLost(proto, 'reset')
+    assert reader.failures == 4
+
+    proto = make_protocol()
+    proto.reader = reader
+    proto.peername = ('10.0.0.1', 5084)
+    reader.protocol = proto
+    proto.setState(LLRPProtocol.STATE_INVENTORYING)
+    assert reader.failures == 0
+    engine.clientConnectionLost(proto, 'reset')
+    assert reader.failures == 0
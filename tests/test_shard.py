@@ -0,0 +1,59 @@
+import pytest
+
+from sllurp import LLRPError
+from sllurp.llrp_proto import TagRead, intern_epc
+from sllurp.shard import LLRPShardedEngine, TagRing, shared_memory
+
+pytestmark = pytest.mark.skipif(shared_memory is None,
+                                reason='requires Python 3.8 or later')
+
+
+@pytest.fixture
+def ring():
+    ring = TagRing.create(2)
+    yield ring
+    ring.close()
+    ring.shm.unlink()
+
+
+def make_tag(epc, **fields):
+    tag = TagRead(intern_epc(epc), len(epc) * 8)
+    for name, value in fields.items():
+        setattr(tag, name, value)
+    return tag
+
+
+def test_push_drain_round_trip(ring):
+    full = make_tag(b'\x30' * 12, LastSeenTimestampUTC=1500000000000000,
+                    AntennaID=2, ChannelIndex=7, TagSeenCount=3,
+                    PeakRSSI=-52)
+    # reported zeroes and absent fields are told apart
+    sparse = make_tag(b'\x11' * 8, AntennaID=0, PeakRSSI=0)
+    assert ring.push(0, full)
+    assert ring.push(5, sparse)
+
+    (idx0, tag0), (idx1, tag1) = ring.drain()
+    assert (idx0, idx1) == (0, 5)
+    assert tag0.asdict() == full.asdict()
+    assert tag1.asdict() == sparse.asdict()
+    assert tag1.AntennaID == 0 and tag1.PeakRSSI == 0
+    assert tag1.ChannelIndex is None and tag1.TagSeenCount is None
+    assert tag1.LastSeenTimestampUTC is None
+    assert ring.drain() == []
+
+
+def test_push_drops_when_full(ring):
+    tag = make_tag(b'\x30' * 12)
+    assert ring.push(0, tag)
+    assert ring.push(0, tag)
+    assert not ring.push(0, tag)
+    assert ring.getDropped() == 1
+    assert len(ring.drain()) == 2
+    assert ring.push(0, tag)
+
+
+def test_sharded_engine_tag_format():
+    engine = LLRPShardedEngine(['reader'], tag_format='records')
+    assert 'tag_format' not in engine.engine_args
+    with pytest.raises(LLRPError):
+        LLRPShardedEngine(['reader'], tag_format='dict')
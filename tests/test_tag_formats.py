@@ -0,0 +1,146 @@
+import logging
+from struct import pack
+
+import pytest
+
+from sllurp import LLRPError
+from sllurp.benchmark import build_report
+from sllurp.llrp import LLRPMessage, LLRPProtocol
+from sllurp.llrp_proto import (TagReportStream, decode_ROAccessReport,
+                               decode_TagReportColumns,
+                               decode_TagReportEPCs, decode_TagReportRecords)
+
+
+def epcdata_report():
+    """Return an RO_ACCESS_REPORT with one tag reported with EPCData."""
+    body = pack('!HHH', 241, 4 + 2 + 8, 64) + b'\x11' * 7 + b'\x00'
+    body += pack('!BH', 0x80 | 7, 3)  # ChannelIndex
+    body += pack('!BI', 0x80 | 9, 1)  # ROSpecID
+    tag = pack('!HH', 240, 4 + len(body)) + body
+    return pack('!HII', (1 << 10) | 61, 10 + len(tag), 0) + tag
+
+
+# what the decoder before the tag formats returned for build_report(2)
+BASELINE_TAGS = [
+    {'EPC-96': '300000000000000000000000', 'AntennaID': (1,),
+     'PeakRSSI': (-40,), 'LastSeenTimestampUTC': (1500000000000000,),
+     'TagSeenCount': (1,)},
+    {'EPC-96': '300000000000000000000001', 'AntennaID': (2,),
+     'PeakRSSI': (-41,), 'LastSeenTimestampUTC': (1500000000000001,),
+     'TagSeenCount': (1,)},
+]
+
+BASELINE_EPCDATA_TAGS = [
+    {'EPCData': {'EPCLengthBits': 64, 'EPC': '1111111111111100'},
+     'ChannelIndex': (3,), 'ROSpecID': (1,)},
+]
+
+
+def decode_tags(report, tag_format):
+    msg = LLRPMessage(msgbytes=report, tag_format=tag_format)
+    return msg.msgdict['RO_ACCESS_REPORT']['TagReportData']
+
+
+@pytest.mark.parametrize('report, expected', [
+    (build_report(2), BASELINE_TAGS),
+    (epcdata_report(), BASELINE_EPCDATA_TAGS),
+])
+def test_dict_format_matches_baseline(report, expected):
+    tags = decode_tags(report, 'dict')
+    assert tags == expected
+    for tag, exp in zip(tags, expected):
+        epc = tag['EPC-96'] if 'EPC-96' in tag else tag['EPCData']['EPC']
+        assert type(epc) is str
+
+
+@pytest.mark.parametrize('report, expected', [
+    (build_report(2), BASELINE_TAGS),
+    (epcdata_report(), BASELINE_EPCDATA_TAGS),
+])
+def test_records_format(report, expected):
+    tags = decode_tags(report, 'records')
+    assert [tag.asdict() for tag in tags] == expected
+    assert tags[0].InventoryParameterSpecID is None
+
+
+@pytest.mark.parametrize('report, expected', [
+    (build_report(2), BASELINE_TAGS),
+    (epcdata_report(), BASELINE_EPCDATA_TAGS),
+])
+def test_stream_format(report, expected):
+    stream = decode_tags(report, 'stream')
+    assert isinstance(stream, TagReportStream)
+    assert list(stream) == expected
+    # the stream can be iterated over more than once
+    assert list(stream) == expected
+
+
+def test_columns_format():
+    columns = decode_tags(build_report(2), 'columns')
+    assert len(columns) == 2
+    for i, tag in enumerate(BASELINE_TAGS):
+        assert str(columns['EPC'][i]) == tag['EPC-96']
+        for name in ('AntennaID', 'PeakRSSI', 'LastSeenTimestampUTC',
+                     'TagSeenCount'):
+            assert columns[name][i] == tag[name][0]
+    # AntennaID, PeakRSSI, LastSeenTimestampUTC and TagSeenCount reported
+    assert list(columns['Present']) == [0b1100110, 0b1100110]
+    assert columns['ChannelIndex'][0] == 0
+
+
+def test_columns_keep_trailing_nul_bytes():
+    columns = decode_tags(epcdata_report(), 'columns')
+    assert bytes(columns['EPC'][0]) == b'\x11' * 7 + b'\x00'
+    assert columns['ChannelIndex'][0] == 3
+
+
+def test_report_epcs():
+    report = build_report(3)
+    assert decode_TagReportEPCs(report, 10, len(report)) == \
+        [tag.EPC for tag in decode_tags(report, 'records')]
+
+
+TRUNCATED_DECODERS = [
+    decode_TagReportRecords,
+    decode_TagReportColumns,
+    decode_TagReportEPCs,
+    lambda data, offset, end: decode_ROAccessReport(data, offset, end),
+    lambda data, offset, end: list(TagReportStream(data, offset, end)),
+]
+
+
+@pytest.mark.parametrize('decoder', TRUNCATED_DECODERS)
+@pytest.mark.parametrize('length', [30, 107, 111])
+def test_truncated_report_raises_llrp_error(decoder, length):
+    report = build_report(5)
+    with pytest.raises(LLRPError):
+        decoder(report, 10, length)
+
+
+@pytest.mark.parametrize('length', [20, 25, 26])
+def test_truncated_epcdata_raises_llrp_error(length):
+    report = epcdata_report()
+    for decoder in TRUNCATED_DECODERS:
+        with pytest.raises(LLRPError):
+            decoder(report, 10, length)
+
+
+def test_bad_frame_does_not_lose_buffered_frames(caplog):
+    proto = LLRPProtocol(factory=None)
+    received = []
+
+    def callback(msg):
+        received.append(msg)
+        if len(received) == 1:
+            raise TypeError('callback failure')
+
+    proto.addMessageCallback('RO_ACCESS_REPORT', callback)
+    report = build_report(2)
+    truncated = bytearray(build_report(2)[:40])
+    truncated[2:6] = pack('!I', len(truncated))
+    with caplog.at_level(logging.CRITICAL):
+        proto.data_received(report + bytes(truncated) + report + report[:20])
+        assert len(received) == 3
+        proto.data_received(report[20:])
+    assert len(received) == 4
+    assert proto._rx_start == proto._rx_end == 0